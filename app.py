@@ -2,19 +2,29 @@
 小说 RAG 知识库 - Gradio Web 界面
 
 功能：
-1. 文档管理：上传 .txt 小说文件并摄取入库
+1. 文档管理：上传 .txt 小说文件，在后台任务中摄取入库，可查看进度与取消
 2. 问答对话：基于小说内容的智能问答
 """
+import time
+
+# 启动计时从导入本模块开始（此前仅有解释器自身的启动）
+_STARTED = time.perf_counter()
+
 import shutil
 from pathlib import Path
-
-import gradio as gr
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Any, Optional
 
 from config import DATA_DIR, config
-from services.ingest_service import ingest
-from services.qa_service import ask, reload_chain
+from core.vectorstore import vectorstore_manager
+from services.ingest_jobs import ingest_jobs, IngestJob
+from services.qa_service import ask, aask_stream
+from services.warmup import record_startup, start_warmup
 from utils.exceptions import NovelRAGError
 from utils.logger import get_logger
+from utils.metrics import start_metrics_server
+
+if TYPE_CHECKING:
+    import gradio as gr
 
 logger = get_logger("novel_rag.app")
 
@@ -41,21 +51,94 @@ def handle_upload(files) -> str:
         uploaded.append(file_path.name)
         logger.info(f"文件已上传: {file_path.name}")
 
+    # 摄取在后台任务中进行，期间可以继续提问（已摄取的内容照常检索）
     try:
-        ingest(DATA_DIR)
-        reload_chain()
-        file_list = "\n".join(f"  • {name}" for name in uploaded)
-        return f"✅ 成功上传并摄取以下文件：\n{file_list}\n\n现在可以开始提问了！"
-    except NovelRAGError as e:
-        logger.error(f"摄取失败: {e}")
-        return f"❌ 摄取过程出错：{e.message}"
+        job = ingest_jobs.submit(DATA_DIR, files=uploaded)
     except Exception as e:
-        logger.error(f"未知错误: {e}")
-        return f"❌ 摄取过程出错：{str(e)}"
+        logger.error(f"提交摄取任务失败: {e}")
+        return f"❌ 提交摄取任务失败：{str(e)}"
+    file_list = "\n".join(f"  • {name}" for name in uploaded)
+    return (
+        f"✅ 已上传以下文件：\n{file_list}\n\n"
+        f"摄取任务 {job.id} 已提交，进度见下方「摄取任务」，完成后即可检索新内容"
+    )
+
+
+# ── 摄取任务 ──────────────────────────────────────────────
+JOB_STATUS_LABELS = {
+    "queued": "排队中",
+    "running": "运行中",
+    "succeeded": "已完成",
+    "failed": "失败",
+    "cancelled": "已取消",
+}
+JOB_STAGE_LABELS = {
+    "pending": "等待",
+    "scanning": "扫描变更",
+    "ingesting": "分块与向量化",
+    "indexing": "构建索引",
+    "done": "完成",
+}
+JOB_COLUMNS = ["任务ID", "状态", "阶段", "文件进度", "已分块", "已向量化", "耗时", "错误"]
+
+
+def job_row(job: IngestJob) -> List[str]:
+    """任务 → 表格行"""
+    progress = job.progress
+    files = f"{progress.files_done}/{progress.files_total}"
+    if progress.current_file and job.status == "running":
+        files += f"（{progress.current_file}）"
+    return [
+        job.id,
+        JOB_STATUS_LABELS.get(job.status, job.status),
+        JOB_STAGE_LABELS.get(progress.stage, progress.stage),
+        files,
+        str(progress.chunks_split),
+        str(progress.chunks_embedded),
+        f"{job.elapsed:.1f}s" if job.started else "",
+        job.error,
+    ]
+
+
+def list_jobs() -> List[List[str]]:
+    """摄取任务表格，最近提交的在前"""
+    return [job_row(job) for job in ingest_jobs.jobs()]
+
+
+def active_job_ids() -> List[str]:
+    """可取消（排队中或运行中）的任务 ID"""
+    return [job.id for job in ingest_jobs.active()]
+
+
+def handle_cancel(job_id: Optional[str]) -> str:
+    """取消摄取任务"""
+    if not job_id:
+        return "请选择要取消的任务"
+    if ingest_jobs.cancel(job_id):
+        return f"已请求取消任务 {job_id}，已写入的部分会保留，重新上传或摄取时从检查点继续"
+    return f"任务 {job_id} 不存在或已结束"
 
 
 # ── 问答处理 ──────────────────────────────────────────────
-def handle_question(question: str, history: list) -> str:
+ALL_NOVELS = "全部小说"
+
+
+def novel_choices() -> List[str]:
+    """检索范围下拉框的选项"""
+    return [ALL_NOVELS] + [entry.title for entry in vectorstore_manager.novels()]
+
+
+def novel_scope(novel: Optional[str]) -> Optional[str]:
+    """下拉框选项 → 检索范围（None 表示全部）"""
+    return None if not novel or novel == ALL_NOVELS else novel
+
+
+def refresh_novels() -> Any:
+    import gradio as gr
+    return gr.update(choices=novel_choices())
+
+
+def handle_question(question: str, history: list, novel: Optional[str] = None) -> str:
     """处理用户提问"""
     if not config.is_configured:
         return "❌ 请先设置环境变量 GOOGLE_API_KEY"
@@ -64,17 +147,8 @@ def handle_question(question: str, history: list) -> str:
         return "请输入您的问题"
 
     try:
-        result = ask(question)
-        answer = result["answer"]
-
-        if result["sources"]:
-            answer += "\n\n---\n📖 **参考段落：**\n"
-            for i, src in enumerate(result["sources"], 1):
-                source_file = Path(src["source"]).name
-                content_preview = src["content"][:150].replace("\n", " ")
-                answer += f"\n**[{i}]** `{source_file}`\n> {content_preview}...\n"
-
-        return answer
+        result = ask(question, novel_scope(novel))
+        return result["answer"] + format_sources(result["sources"])
     except NovelRAGError as e:
         logger.error(f"问答失败: {e}")
         return f"❌ 回答生成出错：{e.message}"
@@ -83,6 +157,47 @@ def handle_question(question: str, history: list) -> str:
         return f"❌ 回答生成出错：{str(e)}"
 
 
+async def handle_question_stream(
+    question: str, history: list, novel: Optional[str] = None
+) -> AsyncIterator[str]:
+    """流式处理用户提问（异步）：检索完成即显示参考段落，回答逐步追加"""
+    if not config.is_configured:
+        yield "❌ 请先设置环境变量 GOOGLE_API_KEY"
+        return
+
+    if not question.strip():
+        yield "请输入您的问题"
+        return
+
+    answer, sources_block = "", ""
+    try:
+        async for event in aask_stream(question, novel_scope(novel)):
+            if event["type"] == "sources":
+                sources_block = format_sources(event["response"]["sources"])
+                yield "⏳ 正在生成回答..." + sources_block
+            elif event["type"] == "token":
+                answer += event["text"]
+                yield answer + sources_block
+    except NovelRAGError as e:
+        logger.error(f"问答失败: {e}")
+        yield f"❌ 回答生成出错：{e.message}"
+    except Exception as e:
+        logger.error(f"未知错误: {e}")
+        yield f"❌ 回答生成出错：{str(e)}"
+
+
+def format_sources(sources: List[Dict[str, Any]]) -> str:
+    """格式化参考段落"""
+    if not sources:
+        return ""
+    text = "\n\n---\n📖 **参考段落：**\n"
+    for i, src in enumerate(sources, 1):
+        source_file = Path(src["source"]).name
+        content_preview = src["content"][:150].replace("\n", " ")
+        text += f"\n**[{i}]** `{source_file}`\n> {content_preview}...\n"
+    return text
+
+
 # ── 获取已有文档列表 ──────────────────────────────────────
 def list_documents() -> str:
     """列出 data/ 目录中已有的文档"""
@@ -121,7 +236,10 @@ CUSTOM_CSS = """
 
 
 # ── 构建 Gradio 界面 ─────────────────────────────────────
-def create_app() -> gr.Blocks:
+def create_app() -> "gr.Blocks":
+    # Gradio 导入耗时数秒，启动时先开始后台预热再导入
+    import gradio as gr
+
     with gr.Blocks(title="📖 小说 RAG 知识库") as app:
         gr.HTML("""
         <div class="main-header">
@@ -145,25 +263,37 @@ def create_app() -> gr.Blocks:
                         show_label=False,
                     )
                     submit_btn = gr.Button("发送", variant="primary", scale=1)
+                novel_select = gr.Dropdown(
+                    label="检索范围",
+                    choices=novel_choices(),
+                    value=ALL_NOVELS,
+                )
 
-                def chat(question, history):
+                async def chat(question, history, novel):
                     if not question.strip():
-                        return history, ""
-                    answer = handle_question(question, history)
+                        yield history, ""
+                        return
                     history = history or []
                     history.append({"role": "user", "content": question})
-                    history.append({"role": "assistant", "content": answer})
-                    return history, ""
+                    history.append({"role": "assistant", "content": ""})
+                    async for answer in handle_question_stream(question, history, novel):
+                        history[-1]["content"] = answer
+                        yield history, ""
 
+                # 按钮与回车共享同一并发上限
                 submit_btn.click(
                     fn=chat,
-                    inputs=[question_input, chatbot],
+                    inputs=[question_input, chatbot, novel_select],
                     outputs=[chatbot, question_input],
+                    concurrency_limit=config.serving.concurrency_limit,
+                    concurrency_id="chat",
                 )
                 question_input.submit(
                     fn=chat,
-                    inputs=[question_input, chatbot],
+                    inputs=[question_input, chatbot, novel_select],
                     outputs=[chatbot, question_input],
+                    concurrency_limit=config.serving.concurrency_limit,
+                    concurrency_id="chat",
                 )
 
             with gr.Tab("📁 文档管理", id="docs"):
@@ -183,6 +313,21 @@ def create_app() -> gr.Blocks:
                             interactive=False,
                         )
 
+                gr.Markdown("### ⏳ 摄取任务")
+                job_table = gr.Dataframe(
+                    headers=JOB_COLUMNS,
+                    value=list_jobs(),
+                    interactive=False,
+                    wrap=True,
+                )
+                with gr.Row():
+                    job_select = gr.Dropdown(
+                        label="进行中的任务",
+                        choices=active_job_ids(),
+                        scale=3,
+                    )
+                    cancel_btn = gr.Button("⏹ 取消任务", variant="stop", scale=1)
+
                 gr.Markdown("### 📋 已有文档")
                 doc_list = gr.Textbox(
                     label="文档列表",
@@ -192,15 +337,42 @@ def create_app() -> gr.Blocks:
                 )
                 refresh_btn = gr.Button("🔄 刷新列表")
 
+                def refresh_jobs(selected):
+                    # 保留仍在进行中的已选任务，否则默认选中最新的任务
+                    active = active_job_ids()
+                    if selected not in active:
+                        selected = active[0] if active else None
+                    return (
+                        list_jobs(),
+                        gr.update(choices=active, value=selected),
+                        list_documents(),
+                        refresh_novels(),
+                    )
+
+                job_outputs = [job_table, job_select, doc_list, novel_select]
                 upload_btn.click(
                     fn=handle_upload,
                     inputs=[file_upload],
                     outputs=[upload_result],
                 ).then(
-                    fn=list_documents,
-                    outputs=[doc_list],
+                    fn=refresh_jobs,
+                    inputs=[job_select],
+                    outputs=job_outputs,
+                )
+                cancel_btn.click(
+                    fn=handle_cancel,
+                    inputs=[job_select],
+                    outputs=[upload_result],
+                ).then(
+                    fn=refresh_jobs,
+                    inputs=[job_select],
+                    outputs=job_outputs,
                 )
                 refresh_btn.click(fn=list_documents, outputs=[doc_list])
+                # 定时刷新任务进度；任务完成后文档列表与检索范围随之更新
+                gr.Timer(2.0).tick(
+                    fn=refresh_jobs, inputs=[job_select], outputs=job_outputs, show_progress="hidden",
+                )
 
     return app
 
@@ -208,7 +380,14 @@ def create_app() -> gr.Blocks:
 # ── 启动 ─────────────────────────────────────────────────
 if __name__ == "__main__":
     logger.info("启动 Web 应用")
+    record_startup("import", time.perf_counter() - _STARTED)
+    if config.metrics.enabled and config.metrics.port:
+        start_metrics_server(config.metrics.host, config.metrics.port)
+    if config.startup.warmup:
+        start_warmup()
     app = create_app()
+    record_startup("ui_ready", time.perf_counter() - _STARTED)
+    import gradio as gr
     app.launch(
         server_name="0.0.0.0",
         server_port=7860,
@@ -0,0 +1 @@
+"""性能基准模块（离线运行：python -m benchmarks.<name>）"""
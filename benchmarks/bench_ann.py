@@ -0,0 +1,104 @@
+"""
+IVF-PQ 近似检索基准：召回率与延迟 vs 精确检索
+
+生成带簇结构的合成向量（模拟真实 Embedding 的聚集分布），写入 NumPy 后端并训练 IVF-PQ 索引，
+对每组 (nprobe, rescore) 报告 recall@k（以精确检索结果为准）与单查询 p50 / p99 延迟，
+以及索引体积与原始 float32 向量体积之比，用于选择速度与召回的折中点
+
+用法: python -m benchmarks.bench_ann [向量数] [维度] [pq 子空间数]
+"""
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+from core.numpy_backend import NumpyVectorBackend
+
+_K = 10
+_QUERIES = 200
+_NPROBES = (1, 4, 8, 16, 32, 64)
+_RESCORES = (0, 100, 400)
+
+
+def clustered_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """簇中心 + 高斯噪声，L2 归一化"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _timed(backend: NumpyVectorBackend, queries: np.ndarray, **kwargs) -> tuple:
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = backend.search(query[None, :], _K, **kwargs)[0]
+        latencies.append(time.perf_counter() - started)
+        results.append({doc.id for doc, _ in hits})
+    ms = np.asarray(latencies) * 1000
+    return results, round(float(np.percentile(ms, 50)), 3), round(float(np.percentile(ms, 99)), 3)
+
+
+def main(count: int = 200_000, dim: int = 256, pq_m: int = 32) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="novel_rag_ann_"))
+    try:
+        clusters = max(16, count // 500)
+        vectors = clustered_vectors(count, dim, clusters, seed=0)
+        # 查询为库中随机向量加噪声：与库同分布，但不与任何已存向量重合
+        rng = np.random.default_rng(1)
+        noise = 0.3 * rng.standard_normal((_QUERIES, dim)).astype(np.float32)
+        queries = vectors[rng.choice(count, _QUERIES, replace=False)] + noise
+
+        backend = NumpyVectorBackend(workdir, index="ivfpq", pq_m=pq_m, ann_min_rows=1)
+        step = 50_000
+        for start in range(0, count, step):
+            end = min(start + step, count)
+            backend.upsert(
+                [str(i) for i in range(start, end)],
+                vectors[start:end],
+                [Document(page_content=str(i)) for i in range(start, end)],
+            )
+        # 精确检索基线（索引尚未构建）
+        truth, exact_p50, exact_p99 = _timed(backend, queries)
+
+        started = time.perf_counter()
+        backend.build_index(force=True)
+        build_s = time.perf_counter() - started
+        index = backend.ann_index
+
+        report = {
+            "vectors": count,
+            "dim": dim,
+            "k": _K,
+            "nlist": index.nlist,
+            "pq_subspaces": index.m,
+            "build_s": round(build_s, 2),
+            "index_mb": round(index.nbytes / 2**20, 2),
+            "float32_vectors_mb": round(count * dim * 4 / 2**20, 2),
+            "exact": {"p50_ms": exact_p50, "p99_ms": exact_p99},
+            "ann": [],
+        }
+        for rescore in _RESCORES:
+            for nprobe in _NPROBES:
+                results, p50, p99 = _timed(backend, queries, nprobe=nprobe, rescore=rescore)
+                recall = np.mean([len(got & want) / _K for got, want in zip(results, truth)])
+                report["ann"].append({
+                    "nprobe": nprobe,
+                    "rescore": rescore,
+                    "recall_at_k": round(float(recall), 4),
+                    "p50_ms": p50,
+                    "p99_ms": p99,
+                })
+        backend.close()
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:4]))
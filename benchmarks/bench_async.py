@@ -0,0 +1,65 @@
+"""
+异步并发问答基准
+
+用带延迟的替身模型（见 benchmarks/fakes.py）验证 QAService.aask 的并发请求确实重叠执行：
+N 个并发问题的总耗时应接近单个问题的耗时，而不是 N 倍；
+同时报告 LLM 调用的峰值并发数，以及全程使用的线程数
+
+用法: python -m benchmarks.bench_async [并发数] [LLM 延迟秒数]
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+
+from benchmarks.corpus import write_corpus
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, install_fakes
+
+
+async def _run(concurrency: int, latency: float) -> dict:
+    from services.ingest_service import ingest
+    from services.qa_service import qa_service
+
+    llm = FakeChatModel(latency=latency)
+    workdir = install_fakes(llm=llm, embeddings=FakeEmbeddings(latency=0.05))
+    write_corpus(workdir / "data", novels=2, chars_per_novel=200_000)
+    ingest(workdir / "data")
+
+    # 预热：构建链、加载索引
+    await qa_service.aask("预热问题")
+    llm.probe.peak = 0
+
+    started = time.perf_counter()
+    await qa_service.aask("单个问题的耗时基线")
+    single = time.perf_counter() - started
+
+    threads_before = threading.active_count()
+    questions = [f"第{i}个问题：萧炎在乌坦城遇到了谁？" for i in range(concurrency)]
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(qa_service.aask(q) for q in questions))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "llm_latency_s": latency,
+        "single_s": round(single, 3),
+        "concurrent_total_s": round(elapsed, 3),
+        "sequential_estimate_s": round(single * concurrency, 3),
+        "speedup": round(single * concurrency / elapsed, 1),
+        "llm_peak_concurrency": llm.probe.peak,
+        "answered": sum(1 for r in responses if r.answer),
+        "threads_before": threads_before,
+        "threads_after": threading.active_count(),
+    }
+
+
+def main(concurrency: int = 32, latency: float = 0.5) -> None:
+    print(json.dumps(asyncio.run(_run(concurrency, latency)), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 32,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 0.5,
+    )
@@ -0,0 +1,149 @@
+"""
+启动耗时基准
+
+每次测量都在新的子进程中进行（冷启动）：
+- import_app_s：导入 app 模块（不含 Gradio 界面构建）
+- warmup_s：启动预热（打开向量库、读入索引、构建问答链）的耗时
+- first_question_ms：首个问题的端到端耗时，分不预热（cold）与预热之后（warm）两种情况
+- ready_s：从子进程开始导入到首个回答返回的总耗时
+
+向量库为替身模型预先摄取的合成语料（见 benchmarks/fakes.py），不需要 API 密钥与网络；
+结果 JSON 与 bench_suite 结构相同，可用 benchmarks/compare.py 对比两次运行
+
+用法: python -m benchmarks.bench_startup [--runs 5] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 子进程也执行本模块，顶层只导入标准库，避免计入被测的导入耗时
+SCHEMA_VERSION = 1
+MODES = ("cold", "warm")
+
+
+def _child(args: argparse.Namespace) -> None:
+    """子进程：导入 → （预热）→ 首个问题，结果以一行 JSON 输出"""
+    started = time.perf_counter()
+    import app  # noqa: F401
+    result = {"import_app_s": time.perf_counter() - started}
+
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings, install_fakes
+    from services.qa_service import qa_service
+    from services.warmup import warm_up
+
+    install_fakes(
+        llm=FakeChatModel(latency=args.llm_latency),
+        embeddings=FakeEmbeddings(dim=args.dim, latency=args.embed_latency),
+        workdir=args.workdir,
+    )
+    if args.child == "warm":
+        warm_started = time.perf_counter()
+        warm_up(embedding=False)
+        result["warmup_s"] = time.perf_counter() - warm_started
+
+    # 每次运行的问题不同，查询向量不会命中上次运行写入的 Embedding 缓存
+    asked = time.perf_counter()
+    qa_service.ask(f"萧炎在乌坦城做了什么？（{args.child}-{args.run}）")
+    result["first_question_ms"] = (time.perf_counter() - asked) * 1000
+    result["ready_s"] = time.perf_counter() - started
+    print(json.dumps(result))
+
+
+def _prepare(args: argparse.Namespace) -> Path:
+    """摄取合成语料，返回工作目录（各子进程共用）"""
+    from benchmarks.corpus import write_corpus
+    from benchmarks.fakes import FakeEmbeddings, install_fakes
+    from services.ingest_service import IngestService
+
+    workdir = Path(tempfile.mkdtemp(prefix="novel_rag_startup_"))
+    install_fakes(embeddings=FakeEmbeddings(dim=args.dim, latency=0.0), workdir=workdir)
+    write_corpus(workdir / "data", novels=args.novels, chars_per_novel=args.chars // args.novels, seed=0)
+    IngestService(workdir / "data").ingest()
+    return workdir
+
+
+def _run_child(mode: str, run: int, workdir: Path, args: argparse.Namespace) -> Dict[str, float]:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_startup",
+        "--child", mode, "--run", str(run), "--workdir", str(workdir),
+        "--dim", str(args.dim),
+        "--embed-latency", str(args.embed_latency),
+        "--llm-latency", str(args.llm_latency),
+    ]
+    root = Path(__file__).resolve().parent.parent
+    completed = subprocess.run(command, cwd=root, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"子进程失败（{mode}）:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, object]:
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式的子进程数，取中位数")
+    parser.add_argument("--chars", type=int, default=1_000_000, help="合成语料总字符数")
+    parser.add_argument("--novels", type=int, default=4, help="合成小说数")
+    parser.add_argument("--dim", type=int, default=256, help="替身 Embedding 维度")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="替身 Embedding 每次调用耗时（秒）")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="替身 LLM 每次调用耗时（秒）")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径，缺省输出到标准输出")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--run", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args)
+        return {}
+
+    from benchmarks.bench_suite import _git_revision
+    from config import config
+
+    workdir = _prepare(args)
+    runs = {mode: [_run_child(mode, run, workdir, args) for run in range(args.runs)] for mode in MODES}
+    metrics: Dict[str, float] = {
+        "startup/import_app_s": round(_median([r["import_app_s"] for rs in runs.values() for r in rs]), 4),
+        "startup/warmup_s": round(_median([r["warmup_s"] for r in runs["warm"]]), 4),
+    }
+    for mode, results in runs.items():
+        metrics[f"startup[{mode}]/first_question_ms"] = round(
+            _median([result["first_question_ms"] for result in results]), 3
+        )
+        metrics[f"startup[{mode}]/ready_s"] = round(_median([result["ready_s"] for result in results]), 4)
+    report = {
+        "meta": {
+            "schema": SCHEMA_VERSION,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **_git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("child", "run", "workdir")},
+            "vectorstore_backend": config.vectorstore.backend,
+        },
+        "metrics": metrics,
+        "results": runs,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
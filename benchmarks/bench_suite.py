@@ -0,0 +1,319 @@
+"""
+离线性能基准套件
+
+全程使用替身模型（见 benchmarks/fakes.py）与合成语料，不需要 API 密钥与网络，
+在若干语料规模下测量：
+- 摄取：读取、分块、向量化、写入各阶段吞吐，以及完整增量摄取的吞吐
+- 检索：问答请求中各阶段（embed / search / sparse / fuse / rerank / pack …）的延迟分位数
+- 重排：关闭、本地特征、LLM 评分三种模式下的端到端延迟与相对关闭时的额外开销
+- 端到端：QAService.ask 的延迟分位数与失败数
+
+结果写为 JSON：meta 记录提交、环境与参数，metrics 为扁平的「指标名 → 数值」，
+可用 benchmarks/compare.py 对比两次运行
+
+用法: python -m benchmarks.bench_suite [--sizes 200000,1000000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.corpus import write_corpus
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, install_fakes
+
+SCHEMA_VERSION = 1
+RERANK_MODES = ("off", "local", "llm")
+
+_NAMES = ["林动", "萧炎", "叶凡", "石昊", "韩立", "唐三"]
+_PLACES = ["青阳镇", "乌坦城", "荒古禁地", "星辰殿", "万妖山", "天玄宗"]
+
+
+def _questions(count: int, offset: int = 0) -> List[str]:
+    """互不相同的问题（避免命中回答缓存与 Embedding 缓存）"""
+    return [
+        f"{_NAMES[i % len(_NAMES)]}在{_PLACES[(i // len(_NAMES)) % len(_PLACES)]}做了什么？（{i}）"
+        for i in range(offset, offset + count)
+    ]
+
+
+def _summary(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {}
+    ms = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def _git_revision() -> Dict[str, object]:
+    root = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=root, capture_output=True, text=True, check=True,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def _install(args: argparse.Namespace, workdir: Optional[Path] = None):
+    llm = FakeChatModel(latency=args.llm_latency, failure_rate=args.failure_rate, seed=args.seed)
+    embeddings = FakeEmbeddings(
+        dim=args.dim, latency=args.embed_latency, failure_rate=args.failure_rate, seed=args.seed
+    )
+    return install_fakes(llm=llm, embeddings=embeddings, workdir=workdir), llm, embeddings
+
+
+# ── 摄取 ──────────────────────────────────────────────────
+
+def bench_ingest_stages(data_dir: Path, embeddings: FakeEmbeddings) -> Dict[str, object]:
+    """
+    逐阶段测量摄取：读取 → 分块 → 向量化 → 写入
+
+    各阶段依次独立执行（不流水线重叠），向量化直接调用替身模型、不经过 Embedding 缓存
+    """
+    from config import config
+    from core.vectorstore import vectorstore_manager
+    from services.embedding_scheduler import create_embedding_scheduler
+    from services.ingest_pipeline import read_blocks
+    from services.ingest_service import IngestService, make_chunk_id
+
+    service = IngestService(data_dir)
+    block_chars = config.ingest.read_block_chars if config.ingest.streaming else None
+    files = sorted(data_dir.glob("*.txt"))
+    chars = 0
+    load_s = split_s = embed_s = write_s = 0.0
+    chunks = 0
+    for path in files:
+        started = time.perf_counter()
+        chars += sum(len(block) for block in read_blocks(path, block_chars))
+        load_s += time.perf_counter() - started
+
+        # _iter_chunks 包含读取，最后扣除单独测得的读取耗时
+        started = time.perf_counter()
+        documents = list(service._iter_chunks(path))
+        split_s += time.perf_counter() - started
+        ids = [
+            make_chunk_id(str(path), doc.metadata.get("start_index", -1), doc.page_content)
+            for doc in documents
+        ]
+        chunks += len(documents)
+
+        started = time.perf_counter()
+        scheduler = create_embedding_scheduler(embeddings.embed_documents)
+        vectors: List[List[float]] = [[] for _ in documents]
+
+        def on_batch(start: int, texts: List[str], batch: List[List[float]]) -> None:
+            vectors[start:start + len(batch)] = batch
+
+        scheduler.run([doc.page_content for doc in documents], on_batch=on_batch)
+        embed_s += time.perf_counter() - started
+
+        started = time.perf_counter()
+        vectorstore_manager.upsert_embeddings(documents, vectors, ids)
+        write_s += time.perf_counter() - started
+    split_s = max(split_s - load_s, 0.0)
+
+    def rate(count: float, seconds: float) -> float:
+        return round(count / seconds, 2) if seconds > 0 else 0.0
+
+    return {
+        "chars": chars,
+        "chunks": chunks,
+        "load_s": round(load_s, 3),
+        "split_s": round(split_s, 3),
+        "embed_s": round(embed_s, 3),
+        "write_s": round(write_s, 3),
+        "load_chars_per_s": rate(chars, load_s),
+        "split_chars_per_s": rate(chars, split_s),
+        "embed_chunks_per_s": rate(chunks, embed_s),
+        "write_chunks_per_s": rate(chunks, write_s),
+    }
+
+
+def bench_ingest(data_dir: Path, chars: int) -> Dict[str, object]:
+    """完整的增量摄取（流水线、Embedding 缓存、BM25 与清单均按配置生效）"""
+    from services.ingest_service import IngestService
+
+    service = IngestService(data_dir)
+    started = time.perf_counter()
+    chunks = service.ingest()
+    elapsed = time.perf_counter() - started
+    return {
+        "chunks": chunks,
+        "elapsed_s": round(elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 2) if elapsed > 0 else 0.0,
+        "chars_per_s": round(chars / elapsed, 2) if elapsed > 0 else 0.0,
+        "embedding": service.embedding_stats.to_dict(),
+    }
+
+
+# ── 问答 ──────────────────────────────────────────────────
+
+def _set_rerank_mode(mode: str) -> None:
+    from config import config
+    from services.qa_service import qa_service
+
+    config.rerank.enabled = mode != "off"
+    if mode != "off":
+        config.rerank.mode = mode
+    # 重排器在服务初始化时按模式创建
+    qa_service.reload()
+
+
+def bench_qa(questions: List[str], mode: str) -> Dict[str, object]:
+    """按重排模式逐个提问，统计端到端与各阶段延迟"""
+    from services.qa_service import qa_service
+    from utils.exceptions import NovelRAGError
+
+    _set_rerank_mode(mode)
+    try:
+        qa_service.ask(f"预热问题（{mode}）")
+    except NovelRAGError:
+        pass  # 注入失败时预热可能失败，不影响后续测量
+
+    totals: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors = 0
+    skipped = 0
+    for question in questions:
+        started = time.perf_counter()
+        try:
+            response = qa_service.ask(question)
+        except NovelRAGError:
+            errors += 1
+            continue
+        totals.append((time.perf_counter() - started) * 1000)
+        for stage, ms in response.timings.items():
+            stages.setdefault(stage, []).append(ms)
+        skipped += bool(response.metadata.get("skipped_stages"))
+    return {
+        "requests": len(questions),
+        "errors": errors,
+        "degraded": skipped,
+        "total": _summary(totals),
+        "stages": {stage: _summary(samples) for stage, samples in sorted(stages.items())},
+    }
+
+
+# ── 套件 ──────────────────────────────────────────────────
+
+def run_size(total_chars: int, args: argparse.Namespace) -> Dict[str, object]:
+    """在一个语料规模下运行全部测量"""
+    from config import config
+
+    novels = max(1, min(args.novels, total_chars // 50_000))
+    workdir, _, embeddings = _install(args)
+    data_dir = workdir / "data"
+    write_corpus(data_dir, novels=novels, chars_per_novel=total_chars // novels, seed=args.seed)
+
+    stages = bench_ingest_stages(data_dir, embeddings)
+
+    # 完整摄取使用新的工作目录，Embedding 缓存与向量库均为空
+    workdir, llm, embeddings = _install(args)
+    write_corpus(workdir / "data", novels=novels, chars_per_novel=total_chars // novels, seed=args.seed)
+    ingest = bench_ingest(workdir / "data", stages["chars"])
+
+    config.answer_cache.enabled = False
+    # 各模式使用不同的问题，查询向量都需要实际计算
+    qa = {
+        mode: bench_qa(_questions(args.questions, offset=i * args.questions), mode)
+        for i, mode in enumerate(RERANK_MODES)
+    }
+    baseline = qa["off"]["total"].get("p50_ms", 0.0)
+    rerank = {
+        mode: {
+            "overhead_p50_ms": round(qa[mode]["total"].get("p50_ms", 0.0) - baseline, 3),
+            "rerank_stage": qa[mode]["stages"].get("rerank", {}),
+        }
+        for mode in RERANK_MODES if mode != "off"
+    }
+    return {
+        "corpus_chars": total_chars,
+        "novels": novels,
+        "ingest_stages": stages,
+        "ingest": ingest,
+        "qa": qa,
+        "rerank": rerank,
+        "fake_failures": {"llm": llm.failures, "embeddings": embeddings.failures},
+    }
+
+
+def flatten_metrics(results: List[Dict[str, object]]) -> Dict[str, float]:
+    """
+    提取可跨提交对比的扁平指标
+
+    命名约定：以 _per_s 结尾的越大越好，以 _ms / _s 结尾的越小越好
+    """
+    metrics: Dict[str, float] = {}
+    for result in results:
+        prefix = f"chars={result['corpus_chars']}"
+        for key in ("load_chars_per_s", "split_chars_per_s", "embed_chunks_per_s", "write_chunks_per_s"):
+            metrics[f"{prefix}/ingest_stages/{key}"] = result["ingest_stages"][key]
+        metrics[f"{prefix}/ingest/chunks_per_s"] = result["ingest"]["chunks_per_s"]
+        metrics[f"{prefix}/ingest/chars_per_s"] = result["ingest"]["chars_per_s"]
+        metrics[f"{prefix}/ingest/elapsed_s"] = result["ingest"]["elapsed_s"]
+        for mode, qa in result["qa"].items():
+            for key, value in qa["total"].items():
+                metrics[f"{prefix}/qa[{mode}]/total/{key}"] = value
+            for stage, summary in qa["stages"].items():
+                for key in ("p50_ms", "p95_ms"):
+                    if key in summary:
+                        metrics[f"{prefix}/qa[{mode}]/{stage}/{key}"] = summary[key]
+    return metrics
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, object]:
+    parser = argparse.ArgumentParser(description="离线性能基准套件")
+    parser.add_argument("--sizes", default="200000,1000000", help="语料总字符数，逗号分隔")
+    parser.add_argument("--novels", type=int, default=4, help="每个规模最多拆成几部小说")
+    parser.add_argument("--questions", type=int, default=30, help="每种重排模式的提问数")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="替身 Embedding 每次调用耗时（秒）")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="替身 LLM 每次调用耗时（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="替身模型调用失败比例")
+    parser.add_argument("--dim", type=int, default=256, help="替身 Embedding 维度")
+    parser.add_argument("--seed", type=int, default=0, help="语料与失败序列的随机种子")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径，缺省输出到标准输出")
+    args = parser.parse_args(argv)
+
+    from config import config
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = [run_size(size, args) for size in sizes]
+    report = {
+        "meta": {
+            "schema": SCHEMA_VERSION,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **_git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+            "vectorstore_backend": config.vectorstore.backend,
+        },
+        "metrics": flatten_metrics(results),
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,134 @@
+"""
+向量后端基准：Chroma 对比内存映射 NumPy 精确检索
+
+先把同一批随机向量写入两个后端，再为每个后端启动独立子进程测量：
+- 冷加载耗时（打开存储到首个查询返回）
+- 单查询与批量查询（一次 32 个）的 p50 / p99 延迟
+- 进程常驻内存（VmRSS）
+- NumPy 后端相对暴力计算的 top-k 召回率（应为 1.0）
+
+用法: python -m benchmarks.bench_vectorstore [向量数] [维度]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+
+_BATCH = 32
+_QUERIES = 200
+_K = 10
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _percentiles(samples: List[float]) -> dict:
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p99_ms": round(float(np.percentile(ms, 99)), 3)}
+
+
+def _open_backend(name: str, workdir: Path, dim: int):
+    import config
+    from benchmarks.fakes import FakeEmbeddings, install_fakes
+    from core.vectorstore import vectorstore_manager
+
+    install_fakes(embeddings=FakeEmbeddings(dim=dim, latency=0), workdir=workdir)
+    config.config.vectorstore.backend = name
+    return vectorstore_manager.backend
+
+
+def _vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(name: str, workdir: Path, count: int, dim: int) -> float:
+    """写入 count 个随机向量，返回耗时"""
+    backend = _open_backend(name, workdir, dim)
+    started = time.perf_counter()
+    step = 5000
+    for start in range(0, count, step):
+        end = min(start + step, count)
+        ids = [f"chunk-{i}" for i in range(start, end)]
+        docs = [Document(page_content=f"文本块 {i}", metadata={"row": i}) for i in range(start, end)]
+        backend.upsert(ids, _vectors(end - start, dim, seed=start), docs)
+    backend.close()
+    return time.perf_counter() - started
+
+
+def measure(name: str, workdir: Path, count: int, dim: int) -> dict:
+    """在全新进程中加载后端并测量查询延迟与内存"""
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    backend = _open_backend(name, workdir, dim)
+    queries = _vectors(_QUERIES, dim, seed=2**31)
+    backend.search(queries[:1], _K)
+    load_s = time.perf_counter() - started
+
+    single = []
+    for query in queries:
+        t = time.perf_counter()
+        backend.search(query[None, :], _K)
+        single.append(time.perf_counter() - t)
+    batched = []
+    for start in range(0, _QUERIES, _BATCH):
+        t = time.perf_counter()
+        backend.search(queries[start:start + _BATCH], _K)
+        batched.append((time.perf_counter() - t) / _BATCH)
+
+    result = {
+        "backend": name,
+        "load_s": round(load_s, 3),
+        "single": _percentiles(single),
+        "batched_per_query": _percentiles(batched),
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+    }
+    if name == "numpy":
+        # 与全量矩阵暴力计算比对
+        truth = np.concatenate(
+            [_vectors(min(5000, count - s), dim, seed=s) for s in range(0, count, 5000)]
+        ) @ queries[:20].T
+        expected = np.argsort(-truth, axis=0)[:_K].T
+        hits = backend.search(queries[:20], _K)
+        recall = np.mean([
+            len({doc.id for doc, _ in got} & {f"chunk-{i}" for i in want}) / _K
+            for got, want in zip(hits, expected)
+        ])
+        result["recall_at_k"] = round(float(recall), 4)
+    return result
+
+
+def main(count: int = 100_000, dim: int = 768) -> None:
+    workdir = Path(tempfile.mkdtemp(prefix="novel_rag_vs_"))
+    report = {"vectors": count, "dim": dim, "k": _K, "backends": []}
+    for name in ("chroma", "numpy"):
+        build_s = build(name, workdir, count, dim)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_vectorstore", "--measure", name, str(workdir), str(count), str(dim)],
+            capture_output=True, text=True, check=True, env={**os.environ, "PYTHONWARNINGS": "ignore"},
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["build_s"] = round(build_s, 3)
+        report["backends"].append(result)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        _, _, name, workdir, count, dim = sys.argv
+        print(json.dumps(measure(name, Path(workdir), int(count), int(dim))))
+    else:
+        main(*(int(arg) for arg in sys.argv[1:3]))
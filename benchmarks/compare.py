@@ -0,0 +1,69 @@
+"""
+基准结果对比
+
+对比两次 bench_suite 运行的扁平指标：以 _per_s 结尾的越大越好，以 _ms / _s 结尾的越小越好；
+变差超过阈值的指标记为回归，存在回归时退出码为 1，可直接用于 CI
+
+用法: python -m benchmarks.compare 基线.json 新结果.json [--threshold 0.1]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+def _higher_is_better(name: str) -> Optional[bool]:
+    if name.endswith("_per_s"):
+        return True
+    if name.endswith("_ms") or name.endswith("_s"):
+        return False
+    return None
+
+
+def compare(
+    baseline: Dict[str, float],
+    current: Dict[str, float],
+    threshold: float = 0.1,
+) -> List[Tuple[str, float, float, float, str]]:
+    """
+    逐项对比指标
+
+    Returns:
+        (指标名, 基线值, 当前值, 相对变化, 状态) 列表，状态为 ok / regression / improvement
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        old, new = baseline[name], current[name]
+        change = (new - old) / old if old else 0.0
+        higher = _higher_is_better(name)
+        status = "ok"
+        if higher is not None and abs(change) > threshold:
+            better = change > 0 if higher else change < 0
+            status = "improvement" if better else "regression"
+        rows.append((name, old, new, change, status))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="对比两次基准运行")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.1, help="相对变化超过该比例才判定为回归或改进")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    current = json.loads(args.current.read_text(encoding="utf-8"))
+    print(f"基线: {baseline['meta'].get('commit')}  当前: {current['meta'].get('commit')}")
+    rows = compare(baseline["metrics"], current["metrics"], args.threshold)
+    width = max((len(row[0]) for row in rows), default=0)
+    for name, old, new, change, status in rows:
+        marker = {"regression": "▼", "improvement": "▲"}.get(status, " ")
+        print(f"{marker} {name:<{width}}  {old:>12.3f} → {new:>12.3f}  {change:+8.1%}")
+    regressions = sum(1 for row in rows if row[4] == "regression")
+    print(f"共 {len(rows)} 项指标，回归 {regressions} 项")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,70 @@
+"""
+合成语料模块
+
+生成确定性的中文小说文本，用于离线基准测试
+"""
+import random
+from pathlib import Path
+from typing import List
+
+_CHARS = (
+    "天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏闰余成岁律吕调阳"
+    "云腾致雨露结为霜金生丽水玉出昆冈剑号巨阙珠称夜光果珍李柰菜重芥姜"
+)
+_NAMES = ["林动", "萧炎", "叶凡", "石昊", "韩立", "唐三", "楚风", "秦羽"]
+_PLACES = ["青阳镇", "乌坦城", "荒古禁地", "星辰殿", "万妖山", "天玄宗"]
+_ENDINGS = "。。。！？；，"
+_NUMERALS = "零一二三四五六七八九"
+
+
+def _chinese_number(n: int) -> str:
+    if n < 10:
+        return _NUMERALS[n]
+    if n < 100:
+        tens, ones = divmod(n, 10)
+        return ("" if tens == 1 else _NUMERALS[tens]) + "十" + (_NUMERALS[ones] if ones else "")
+    return str(n)
+
+
+def generate_novel(total_chars: int, seed: int = 0, chapter_chars: int = 6000) -> str:
+    """
+    生成合成小说文本
+
+    Args:
+        total_chars: 目标字符数
+        seed: 随机种子（相同种子生成相同文本）
+        chapter_chars: 平均每章字符数
+    """
+    rng = random.Random(seed)
+    parts: List[str] = []
+    length = 0
+    chapter = 0
+    chapter_length = chapter_chars
+    while length < total_chars:
+        if chapter_length >= chapter_chars:
+            chapter += 1
+            heading = f"\n第{_chinese_number(chapter)}章 {rng.choice(_NAMES)}入{rng.choice(_PLACES)}\n\n"
+            parts.append(heading)
+            length += len(heading)
+            chapter_length = 0
+        words = "".join(rng.choice(_CHARS) for _ in range(rng.randint(8, 40)))
+        if rng.random() < 0.3:
+            words = rng.choice(_NAMES) + "说道：“" + words + "”"
+        sentence = words + rng.choice(_ENDINGS)
+        if rng.random() < 0.15:
+            sentence += "\n\n"
+        parts.append(sentence)
+        length += len(sentence)
+        chapter_length += len(sentence)
+    return "".join(parts)
+
+
+def write_corpus(data_dir: Path, novels: int, chars_per_novel: int, seed: int = 0) -> List[Path]:
+    """在目录中写入若干合成小说文件"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(novels):
+        path = data_dir / f"novel_{i:03d}.txt"
+        path.write_text(generate_novel(chars_per_novel, seed=seed + i), encoding="utf-8")
+        paths.append(path)
+    return paths
@@ -0,0 +1,324 @@
+"""
+离线模型替身
+
+带可配置延迟与失败率的 Chat 模型与 Embedding 模型，不访问网络，
+通过 ModelManager.use 注入，用于在本地复现远程调用的耗时、并发与出错行为
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+_RERANK_MARKER = "文档相关性评估"
+_RERANK_QUESTION = re.compile(r"用户问题：(.*)")
+_RERANK_DOCUMENT = re.compile(r"\[文档 (\d+)\]: (.*)")
+
+
+class FakeServiceError(RuntimeError):
+    """替身模型按失败率抛出的错误，消息模拟远程服务的错误信息"""
+
+
+class FailureInjector:
+    """按固定种子的伪随机序列决定每次调用是否失败，相同种子的调用序列结果相同"""
+
+    def __init__(self, rate: float = 0.0, seed: int = 0, message: str = "503 Service Unavailable"):
+        self.rate = rate
+        self.message = message
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def maybe_fail(self) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            failed = self._rng.random() < self.rate
+            if failed:
+                self.failures += 1
+        if failed:
+            raise FakeServiceError(self.message)
+
+
+class ConcurrencyProbe:
+    """记录同时进行中的调用数及其峰值"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+
+    def __enter__(self) -> "ConcurrencyProbe":
+        with self._lock:
+            self.active += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.active)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        with self._lock:
+            self.active -= 1
+
+
+def _bigrams(text: str) -> Set[str]:
+    text = re.sub(r"\s+", "", text)
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _rerank_scores(prompt: str) -> List[Dict[str, int]]:
+    """按问题与文档预览共有的二元字串比例打 0-10 分：预览截得越短，相关内容越可能被截掉"""
+    match = _RERANK_QUESTION.search(prompt)
+    question = _bigrams(match.group(1)) if match else set()
+    scores = []
+    for index, preview in _RERANK_DOCUMENT.findall(prompt):
+        overlap = len(question & _bigrams(preview)) / len(question) if question else 0.0
+        scores.append({"index": int(index), "score": round(10 * overlap)})
+    return scores
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    延迟可控的 Chat 模型
+
+    重排 Prompt 按问题与各文档预览的字面重合度返回 JSON 评分，其余 Prompt 返回固定回答；
+    同步调用以 time.sleep、异步调用以 asyncio.sleep 模拟远程耗时（可随 Prompt 长度增加），
+    failure_rate > 0 时按比例在等待后抛出 FakeServiceError；
+    usage 按重排 / 生成分别累计调用次数与 Prompt token 数
+    """
+
+    latency: float = 0.5  # 每次调用的耗时（秒）
+    prompt_token_latency: float = 0.0  # Prompt 每个 token 额外的耗时（秒），模拟长 Prompt 的预填充开销
+    token_latency: float = 0.0  # 流式输出时每个字的耗时（秒）
+    answer: str = "根据原文，主角在乌坦城长大，后离开家族外出修炼。"
+    failure_rate: float = 0.0  # 调用失败的比例
+    seed: int = 0  # 失败序列的随机种子
+    _probe: ConcurrencyProbe = PrivateAttr(default_factory=ConcurrencyProbe)
+    _failures: Optional[FailureInjector] = PrivateAttr(default=None)
+    _usage: Dict[str, Dict[str, int]] = PrivateAttr(default_factory=dict)
+    _usage_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._failures = FailureInjector(self.failure_rate, self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency-chat"
+
+    @property
+    def probe(self) -> ConcurrencyProbe:
+        return self._probe
+
+    @property
+    def failures(self) -> int:
+        return self._failures.failures
+
+    @property
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """{"rerank" | "generate": {"calls": 调用次数, "prompt_tokens": Prompt token 总数}}"""
+        with self._usage_lock:
+            return {kind: dict(counts) for kind, counts in self._usage.items()}
+
+    def reset_usage(self) -> None:
+        with self._usage_lock:
+            self._usage = {}
+
+    def _prompt(self, messages: List[BaseMessage]) -> str:
+        """拼接 Prompt 并计入用量"""
+        from core.tokens import get_token_counter
+        prompt = "\n".join(str(message.content) for message in messages)
+        kind = "rerank" if _RERANK_MARKER in prompt else "generate"
+        tokens = get_token_counter().count(prompt)
+        with self._usage_lock:
+            counts = self._usage.setdefault(kind, {"calls": 0, "prompt_tokens": 0})
+            counts["calls"] += 1
+            counts["prompt_tokens"] += tokens
+        return prompt
+
+    def _delay(self, prompt: str) -> float:
+        if not self.prompt_token_latency:
+            return self.latency
+        from core.tokens import get_token_counter
+        return self.latency + self.prompt_token_latency * get_token_counter().count(prompt)
+
+    def _respond(self, prompt: str) -> str:
+        self._failures.maybe_fail()
+        if _RERANK_MARKER in prompt:
+            return json.dumps(_rerank_scores(prompt))
+        return self.answer
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = self._prompt(messages)
+        with self._probe:
+            time.sleep(self._delay(prompt))
+            text = self._respond(prompt)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = self._prompt(messages)
+        with self._probe:
+            await asyncio.sleep(self._delay(prompt))
+            text = self._respond(prompt)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        prompt = self._prompt(messages)
+        with self._probe:
+            time.sleep(self._delay(prompt))
+            for char in self._respond(prompt):
+                time.sleep(self.token_latency)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=char))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        prompt = self._prompt(messages)
+        with self._probe:
+            await asyncio.sleep(self._delay(prompt))
+            for char in self._respond(prompt):
+                await asyncio.sleep(self.token_latency)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=char))
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    延迟可控的确定性 Embedding 模型
+
+    向量由文本哈希生成，相同文本得到相同向量；
+    failure_rate > 0 时按比例抛出模拟配额错误（429）的 FakeServiceError，可触发摄取的退避重试
+    """
+
+    def __init__(
+        self,
+        dim: int = 256,
+        latency: float = 0.05,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.dim = dim
+        self.latency = latency
+        self.model_name = f"fake-embedding-{dim}"
+        self.probe = ConcurrencyProbe()
+        self._failures = FailureInjector(failure_rate, seed, message="429 Resource has been exhausted")
+
+    @property
+    def failures(self) -> int:
+        return self._failures.failures
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.probe:
+            time.sleep(self.latency)
+            self._failures.maybe_fail()
+            return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.probe:
+            time.sleep(self.latency)
+            self._failures.maybe_fail()
+            return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.probe:
+            await asyncio.sleep(self.latency)
+            self._failures.maybe_fail()
+            return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with self.probe:
+            await asyncio.sleep(self.latency)
+            self._failures.maybe_fail()
+            return self._vector(text)
+
+
+class CacheOnlyEmbeddings(Embeddings):
+    """
+    只从 Embedding 持久化缓存取向量的替身
+
+    model_name 与真实模型相同，经 ModelManager.use 套上缓存后复用真实模型已算好的向量；
+    缓存未命中时抛出 FakeServiceError 而不访问网络
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def _miss(self, count: int) -> FakeServiceError:
+        return FakeServiceError(
+            f"Embedding 缓存未命中 {count} 条（{self.model_name}），请先用真实模型摄取或提问一次"
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise self._miss(len(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        raise self._miss(1)
+
+
+def install_fakes(
+    llm: Optional[BaseChatModel] = None,
+    embeddings: Optional[Embeddings] = None,
+    workdir: Optional[Path] = None,
+) -> Path:
+    """
+    将替身模型注入 ModelManager，并把向量库与缓存目录指向临时目录
+
+    Embedding 缓存与查询向量 LRU 仍按配置生效，缓存文件同样写入临时目录
+
+    Returns:
+        本次使用的工作目录
+    """
+    import os
+    import config
+    from core.models import model_manager
+    from core.vectorstore import vectorstore_manager
+    from core.sparse_index import sparse_index_manager
+
+    workdir = workdir or Path(tempfile.mkdtemp(prefix="novel_rag_bench_"))
+    os.environ.setdefault("GOOGLE_API_KEY", "offline")
+    config.config.google.api_key = config.config.google.api_key or "offline"
+    config.VECTORSTORE_DIR = workdir / "vectorstore"
+    config.CACHE_DIR = workdir / "cache"
+    model_manager.use(llm=llm or FakeChatModel(), embeddings=embeddings or FakeEmbeddings())
+    vectorstore_manager.reset()
+    sparse_index_manager.reset()
+    return workdir
@@ -0,0 +1,402 @@
+"""
+检索参数调优工具
+
+给定一组「问题 → 应检索到的文本块」标注（golden set），遍历重排模式、候选数（candidates）、
+最终保留的段落数（k）与重排预览长度（doc_preview_length）的组合，逐个组合完整执行问答，测量：
+- recall@k：标注的文本块出现在送入 LLM 的段落中的比例
+- MRR：第一个命中段落排名的倒数
+- Prompt token：重排与生成两类 Prompt 的平均 token 数
+- 端到端延迟分位数
+
+输出各组合的结果、在（召回、MRR、token、延迟）上的 Pareto 前沿，以及满足延迟预算的推荐组合；
+--write-config 将推荐组合写入 tuning.json，config.py 启动时加载以覆盖默认值
+
+LLM 固定使用替身模型（见 benchmarks/fakes.py），重排评分按问题与预览的字面重合度给出，
+生成耗时随 Prompt 长度增加；Embedding 可选：
+- fake：合成语料 + 确定性替身向量，全程离线，不需要标注时自动从语料生成
+- cached：使用已有向量库与 Embedding 缓存（真实模型算好的向量），标注问题的查询向量也须在缓存中
+
+标注文件为 JSONL，每行 {"question": ..., "chunk_ids": [...], "evidence": [...], "novel": ...}，
+chunk_ids 与 evidence（原文片段）至少给出一项，novel 可选（限定检索范围）
+
+用法:
+    python -m benchmarks.tune_retrieval [--golden golden.jsonl] [--latency-budget 800] [--write-config]
+    python -m benchmarks.tune_retrieval --embeddings cached --golden golden.jsonl
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from benchmarks.corpus import write_corpus
+from benchmarks.fakes import CacheOnlyEmbeddings, FakeChatModel, FakeEmbeddings, install_fakes
+
+MODES = ("off", "local", "llm")
+_EVIDENCE_CHARS = 40
+_QUESTION_CHARS = 16
+
+
+@dataclass
+class GoldenItem:
+    """一条标注：问题与应检索到的文本块（ID 或原文片段）"""
+    question: str
+    chunk_ids: List[str] = field(default_factory=list)
+    evidence: List[str] = field(default_factory=list)
+    novel: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Setting:
+    """一组待评估的检索参数"""
+    mode: str  # off | local | llm
+    candidates: int
+    k: int
+    preview: int
+
+    @property
+    def label(self) -> str:
+        return f"mode={self.mode},candidates={self.candidates},k={self.k},preview={self.preview}"
+
+
+# ── 标注 ──────────────────────────────────────────────────
+
+def load_golden(path: Path) -> List[GoldenItem]:
+    items = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            data = json.loads(line)
+            items.append(GoldenItem(
+                question=data["question"],
+                chunk_ids=list(data.get("chunk_ids", [])),
+                evidence=list(data.get("evidence", [])),
+                novel=data.get("novel"),
+            ))
+    return items
+
+
+def save_golden(items: Sequence[GoldenItem], path: Path) -> None:
+    path.write_text(
+        "".join(json.dumps(asdict(item), ensure_ascii=False) + "\n" for item in items),
+        encoding="utf-8",
+    )
+
+
+def _middle(text: str, length: int) -> str:
+    """文本中间的一段：分块重叠只发生在首尾，中间片段只属于这一个文本块"""
+    text = text.strip()
+    start = max(0, (len(text) - length) // 2)
+    return text[start:start + length]
+
+
+def synthesize_golden(count: int, seed: int = 0) -> List[GoldenItem]:
+    """
+    从已入库的文本块随机抽样生成标注
+
+    问题引用文本块中间的一句原文，依赖字面匹配（BM25、重排预览）才能找回，
+    适合替身向量这类不含语义的场景
+    """
+    from config import VECTORSTORE_DIR
+    from core.vectorstore import vectorstore_manager
+    from services.manifest import IngestManifest
+
+    manifest = IngestManifest(VECTORSTORE_DIR / "manifest.json")
+    chunk_ids = sorted(chunk_id for record in manifest.files.values() for chunk_id in record.chunk_ids)
+    sample = random.Random(seed).sample(chunk_ids, min(count, len(chunk_ids)))
+    items = []
+    for doc in vectorstore_manager.get_documents(sample):
+        quote = _middle(doc.page_content, _QUESTION_CHARS).replace("\n", "")
+        items.append(GoldenItem(
+            question=f"原文中「{quote}」这段情节讲了什么？",
+            chunk_ids=[doc.id],
+            evidence=[_middle(doc.page_content, _EVIDENCE_CHARS)],
+        ))
+    return items
+
+
+def resolve_evidence(items: Sequence[GoldenItem]) -> None:
+    """只标注了文本块 ID 的条目，从向量库读取原文补上片段（单个文本块的段落不带 ID，统一按原文匹配）"""
+    from core.vectorstore import vectorstore_manager
+
+    missing = sorted({chunk_id for item in items if not item.evidence for chunk_id in item.chunk_ids})
+    texts = {doc.id: doc.page_content for doc in vectorstore_manager.get_documents(missing)}
+    for item in items:
+        if not item.evidence:
+            item.evidence = [
+                _middle(texts[chunk_id], _EVIDENCE_CHARS) for chunk_id in item.chunk_ids if chunk_id in texts
+            ]
+        if not item.evidence:
+            raise ValueError(f"标注缺少可匹配的文本块: {item.question}")
+
+
+# ── 评估 ──────────────────────────────────────────────────
+
+def grid(modes: Sequence[str], candidates: Sequence[int], ks: Sequence[int], previews: Sequence[int]) -> List[Setting]:
+    """参数组合：不重排时候选数与预览长度无意义，本地重排时预览长度无意义，对应维度只取一个值"""
+    settings = []
+    for mode in modes:
+        for candidate, k, preview in itertools.product(
+            candidates if mode != "off" else [max(ks)],
+            ks,
+            previews if mode == "llm" else [previews[0]],
+        ):
+            if candidate >= k:
+                settings.append(Setting(mode, candidate, k, preview))
+    return settings
+
+
+def k_field() -> str:
+    """最终保留段落数对应的配置项（与 config.result_k 一致）"""
+    from config import config
+    return "context.max_passages" if config.context.token_budget > 0 else "retrieval.search_k"
+
+
+def apply_setting(setting: Setting) -> None:
+    from config import config
+    from services.qa_service import qa_service
+
+    config.rerank.enabled = setting.mode != "off"
+    if setting.mode != "off":
+        config.rerank.mode = setting.mode
+    config.rerank.candidates = setting.candidates
+    config.rerank.doc_preview_length = setting.preview
+    section, key = k_field().split(".")
+    setattr(getattr(config, section), key, setting.k)
+    # 重排器与检索器在服务初始化时按配置创建
+    qa_service.reload()
+
+
+def _rank_of_first_hit(item: GoldenItem, contents: List[str]) -> Optional[int]:
+    for rank, content in enumerate(contents, 1):
+        if any(evidence in content for evidence in item.evidence):
+            return rank
+    return None
+
+
+def evaluate(setting: Setting, items: Sequence[GoldenItem], llm: FakeChatModel) -> Dict[str, object]:
+    """按一组参数逐条提问，统计召回、MRR、Prompt token 与延迟"""
+    from services.qa_service import qa_service
+    from utils.exceptions import NovelRAGError
+
+    apply_setting(setting)
+    llm.reset_usage()
+    recalls: List[float] = []
+    reciprocal_ranks: List[float] = []
+    latencies: List[float] = []
+    passages: List[int] = []
+    errors = degraded = 0
+    for item in items:
+        started = time.perf_counter()
+        try:
+            response = qa_service.ask(item.question, item.novel)
+        except NovelRAGError:
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        degraded += bool(response.metadata.get("skipped_stages"))
+        contents = [source["content"] for source in response.sources]
+        passages.append(len(contents))
+        found = sum(any(evidence in content for content in contents) for evidence in item.evidence)
+        recalls.append(found / len(item.evidence))
+        rank = _rank_of_first_hit(item, contents)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    answered = max(len(latencies), 1)
+    usage = llm.usage
+    tokens = {
+        kind: round(usage.get(kind, {}).get("prompt_tokens", 0) / answered, 1)
+        for kind in ("rerank", "generate")
+    }
+    ms = np.asarray(latencies or [0.0])
+    return {
+        "setting": asdict(setting),
+        "label": setting.label,
+        "questions": len(items),
+        "errors": errors,
+        "degraded": degraded,
+        "recall_at_k": round(float(np.mean(recalls)) if recalls else 0.0, 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0, 4),
+        "passages": round(float(np.mean(passages)) if passages else 0.0, 2),
+        "prompt_tokens": {**tokens, "total": round(sum(tokens.values()), 1)},
+        "latency": {
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "mean_ms": round(float(ms.mean()), 3),
+        },
+    }
+
+
+# ── 选择 ──────────────────────────────────────────────────
+
+def _objectives(result: Dict[str, object]) -> tuple:
+    """越大越好的目标向量"""
+    return (
+        result["recall_at_k"],
+        result["mrr"],
+        -result["prompt_tokens"]["total"],
+        -result["latency"]["p95_ms"],
+    )
+
+
+def pareto_front(results: Sequence[Dict[str, object]]) -> List[Dict[str, object]]:
+    """不被任何其他组合在全部目标上同时不差、且至少一项更好的组合，按召回降序"""
+    points = [_objectives(result) for result in results]
+    front = []
+    for result, point in zip(results, points):
+        dominated = any(
+            other != point and all(o >= p for o, p in zip(other, point))
+            for other in points
+        )
+        if not dominated:
+            front.append(result)
+    return sorted(front, key=_objectives, reverse=True)
+
+
+def recommend(
+    front: Sequence[Dict[str, object]],
+    latency_budget_ms: Optional[float] = None,
+) -> Optional[Dict[str, object]]:
+    """前沿中 p95 延迟不超过预算、召回与 MRR 最高（其次 token 与延迟最低）的组合"""
+    candidates = [
+        result for result in front
+        if not result["errors"]
+        and (latency_budget_ms is None or result["latency"]["p95_ms"] <= latency_budget_ms)
+    ]
+    return max(candidates, key=_objectives) if candidates else None
+
+
+def to_overrides(setting: Dict[str, object]) -> Dict[str, Dict[str, object]]:
+    """推荐组合 → tuning.json 内容（config.apply_overrides 的格式）"""
+    section, key = k_field().split(".")
+    rerank: Dict[str, object] = {"enabled": setting["mode"] != "off"}
+    if setting["mode"] != "off":
+        rerank.update(mode=setting["mode"], candidates=setting["candidates"])
+    if setting["mode"] == "llm":
+        rerank["doc_preview_length"] = setting["preview"]
+    return {"rerank": rerank, section: {key: setting["k"]}}
+
+
+# ── 入口 ──────────────────────────────────────────────────
+
+def _ints(text: str) -> List[int]:
+    return [int(value) for value in text.split(",") if value]
+
+
+def _prepare(args: argparse.Namespace, llm: FakeChatModel) -> List[GoldenItem]:
+    """注入模型、准备向量库，返回标注"""
+    from config import config
+    from core.models import model_manager
+    from core.sparse_index import sparse_index_manager
+    from core.vectorstore import vectorstore_manager
+    from services.ingest_service import IngestService
+
+    if args.embeddings == "cached":
+        if not args.golden:
+            raise SystemExit("--embeddings cached 需要 --golden 标注文件（问题的查询向量须已在缓存中）")
+        config.embedding_cache.enabled = True
+        config.google.api_key = config.google.api_key or "offline"
+        model_manager.use(llm=llm, embeddings=CacheOnlyEmbeddings(config.google.embedding_model))
+        vectorstore_manager.reset()
+        sparse_index_manager.reset()
+        items = load_golden(args.golden)
+    else:
+        workdir = install_fakes(llm=llm, embeddings=FakeEmbeddings(dim=args.dim, latency=args.embed_latency))
+        data_dir = workdir / "data"
+        write_corpus(data_dir, novels=args.novels, chars_per_novel=args.chars // args.novels, seed=args.seed)
+        IngestService(data_dir).ingest()
+        items = load_golden(args.golden) if args.golden else synthesize_golden(args.generate, args.seed)
+    resolve_evidence(items)
+    if args.save_golden:
+        save_golden(items, args.save_golden)
+    return items
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, object]:
+    parser = argparse.ArgumentParser(description="检索参数调优")
+    parser.add_argument("--golden", type=Path, help="标注文件（JSONL），fake 模式缺省时从语料生成")
+    parser.add_argument("--save-golden", type=Path, help="保存本次使用的标注（含补全的原文片段）")
+    parser.add_argument("--embeddings", choices=("fake", "cached"), default="fake", help="Embedding 来源")
+    parser.add_argument("--generate", type=int, default=40, help="自动生成的标注条数")
+    parser.add_argument("--chars", type=int, default=300_000, help="fake 模式合成语料总字符数")
+    parser.add_argument("--novels", type=int, default=3, help="fake 模式合成小说数")
+    parser.add_argument("--dim", type=int, default=256, help="替身 Embedding 维度")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="替身 Embedding 每次调用耗时（秒）")
+    parser.add_argument("--modes", default=",".join(MODES), help="重排模式，逗号分隔")
+    parser.add_argument("--candidates", default="10,15,20,30", help="候选数，逗号分隔")
+    parser.add_argument("--k", default="3,5,8", help="最终保留段落数，逗号分隔")
+    parser.add_argument("--preview", default="150,300,500", help="重排预览长度，逗号分隔")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="替身 LLM 每次调用的固定耗时（秒）")
+    parser.add_argument(
+        "--prompt-token-latency", type=float, default=0.00002, help="替身 LLM 每个 Prompt token 的耗时（秒）"
+    )
+    parser.add_argument("--latency-budget", type=float, help="p95 延迟预算（毫秒），推荐组合须在预算内")
+    parser.add_argument(
+        "--write-config", nargs="?", type=Path, const=True, default=None,
+        help="将推荐组合写入 tuning.json（或指定路径）",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="语料与标注抽样的随机种子")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径，缺省输出到标准输出")
+    args = parser.parse_args(argv)
+
+    from config import TUNING_FILE, config
+
+    llm = FakeChatModel(latency=args.llm_latency, prompt_token_latency=args.prompt_token_latency)
+    items = _prepare(args, llm)
+    # 每个组合都应实际执行检索、重排与生成
+    config.answer_cache.enabled = False
+    config.rerank.cache_enabled = False
+
+    settings = grid(
+        [mode for mode in args.modes.split(",") if mode],
+        _ints(args.candidates), _ints(args.k), _ints(args.preview),
+    )
+    results = []
+    for i, setting in enumerate(settings, 1):
+        result = evaluate(setting, items, llm)
+        results.append(result)
+        print(
+            f"[{i}/{len(settings)}] {setting.label}: recall={result['recall_at_k']:.3f} "
+            f"mrr={result['mrr']:.3f} tokens={result['prompt_tokens']['total']:.0f} "
+            f"p95={result['latency']['p95_ms']:.0f}ms",
+            file=sys.stderr,
+        )
+
+    front = pareto_front(results)
+    best = recommend(front, args.latency_budget)
+    report = {
+        "meta": {
+            "embeddings": args.embeddings,
+            "questions": len(items),
+            "k_field": k_field(),
+            "latency_budget_ms": args.latency_budget,
+            "params": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        },
+        "results": results,
+        "pareto": [result["label"] for result in front],
+        "recommended": best,
+        "overrides": to_overrides(best["setting"]) if best else None,
+    }
+    if args.write_config is not None:
+        if best is None:
+            print("没有满足延迟预算的组合，未写入配置", file=sys.stderr)
+        else:
+            path = TUNING_FILE if args.write_config is True else args.write_config
+            path.write_text(json.dumps(report["overrides"], ensure_ascii=False, indent=2), encoding="utf-8")
+            print(f"已写入 {path}", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
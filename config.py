@@ -3,6 +3,7 @@
 
 集中管理所有配置项，支持环境变量覆盖
 """
+import json
 import os
 from pathlib import Path
 from dataclasses import dataclass, field
@@ -14,6 +15,8 @@ BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 VECTORSTORE_DIR = BASE_DIR / "vectorstore"
 LOG_DIR = BASE_DIR / "logs"
+CACHE_DIR = BASE_DIR / "cache"
+TUNING_FILE = BASE_DIR / "tuning.json"  # 检索参数调优结果（benchmarks/tune_retrieval.py 写出），存在时覆盖默认值
 
 
 @dataclass
@@ -30,30 +33,165 @@ class ChunkConfig:
     """文本分块配置"""
     chunk_size: int = 500
     chunk_overlap: int = 50
+    splitter: str = "chinese_novel"  # chinese_novel: 单遍中文小说分块；recursive: LangChain 递归分块
     separators: tuple = ("\n\n", "\n", "。", "！", "？", "；", "，", " ", "")
 
 
 @dataclass
 class RetrievalConfig:
     """检索配置"""
-    search_k: int = 5  # 最终返回给 LLM 的文档数量
+    search_k: int = 5  # 最终返回给 LLM 的文档数量（启用 context.token_budget 时改为 max_passages 个候选按预算打包）
+    hybrid: bool = True  # 启用 BM25 + 向量混合检索
+    sparse_k: int = 20  # BM25 检索的候选数量
+    rrf_k: int = 60  # 倒数排名融合（RRF）平滑常数
+    merge_passages: bool = True  # 合并同一来源中重叠或相邻的文本块后再送入 LLM
+    merge_gap: int = 2  # 间隔不超过该字符数（分块时去掉的空白）的文本块视为相邻
+
+
+@dataclass
+class ContextConfig:
+    """送入 LLM 的上下文配置"""
+    token_budget: int = 0  # 上下文 token 预算（如 3072），0 表示不按预算打包（固定取 search_k 个文档）
+    max_passages: int = 12  # 启用预算时，检索 / 重排保留的候选段落上限
+    min_tail_tokens: int = 48  # 预算剩余不足该值时不再截断放入下一个段落
+    tokenizer: str = "cl100k_base"  # tiktoken 编码名称，无法加载时按字符估算
 
 
 @dataclass  
 class RerankConfig:
     """重排配置（核心功能）"""
     enabled: bool = True
+    mode: str = "llm"  # llm: Gemini 评分；local: 本地特征打分（无网络调用）
     candidates: int = 15  # 初始检索的候选文档数量
     doc_preview_length: int = 300  # 重排时文档预览长度
+    cache_enabled: bool = True  # 缓存 (问题, 文本块) 的 LLM 评分
+    cache_size: int = 50_000  # 最大缓存评分条数
+    cache_ttl: float = 24 * 3600  # 评分缓存过期时间（秒），0 表示不过期
+    shard_size: int = 0  # > 0 时候选按该大小分片、并行调用 LLM 评分；0 表示单个 Prompt
+    max_parallel_shards: int = 4  # 单次重排同时评分的分片数上限
+    shard_timeout: float = 20.0  # 分片评分超时（秒），超时分片按检索排名兜底
     
 
+@dataclass
+class VectorStoreConfig:
+    """向量存储配置"""
+    backend: str = "chroma"  # chroma | numpy（内存映射矩阵，精确检索）
+    per_novel: bool = True  # 按小说分片存储（每部小说一个集合），支持限定范围检索
+    numpy_dtype: str = "float32"  # numpy 后端的向量精度，float16 体积减半
+    # 以下为 numpy 后端的近似检索参数
+    index: str = "flat"  # flat（精确）| ivfpq（倒排 + 乘积量化，百万级文本块使用）
+    ivf_lists: int = 0  # 簇数量，0 表示按 4·√N 自动选择
+    pq_subspaces: int = 16  # PQ 子空间数（每个向量压缩为该字节数），需整除向量维度
+    nprobe: int = 32  # 每次查询扫描的簇数量，越大召回越高、越慢
+    rescore: int = 400  # 近似分数最高的多少个候选用原始向量精确重算，0 表示不重算
+    ann_min_rows: int = 50_000  # 文本块数达到该值才构建索引，之前精确检索
+    ann_rebuild_ratio: float = 0.2  # 索引之后新增/删除的行超过该比例时重建
+
+
+@dataclass
+class AnswerCacheConfig:
+    """语义回答缓存配置"""
+    enabled: bool = True
+    max_entries: int = 2048  # 最大缓存回答数，超出按最近命中淘汰
+    similarity_threshold: float = 0.95  # 问题向量余弦相似度达到该值即复用回答
+    ttl: float = 6 * 3600  # 过期时间（秒），0 表示不过期
+
+
+@dataclass
+class EmbeddingCacheConfig:
+    """Embedding 持久化缓存配置"""
+    enabled: bool = True
+    max_entries: int = 500_000  # 最大缓存向量数，超出按最近使用淘汰
+    query_lru_size: int = 4096  # 进程内查询向量 LRU 容量，0 表示关闭
+
+
+@dataclass
+class IngestConfig:
+    """摄取流水线配置"""
+    streaming: bool = True  # 流式摄取：增量读取、按窗口向量化并写入
+    read_block_chars: int = 65536  # 每次读取的字符数
+    window_chunks: int = 256  # 每个写入窗口的文本块数
+    prefetch_windows: int = 2  # 预取窗口数（读取/分块与向量化之间的背压）
+    job_history: int = 50  # 后台摄取任务保留的已结束任务数
+
+
+@dataclass
+class EmbeddingSchedulerConfig:
+    """摄取时的批量 Embedding 调度配置"""
+    batch_size: int = 100  # 每次请求的文本块数
+    max_concurrency: int = 4  # 并发请求数
+    requests_per_minute: float = 300  # 每分钟请求上限，0 表示不限
+    max_retries: int = 5  # 限流错误最大重试次数
+    backoff_base: float = 1.0  # 退避基数（秒）
+    backoff_max: float = 30.0  # 单次退避上限（秒）
+
+
+@dataclass
+class DeadlineConfig:
+    """单次问答的耗时预算（秒），可选阶段超出预算时被跳过"""
+    enabled: bool = True
+    total: float = 20.0  # 整个请求的截止时间
+    embed: float = 3.0  # 查询向量计算
+    search: float = 2.0  # 向量检索（与 embed 合计超时则只用 BM25 结果）
+    rerank: float = 5.0  # 重排，超时按检索顺序返回
+    generate: float = 15.0  # 回答生成，超时返回提示与参考段落
+    breaker_failures: int = 3  # 重排连续失败（含慢调用）多少次后熔断
+    breaker_slow_call: float = 4.0  # 重排耗时超过该值计为失败
+    breaker_reset: float = 30.0  # 熔断多久后放行探测请求
+
+
+@dataclass
+class ServingConfig:
+    """Web 服务配置"""
+    concurrency_limit: int = 32  # 同时处理的问答请求数（异步处理，不占用工作线程）
+
+
+@dataclass
+class StartupConfig:
+    """启动配置"""
+    warmup: bool = True  # 启动时在后台线程预热：打开向量库、读入索引、构建问答链
+    warmup_embedding: bool = False  # 预热时发送一次 Embedding 请求（建立连接，会产生一次 API 调用）
+
+
+@dataclass
+class MetricsConfig:
+    """指标与追踪配置"""
+    enabled: bool = False  # 记录阶段耗时直方图、缓存命中等计数器与进行中数量
+    host: str = "127.0.0.1"  # /metrics 端点监听地址（Prometheus 文本格式）
+    port: int = 9464  # /metrics 端点端口，0 表示不启动端点
+    trace: bool = True  # 启用时在响应 metadata["trace"] 中附带本次请求的阶段 span
+
+
 @dataclass
 class AppConfig:
     """应用配置"""
     google: GoogleConfig = field(default_factory=GoogleConfig)
     chunk: ChunkConfig = field(default_factory=ChunkConfig)
     retrieval: RetrievalConfig = field(default_factory=RetrievalConfig)
+    context: ContextConfig = field(default_factory=ContextConfig)
     rerank: RerankConfig = field(default_factory=RerankConfig)
+    vectorstore: VectorStoreConfig = field(default_factory=VectorStoreConfig)
+    answer_cache: AnswerCacheConfig = field(default_factory=AnswerCacheConfig)
+    ingest: IngestConfig = field(default_factory=IngestConfig)
+    embedding_cache: EmbeddingCacheConfig = field(default_factory=EmbeddingCacheConfig)
+    embedding_scheduler: EmbeddingSchedulerConfig = field(default_factory=EmbeddingSchedulerConfig)
+    deadline: DeadlineConfig = field(default_factory=DeadlineConfig)
+    serving: ServingConfig = field(default_factory=ServingConfig)
+    startup: StartupConfig = field(default_factory=StartupConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    
+    @property
+    def chunking_signature(self) -> str:
+        """分块参数签名，变化时需要重新摄取全部文件"""
+        chunk = self.chunk
+        return f"{chunk.splitter}:{chunk.chunk_size}:{chunk.chunk_overlap}:{'|'.join(chunk.separators)}"
+    
+    @property
+    def result_k(self) -> int:
+        """检索与重排最终保留的文档数：启用 token 预算时为候选上限，再由打包器按预算截取"""
+        if self.context.token_budget > 0:
+            return self.context.max_passages
+        return self.retrieval.search_k
     
     @property
     def is_configured(self) -> bool:
@@ -61,12 +199,35 @@ class AppConfig:
         return bool(self.google.api_key)
 
 
+def apply_overrides(target: AppConfig, overrides: dict) -> None:
+    """
+    按 {"节名": {"字段": 值}} 覆盖配置项，如 {"rerank": {"candidates": 20}}
+    
+    Raises:
+        ConfigurationError: 节名或字段不存在
+    """
+    from utils.exceptions import ConfigurationError
+    for section, values in overrides.items():
+        settings = getattr(target, section, None)
+        if settings is None or not isinstance(values, dict):
+            raise ConfigurationError("未知的配置节", section)
+        for key, value in values.items():
+            if not hasattr(settings, key):
+                raise ConfigurationError("未知的配置项", f"{section}.{key}")
+            setattr(settings, key, value)
+
+
 # ── 全局配置实例 ──────────────────────────────────────────
 config = AppConfig()
 
 # ── 初始化日志 ──────────────────────────────────────────────
 logger = setup_logger("novel_rag", log_file=LOG_DIR / "app.log")
 
+# ── 调优结果覆盖默认值 ──────────────────────────────────────
+if TUNING_FILE.exists():
+    apply_overrides(config, json.loads(TUNING_FILE.read_text(encoding="utf-8")))
+    logger.info(f"已应用调优配置: {TUNING_FILE}")
+
 # ── 向后兼容：导出原有常量 ─────────────────────────────────
 GOOGLE_API_KEY = config.google.api_key
 EMBEDDING_MODEL = config.google.embedding_model
@@ -1,20 +1,45 @@
-"""核心业务模块"""
-from core.models import model_manager, ModelManager
-from core.vectorstore import vectorstore_manager, VectorStoreManager
-from core.reranker import GeminiReranker, create_reranker
-from core.retriever import RAGRetriever, create_retriever
-from core.prompts import Prompts, format_docs_for_context, format_docs_for_rerank
+"""
+核心业务模块
 
-__all__ = [
-    "model_manager",
-    "ModelManager",
-    "vectorstore_manager",
-    "VectorStoreManager",
-    "GeminiReranker",
-    "create_reranker",
-    "RAGRetriever",
-    "create_retriever",
-    "Prompts",
-    "format_docs_for_context",
-    "format_docs_for_rerank",
-]
+导出项在首次访问时才导入所在子模块：导入 core.tokens 等轻量子模块时，
+不会连带导入重排、检索等依赖 LangChain 的模块
+"""
+import importlib
+
+_EXPORTS = {
+    "model_manager": "core.models",
+    "ModelManager": "core.models",
+    "QueryContext": "core.context",
+    "vectorstore_manager": "core.vectorstore",
+    "VectorStoreManager": "core.vectorstore",
+    "VectorBackend": "core.vectorstore",
+    "ChromaBackend": "core.vectorstore",
+    "NovelEntry": "core.novel_registry",
+    "NovelRegistry": "core.novel_registry",
+    "BaseReranker": "core.reranker",
+    "GeminiReranker": "core.reranker",
+    "LocalReranker": "core.reranker",
+    "create_reranker": "core.reranker",
+    "RAGRetriever": "core.retriever",
+    "create_retriever": "core.retriever",
+    "merge_passages": "core.passages",
+    "assemble_context": "core.passages",
+    "Prompts": "core.prompts",
+    "format_docs_for_context": "core.prompts",
+    "format_docs_for_rerank": "core.prompts",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
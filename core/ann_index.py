@@ -0,0 +1,255 @@
+"""
+IVF-PQ 近似最近邻索引
+
+供 NumPy 向量后端在大规模文本块（百万级）下使用：
+- 倒排（IVF）：k-means 把向量划分为 nlist 个簇，查询只扫描最近的 nprobe 个簇
+- 乘积量化（PQ）：向量与所属簇中心的残差切分为 m 个子空间，每个子空间用 1 字节码表示，
+  每个向量只占 m 字节；查询时按子空间查表求和得到近似内积
+- 近似分数最高的若干候选再用原始向量精确计算，保证排序质量
+
+向量均为 L2 归一化，分数为内积（即余弦相似度）
+
+持久化目录结构（以 .npy 保存，码本与倒排表按内存映射加载）:
+    meta.json        参数与已索引的行数
+    centroids.npy    簇中心 (nlist, dim)，float32
+    codebooks.npy    PQ 码本 (m, 256, dim/m)，float32
+    list_offsets.npy 各簇在 list_rows / codes 中的起止位置 (nlist + 1,)，int64
+    list_rows.npy    按簇排列的行号，int32
+    codes.npy        按簇排列的 PQ 码 (n, m)，uint8
+"""
+import json
+import shutil
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.exceptions import VectorStoreError
+
+logger = get_logger("novel_rag.ann_index")
+
+FORMAT_VERSION = 1
+_PQ_CENTROIDS = 256
+_KMEANS_ITERS = 12
+_ASSIGN_BLOCK = 16384
+
+
+def _kmeans(vectors: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd k-means，返回 (k, dim) 的簇中心；空簇用随机样本重新初始化"""
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=len(vectors) < k)].copy()
+    for _ in range(iters):
+        labels = _assign(vectors, centroids)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        # 按簇排序后分段求和（比 np.add.at 快一个数量级）
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(vectors[order], starts[~empty], axis=0)
+        centroids[~empty] = sums / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """按 L2 距离分配最近的簇中心（分块计算，控制内存）"""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK):
+        block = vectors[start:start + _ASSIGN_BLOCK]
+        # argmin ||x - c||² = argmax (x·c - ||c||²/2)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return labels
+
+
+class IVFPQIndex:
+    """IVF-PQ 索引（只读，重建时整体替换）"""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        list_offsets: np.ndarray,
+        list_rows: np.ndarray,
+        codes: np.ndarray,
+        rows: int,
+    ):
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.codes = codes
+        self.rows = rows  # 已索引的行数，行号 [0, rows) 均在索引中
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def m(self) -> int:
+        return len(self.codebooks)
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """索引占用的字节数"""
+        return sum(
+            a.nbytes for a in (self.centroids, self.codebooks, self.list_offsets, self.list_rows, self.codes)
+        )
+
+    # ── 构建 ──────────────────────────────────────────────────
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        nlist: int = 0,
+        m: int = 16,
+        train_size: int = 100_000,
+        seed: int = 0,
+    ) -> "IVFPQIndex":
+        """
+        训练并构建索引
+
+        Args:
+            vectors: (n, dim) 归一化向量，可为内存映射数组；行号即向量在后端中的行号
+            nlist: 簇数量，0 表示按 4·√n 自动选择
+            m: PQ 子空间数量，必须整除向量维度
+            train_size: 训练样本数上限
+            seed: 随机种子
+        """
+        n, dim = vectors.shape
+        if dim % m:
+            raise VectorStoreError("PQ 子空间数必须整除向量维度", f"dim={dim}, m={m}")
+        nlist = nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        sample_rows = np.sort(rng.choice(n, size=min(n, train_size), replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        logger.info(f"训练 IVF-PQ 索引: {n} 个向量, nlist={nlist}, m={m}, 训练样本 {len(sample)}")
+        # 每个簇中心约 32 个样本、每个 PQ 码字约 64 个样本即可收敛，子采样以控制训练耗时
+        coarse_sample = sample[rng.choice(len(sample), size=min(len(sample), nlist * 32), replace=False)]
+        centroids = _kmeans(coarse_sample, nlist, _KMEANS_ITERS, rng)
+
+        dsub = dim // m
+        pq_sample = sample[rng.choice(len(sample), size=min(len(sample), _PQ_CENTROIDS * 64), replace=False)]
+        residuals = (pq_sample - centroids[_assign(pq_sample, centroids)]).reshape(len(pq_sample), m, dsub)
+        codebooks = np.stack([
+            _kmeans(np.ascontiguousarray(residuals[:, j]), _PQ_CENTROIDS, _KMEANS_ITERS, rng)
+            for j in range(m)
+        ])
+
+        labels = np.empty(n, dtype=np.int64)
+        codes = np.empty((n, m), dtype=np.uint8)
+        for start in range(0, n, _ASSIGN_BLOCK):
+            block = np.asarray(vectors[start:start + _ASSIGN_BLOCK], dtype=np.float32)
+            block_labels = _assign(block, centroids)
+            labels[start:start + len(block)] = block_labels
+            codes[start:start + len(block)] = cls._encode(block - centroids[block_labels], codebooks)
+
+        order = np.argsort(labels, kind="stable")
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=list_offsets[1:])
+        return cls(centroids, codebooks, list_offsets, order.astype(np.int32), codes[order], n)
+
+    @staticmethod
+    def _encode(residuals: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+        m, _, dsub = codebooks.shape
+        sub = residuals.reshape(len(residuals), m, dsub)
+        return np.stack([_assign(sub[:, j], codebooks[j]) for j in range(m)], axis=1).astype(np.uint8)
+
+    # ── 检索 ──────────────────────────────────────────────────
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        nprobe: int,
+        alive: Optional[np.ndarray] = None,
+        rescore: int = 0,
+        exact_fn: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索单个查询向量
+
+        Args:
+            query: (dim,) 归一化查询向量
+            k: 返回数量
+            nprobe: 扫描的簇数量
+            alive: 行是否有效的掩码，已删除的行不返回
+            rescore: 取近似分数最高的多少个候选做精确重算，0 表示不重算
+            exact_fn: 行号数组 → 这些行的原始向量，rescore > 0 时使用
+
+        Returns:
+            (行号, 分数)，按分数降序
+        """
+        coarse = self.centroids @ query
+        nprobe = min(nprobe, self.nlist)
+        probes = np.argpartition(-coarse, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        starts, ends = self.list_offsets[probes], self.list_offsets[probes + 1]
+        positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows = np.asarray(self.list_rows[positions], dtype=np.int64)
+        # 内积 q·x ≈ q·c + Σ_j q_j·codebook_j[code_j]，查表与簇无关
+        m, _, dsub = self.codebooks.shape
+        table = np.einsum("jd,jcd->jc", query.reshape(m, dsub), self.codebooks)
+        scores = table[np.arange(m), np.asarray(self.codes[positions])].sum(axis=1)
+        scores += np.repeat(coarse[probes], ends - starts)
+        if alive is not None:
+            scores[~alive[rows]] = -np.inf
+
+        keep = max(k, rescore) if exact_fn is not None and rescore > 0 else k
+        top = _top(scores, keep)
+        rows, scores = rows[top], scores[top]
+        rows, scores = rows[np.isfinite(scores)], scores[np.isfinite(scores)]
+        if exact_fn is not None and rescore > 0 and len(rows):
+            order = np.argsort(rows)  # 按行号顺序读取，对内存映射更友好
+            exact = np.empty(len(rows), dtype=np.float32)
+            exact[order] = np.asarray(exact_fn(rows[order]), dtype=np.float32) @ query
+            scores = exact
+        top = _top(scores, k)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top].astype(np.float32)
+
+    # ── 持久化 ────────────────────────────────────────────────
+
+    def save(self, directory: Path) -> None:
+        """写入临时目录后整体替换，保证目录中始终是完整索引"""
+        tmp = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name in ("centroids", "codebooks", "list_offsets", "list_rows", "codes"):
+            np.save(tmp / f"{name}.npy", np.asarray(getattr(self, name)))
+        meta = {"version": FORMAT_VERSION, "rows": self.rows, "nlist": self.nlist, "m": self.m, "dim": self.dim}
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        shutil.rmtree(directory, ignore_errors=True)
+        tmp.rename(directory)
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["IVFPQIndex"]:
+        """加载索引，不存在或格式不符时返回 None"""
+        meta_path = directory / "meta.json"
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("version") != FORMAT_VERSION:
+            return None
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode="r" if name in ("list_rows", "codes") else None)
+            for name in ("centroids", "codebooks", "list_offsets", "list_rows", "codes")
+        }
+        return cls(rows=meta["rows"], **arrays)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """分数最高的 k 个位置（未排序）"""
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    return np.argpartition(-scores, k - 1)[:k]
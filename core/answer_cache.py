@@ -0,0 +1,195 @@
+"""
+语义回答缓存模块
+
+按问题向量缓存完整回答：新问题与已缓存问题的余弦相似度超过阈值时直接复用回答，
+同一问题的不同问法（如「主角是谁」「这本书的主角是谁？」）无需再走检索、重排与生成
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    语义回答缓存
+
+    - 问题向量归一化后存放在预分配的 float32 矩阵中，查询为一次矩阵-向量乘法
+    - 超过 max_entries 时淘汰最久未命中的条目
+    - ttl > 0 时条目在写入 ttl 秒后过期
+    - version_fn 返回值变化时整体失效（如向量库版本变化）
+    - 条目带命名空间（如检索范围），只在同一命名空间内匹配
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        threshold: float = 0.95,
+        ttl: float = 0,
+        version_fn: Optional[Callable[[], Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_entries: 最大缓存回答数
+            threshold: 命中所需的最小余弦相似度
+            ttl: 过期时间（秒），0 表示不过期
+            version_fn: 索引版本函数
+            clock: 时钟函数
+        """
+        self._max_entries = max(1, max_entries)
+        self._threshold = threshold
+        self._ttl = ttl
+        self._version_fn = version_fn
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._version = version_fn() if version_fn else None
+        self._vectors: Optional[np.ndarray] = None  # 首次写入时按向量维度分配
+        self._values: list = [None] * self._max_entries
+        # 命名空间映射为整数 ID，按 ID 数组做向量化掩码；不再占用任何条目的命名空间随淘汰移除
+        self._namespace_ids: Dict[Hashable, int] = {}
+        self._next_namespace_id = 0
+        self._namespaces = np.full(self._max_entries, -1, dtype=np.int64)
+        self._valid = np.zeros(self._max_entries, dtype=bool)
+        self._expires = np.zeros(self._max_entries, dtype=np.float64)
+        self._last_used = np.zeros(self._max_entries, dtype=np.int64)
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    def _check_version(self) -> None:
+        if self._version_fn is None:
+            return
+        version = self._version_fn()
+        if version != self._version:
+            self._clear()
+            self._version = version
+            self.invalidations += 1
+
+    def _clear(self) -> None:
+        self._values = [None] * self._max_entries
+        self._namespace_ids = {}
+        self._next_namespace_id = 0
+        self._namespaces[:] = -1
+        self._valid[:] = False
+
+    def _prune_namespaces(self) -> None:
+        """移除已没有有效条目的命名空间"""
+        live = set(np.unique(self._namespaces[self._valid]).tolist())
+        if len(live) < len(self._namespace_ids):
+            self._namespace_ids = {ns: i for ns, i in self._namespace_ids.items() if i in live}
+
+    def _namespace_id(self, namespace: Hashable) -> int:
+        namespace_id = self._namespace_ids.get(namespace)
+        if namespace_id is None:
+            namespace_id = self._namespace_ids[namespace] = self._next_namespace_id
+            self._next_namespace_id += 1
+        return namespace_id
+
+    def lookup(self, vector: Sequence[float], namespace: Hashable = None) -> Optional[Tuple[Any, float]]:
+        """
+        查找同一命名空间内最相似的已缓存问题
+
+        Returns:
+            (缓存的回答, 相似度)，未命中返回 None
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            self._check_version()
+            if self._vectors is None or not self._valid.any() or len(query) != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+            if self._ttl > 0:
+                expired = self._valid & (self._expires < self._clock())
+                if expired.any():
+                    for slot in np.flatnonzero(expired):
+                        self._values[slot] = None
+                    self._valid &= ~expired
+                    self._prune_namespaces()
+            namespace_id = self._namespace_ids.get(namespace)
+            candidates = None if namespace_id is None else self._valid & (self._namespaces == namespace_id)
+            if candidates is None or not candidates.any():
+                self.misses += 1
+                return None
+            sims = np.where(candidates, self._vectors @ query, -np.inf)
+            slot = int(np.argmax(sims))
+            similarity = float(sims[slot])
+            if similarity < self._threshold:
+                self.misses += 1
+                return None
+            self._tick += 1
+            self._last_used[slot] = self._tick
+            self.hits += 1
+            return self._values[slot], similarity
+
+    def put(self, vector: Sequence[float], value: Any, namespace: Hashable = None) -> None:
+        """写入一条回答"""
+        vec = self._normalize(vector)
+        with self._lock:
+            self._check_version()
+            if self._vectors is None or self._vectors.shape[1] != len(vec):
+                # 首次写入或 Embedding 维度变化（更换模型）时重新分配
+                self._vectors = np.zeros((self._max_entries, len(vec)), dtype=np.float32)
+                self._clear()
+            free = np.flatnonzero(~self._valid)
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+                self._valid[slot] = False
+                self._prune_namespaces()
+            self._tick += 1
+            self._vectors[slot] = vec
+            self._values[slot] = value
+            self._namespaces[slot] = self._namespace_id(namespace)
+            self._valid[slot] = True
+            self._expires[slot] = self._clock() + self._ttl if self._ttl > 0 else 0
+            self._last_used[slot] = self._tick
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """命中率等统计信息"""
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def create_answer_cache() -> Optional[SemanticAnswerCache]:
+    """工厂函数：按配置创建回答缓存，随向量库版本失效"""
+    from config import config
+    from core.vectorstore import vectorstore_manager
+    cache_config = config.answer_cache
+    if not cache_config.enabled:
+        return None
+    return SemanticAnswerCache(
+        max_entries=cache_config.max_entries,
+        threshold=cache_config.similarity_threshold,
+        ttl=cache_config.ttl,
+        version_fn=lambda: vectorstore_manager.version,
+    )
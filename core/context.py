@@ -0,0 +1,101 @@
+"""
+请求上下文模块
+
+单次问答请求在整条流水线中共享的上下文对象，
+检索结果、评分与各阶段耗时只计算一次，同时供 Prompt 和响应使用；
+可携带截止时间与各阶段预算，超时跳过的阶段记录在 metadata 中；
+启用指标时各阶段同时计入耗时直方图，并作为 span 记录在 metadata["trace"] 中
+"""
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from utils.metrics import metrics
+
+
+@dataclass
+class QueryContext:
+    """单次问答请求的上下文"""
+    question: str
+    query_vector: Optional[Sequence[float]] = None
+    documents: List[Document] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    deadline: Optional[float] = None  # 截止时间（time.perf_counter() 时刻），None 表示不限
+    budgets: Dict[str, float] = field(default_factory=dict)  # 各阶段耗时预算（秒）
+    scope: Optional[List[str]] = None  # 检索的分片（小说）范围，None 表示全部
+    started: float = field(default_factory=time.perf_counter)  # 创建时刻，span 的时间原点
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """记录某个阶段的耗时（毫秒），同名阶段累加"""
+        start = time.perf_counter()
+        try:
+            if metrics.enabled:
+                with metrics.track("qa", stage):
+                    yield
+            else:
+                yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+            self._record_span(stage, start, elapsed)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """记录包含若干阶段的区间（如整个检索），只计入指标与 trace，不计入 timings"""
+        if not metrics.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            with metrics.track("qa", name):
+                yield
+        finally:
+            self._record_span(name, start, (time.perf_counter() - start) * 1000)
+
+    def _record_span(self, name: str, start: float, elapsed_ms: float) -> None:
+        if not metrics.enabled:
+            return
+        from config import config
+        if config.metrics.trace:
+            self.metadata.setdefault("trace", []).append({
+                "name": name,
+                "start_ms": round((start - self.started) * 1000, 3),
+                "duration_ms": round(elapsed_ms, 3),
+            })
+
+    def set_results(self, documents: List[Document], scores: List[float]) -> None:
+        """更新当前检索结果（文档与评分一一对应）"""
+        self.documents = list(documents)
+        self.scores = list(scores)
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的剩余秒数，未设置截止时间时为 None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.perf_counter()
+
+    def stage_timeout(self, stage: str) -> Optional[float]:
+        """某阶段可用的最长时间（秒）：阶段预算与剩余时间取小，均未设置时为 None"""
+        limits = [limit for limit in (self.budgets.get(stage), self.remaining()) if limit is not None]
+        return min(limits) if limits else None
+
+    def skip(self, stage: str, reason: str) -> None:
+        """记录被跳过的阶段及原因"""
+        self.metadata.setdefault("skipped_stages", {})[stage] = reason
+        metrics.count("stage_skips_total", "因超时、失败或熔断被跳过的阶段次数", stage=stage, reason=reason)
+
+    @property
+    def skipped(self) -> Dict[str, str]:
+        """被跳过的阶段 → 原因"""
+        return self.metadata.get("skipped_stages", {})
+
+    @property
+    def total_ms(self) -> float:
+        """所有阶段耗时之和（毫秒）"""
+        return sum(self.timings.values())
@@ -0,0 +1,398 @@
+"""
+Embedding 缓存模块
+
+基于内容寻址的持久化向量缓存：
+- 以「Embedding 模型名 + 文本哈希」为键，同一文本只调用一次远程 Embedding
+- 向量以 float32 定长行存放于二进制文件，索引存放于 SQLite
+- 超出容量时按最近使用时间淘汰，空出的行被复用，文件大小有上限
+
+另提供进程内的查询向量 LRU，并发的相同查询只发起一次 Embedding 调用
+"""
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.cache import LRUCache
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger("novel_rag.embedding_cache")
+
+_DTYPE = np.dtype("<f4")
+
+
+class EmbeddingCacheStore:
+    """
+    持久化向量存储
+
+    目录结构:
+        vectors.f32  定长 float32 行，按行号寻址
+        index.db     SQLite 索引：键 → 行号、最近使用时间
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = 500_000):
+        """
+        初始化缓存存储
+
+        Args:
+            cache_dir: 缓存目录（每个 Embedding 模型一个目录）
+            max_entries: 最大缓存条目数
+        """
+        self._dir = cache_dir
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors_path = self._dir / "vectors.f32"
+        self._vectors_path.touch(exist_ok=True)
+        self._vectors = open(self._vectors_path, "r+b")
+        self._db = sqlite3.connect(str(self._dir / "index.db"), check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used);
+            CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        self._dim = self._load_dim()
+
+    def _load_dim(self) -> Optional[int]:
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    @property
+    def size(self) -> int:
+        """当前缓存条目数"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """批量读取，返回命中的 键 → 向量"""
+        if not keys or self._dim is None:
+            return {}
+        with self._lock:
+            found: Dict[str, int] = {}
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._db.execute(
+                    f"SELECT key, row FROM entries WHERE key IN ({placeholders})", batch
+                ).fetchall())
+            if not found:
+                return {}
+
+            row_bytes = self._dim * _DTYPE.itemsize
+            result = {}
+            for key, row in sorted(found.items(), key=lambda item: item[1]):
+                self._vectors.seek(row * row_bytes)
+                result[key] = np.frombuffer(self._vectors.read(row_bytes), dtype=_DTYPE)
+
+            now = time.time()
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self._db.commit()
+            return result
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """批量写入向量"""
+        if not items:
+            return
+        with self._lock:
+            dim = len(next(iter(items.values())))
+            if self._dim != dim:
+                self._reset_storage(dim)
+
+            existing = set()
+            keys = list(items)
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                existing.update(key for (key,) in self._db.execute(
+                    f"SELECT key FROM entries WHERE key IN ({placeholders})", batch
+                ))
+            new_keys = [key for key in keys if key not in existing]
+            if not new_keys:
+                return
+
+            rows = self._allocate_rows(len(new_keys))
+            row_bytes = dim * _DTYPE.itemsize
+            for key, row in zip(new_keys, rows):
+                self._vectors.seek(row * row_bytes)
+                self._vectors.write(np.asarray(items[key], dtype=_DTYPE).tobytes())
+            self._vectors.flush()
+
+            now = time.time()
+            self._db.executemany(
+                "INSERT INTO entries (key, row, last_used) VALUES (?, ?, ?)",
+                [(key, row, now) for key, row in zip(new_keys, rows)],
+            )
+            self._db.commit()
+
+    def _allocate_rows(self, count: int) -> List[int]:
+        """分配行号：优先复用空闲行，容量不足时淘汰最久未使用的条目"""
+        total = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = total + count - self._max_entries
+        if overflow > 0:
+            # 一次多淘汰 10%，避免每批都触发淘汰
+            evict = min(total, overflow + self._max_entries // 10)
+            victims = self._db.execute(
+                "SELECT key, row FROM entries ORDER BY last_used LIMIT ?", (evict,)
+            ).fetchall()
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims])
+            self._db.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", [(r,) for _, r in victims])
+            logger.info(f"Embedding 缓存淘汰 {len(victims)} 条")
+
+        free = [row for (row,) in self._db.execute(
+            "SELECT row FROM free_rows ORDER BY row LIMIT ?", (count,)
+        )]
+        self._db.executemany("DELETE FROM free_rows WHERE row = ?", [(r,) for r in free])
+
+        row_bytes = self._dim * _DTYPE.itemsize
+        self._vectors.seek(0, 2)
+        next_row = self._vectors.tell() // row_bytes
+        fresh = list(range(next_row, next_row + count - len(free)))
+        return free + fresh
+
+    def _reset_storage(self, dim: int) -> None:
+        """向量维度变化时清空缓存"""
+        if self._dim is not None:
+            logger.warning(f"Embedding 维度变化 {self._dim} → {dim}，清空缓存")
+        self._db.executescript("DELETE FROM entries; DELETE FROM free_rows;")
+        self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (str(dim),))
+        self._db.commit()
+        self._vectors.truncate(0)
+        self._dim = dim
+
+    @property
+    def directory(self) -> Path:
+        """缓存目录"""
+        return self._dir
+
+    def close(self) -> None:
+        """关闭文件句柄"""
+        with self._lock:
+            self._vectors.close()
+            self._db.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带持久化缓存的 Embedding 包装器
+
+    仅对缓存未命中的文本调用底层模型；文档与查询分开缓存
+    （Gemini 对两者使用不同的 task_type，向量并不相同）
+    """
+
+    def __init__(self, embeddings: Embeddings, store: EmbeddingCacheStore, model_name: str):
+        """
+        初始化包装器
+
+        Args:
+            embeddings: 底层 Embedding 模型
+            store: 缓存存储
+            model_name: 模型名，参与缓存键计算
+        """
+        self._embeddings = embeddings
+        self._store = store
+        self._model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def base_embeddings(self) -> Embeddings:
+        """底层 Embedding 模型"""
+        return self._embeddings
+
+    def _key(self, kind: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self._model_name}:{kind}:{digest}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量计算文档向量（仅计算未命中部分）"""
+        keys = [self._key("doc", text) for text in texts]
+        cached = self._store.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        metrics.cache_lookup("embedding", hits=len(texts) - len(missing), misses=len(missing))
+
+        if missing:
+            logger.info(f"Embedding 缓存: 命中 {len(texts) - len(missing)}, 计算 {len(missing)}")
+            vectors = self._embeddings.embed_documents(list(missing.values()))
+            fresh = {key: np.asarray(vec, dtype=_DTYPE) for key, vec in zip(missing, vectors)}
+            self._store.put_many(fresh)
+            cached.update(fresh)
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """计算查询向量"""
+        key = self._key("query", text)
+        cached = self._store.get_many([key])
+        if key in cached:
+            self.hits += 1
+            metrics.cache_lookup("embedding", hits=1)
+            return cached[key].tolist()
+
+        self.misses += 1
+        metrics.cache_lookup("embedding", misses=1)
+        vector = np.asarray(self._embeddings.embed_query(text), dtype=_DTYPE)
+        self._store.put_many({key: vector})
+        return vector.tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步计算查询向量（缓存读写为本地操作，仅远程调用异步执行）"""
+        key = self._key("query", text)
+        cached = self._store.get_many([key])
+        if key in cached:
+            self.hits += 1
+            metrics.cache_lookup("embedding", hits=1)
+            return cached[key].tolist()
+
+        self.misses += 1
+        metrics.cache_lookup("embedding", misses=1)
+        vector = np.asarray(await self._embeddings.aembed_query(text), dtype=_DTYPE)
+        self._store.put_many({key: vector})
+        return vector.tolist()
+
+
+class QueryEmbeddingLRU(Embeddings):
+    """
+    进程内查询向量缓存
+
+    - 以查询文本为键的有界 LRU，向量以只读 float32 数组保存
+    - 同一文本的并发请求共享一次进行中的计算（其余请求等待其结果）
+    - 文档向量直接透传给底层模型
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = 4096):
+        """
+        Args:
+            embeddings: 底层 Embedding 模型（可为带持久化缓存的包装器）
+            max_entries: 最大缓存查询数
+        """
+        self._embeddings = embeddings
+        self._cache: LRUCache[np.ndarray] = LRUCache(max_size=max_entries)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.shared = 0  # 复用进行中计算的次数
+
+    @property
+    def base_embeddings(self) -> Embeddings:
+        """底层 Embedding 模型"""
+        return self._embeddings
+
+    @property
+    def cache(self) -> LRUCache:
+        return self._cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """计算文档向量（不缓存）"""
+        return self._embeddings.embed_documents(texts)
+
+    def _claim(self, text: str) -> Tuple[Optional[np.ndarray], Optional[Future], bool]:
+        """
+        查缓存或登记进行中的计算
+
+        Returns:
+            (缓存的向量, 进行中的 Future, 是否由调用方负责计算)
+        """
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                metrics.cache_lookup("query_embedding", hits=1)
+                return vector, None, False
+            future = self._inflight.get(text)
+            if future is not None:
+                self.shared += 1
+                metrics.cache_lookup("query_embedding", hits=1)
+                return None, future, False
+            future = self._inflight[text] = Future()
+            metrics.cache_lookup("query_embedding", misses=1)
+            return None, future, True
+
+    def _settle(
+        self,
+        text: str,
+        future: Future,
+        vector: Optional[np.ndarray],
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """写入结果（或异常）并唤醒等待方"""
+        if error is None:
+            self._cache.put(text, vector)
+            future.set_result(vector)
+        else:
+            future.set_exception(error)
+        with self._lock:
+            del self._inflight[text]
+
+    @staticmethod
+    def _to_array(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=_DTYPE)
+        array.setflags(write=False)
+        return array
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """计算查询向量，返回只读 float32 数组"""
+        vector, future, owner = self._claim(text)
+        if vector is not None:
+            return vector
+        if not owner:
+            return future.result()
+
+        try:
+            vector = self._to_array(self._embeddings.embed_query(text))
+        except BaseException as e:
+            self._settle(text, future, None, e)
+            raise
+        self._settle(text, future, vector)
+        return vector
+
+    async def aembed_query_array(self, text: str) -> np.ndarray:
+        """embed_query_array 的异步版本，与同步调用共享缓存和进行中的计算"""
+        vector, future, owner = self._claim(text)
+        if vector is not None:
+            return vector
+        if not owner:
+            return await asyncio.wrap_future(future)
+
+        try:
+            vector = self._to_array(await self._embeddings.aembed_query(text))
+        except BaseException as e:
+            self._settle(text, future, None, e)
+            raise
+        self._settle(text, future, vector)
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        """计算查询向量（Embeddings 接口，返回列表）"""
+        return self.embed_query_array(text).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_query_array(text)).tolist()
+
+
+def cache_dir_for_model(root: Path, model_name: str) -> Path:
+    """每个 Embedding 模型使用独立的缓存子目录"""
+    return root / re.sub(r"[^\w.-]+", "_", model_name)
@@ -3,8 +3,19 @@
 
 统一管理 LLM 和 Embedding 模型的创建和缓存
 """
+import threading
 from typing import Optional
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+
+from core.embedding_cache import (
+    CachedEmbeddings,
+    EmbeddingCacheStore,
+    QueryEmbeddingLRU,
+    cache_dir_for_model,
+)
 
 from utils.logger import get_logger
 from utils.exceptions import ConfigurationError, LLMError
@@ -16,8 +27,14 @@ class ModelManager:
     """模型管理器 - 单例模式管理模型实例"""
     
     _instance: Optional["ModelManager"] = None
-    _llm: Optional[ChatGoogleGenerativeAI] = None
-    _embeddings: Optional[GoogleGenerativeAIEmbeddings] = None
+    _llm: Optional[BaseChatModel] = None
+    _embeddings: Optional[Embeddings] = None
+    _embedding_cache: Optional[EmbeddingCacheStore] = None
+    # 通过 use() 指定的模型（离线替身等），reset 后仍然生效
+    _llm_override: Optional[BaseChatModel] = None
+    _embeddings_override: Optional[Embeddings] = None
+    # 后台预热与首个请求可能同时触发懒加载，创建过程加锁避免重复创建（尤其是缓存存储的文件句柄）
+    _lock = threading.RLock()
     
     def __new__(cls) -> "ModelManager":
         if cls._instance is None:
@@ -33,44 +50,119 @@ class ModelManager:
                 "请设置环境变量 GOOGLE_API_KEY"
             )
     
+    def use(
+        self,
+        llm: Optional[BaseChatModel] = None,
+        embeddings: Optional[Embeddings] = None,
+    ) -> None:
+        """
+        指定使用的模型实例，代替按配置创建的 Gemini 模型（如离线基准测试的替身模型）
+        
+        Embedding 模型同样按配置套上持久化缓存与查询向量 LRU；传入 None 恢复按配置创建
+        
+        Args:
+            llm: Chat 模型
+            embeddings: Embedding 模型
+        """
+        self._llm_override = llm
+        self._embeddings_override = embeddings
+        self.reset()
+    
     @property
-    def llm(self) -> ChatGoogleGenerativeAI:
+    def llm(self) -> BaseChatModel:
         """获取 LLM 实例（懒加载）"""
         if self._llm is None:
-            from config import config
-            self._validate_config()
-            logger.info(f"初始化 LLM: {config.google.llm_model}")
-            try:
-                self._llm = ChatGoogleGenerativeAI(
-                    model=config.google.llm_model,
-                    google_api_key=config.google.api_key,
-                    temperature=config.google.llm_temperature,
-                )
-            except Exception as e:
-                raise LLMError("LLM 初始化失败", str(e))
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self._create_llm()
         return self._llm
     
+    def _create_llm(self) -> BaseChatModel:
+        if self._llm_override is not None:
+            return self._llm_override
+        from config import config
+        self._validate_config()
+        logger.info(f"初始化 LLM: {config.google.llm_model}")
+        try:
+            # Gemini SDK 导入较慢，首次使用时才导入
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            return ChatGoogleGenerativeAI(
+                model=config.google.llm_model,
+                google_api_key=config.google.api_key,
+                temperature=config.google.llm_temperature,
+            )
+        except Exception as e:
+            raise LLMError("LLM 初始化失败", str(e))
+    
     @property
-    def embeddings(self) -> GoogleGenerativeAIEmbeddings:
-        """获取 Embedding 模型实例（懒加载）"""
+    def embeddings(self) -> Embeddings:
+        """获取 Embedding 模型实例（懒加载，启用缓存时带持久化缓存与查询向量 LRU）"""
         if self._embeddings is None:
-            from config import config
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self._create_embeddings()
+        return self._embeddings
+    
+    def _create_embeddings(self) -> Embeddings:
+        from config import config
+        if self._embeddings_override is not None:
+            embeddings = self._embeddings_override
+            model_name = getattr(embeddings, "model_name", type(embeddings).__name__)
+        else:
             self._validate_config()
             logger.info(f"初始化 Embedding: {config.google.embedding_model}")
             try:
-                self._embeddings = GoogleGenerativeAIEmbeddings(
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                embeddings = GoogleGenerativeAIEmbeddings(
                     model=config.google.embedding_model,
                     google_api_key=config.google.api_key,
                 )
             except Exception as e:
                 raise LLMError("Embedding 模型初始化失败", str(e))
-        return self._embeddings
+            model_name = config.google.embedding_model
+        embeddings = self._wrap_with_cache(embeddings, model_name)
+        if config.embedding_cache.query_lru_size > 0:
+            embeddings = QueryEmbeddingLRU(embeddings, config.embedding_cache.query_lru_size)
+        return embeddings
+    
+    def embed_query(self, text: str) -> np.ndarray:
+        """计算查询向量（float32 数组，经过查询向量 LRU 时相同查询只计算一次）"""
+        embeddings = self.embeddings
+        if isinstance(embeddings, QueryEmbeddingLRU):
+            return embeddings.embed_query_array(text)
+        return np.asarray(embeddings.embed_query(text), dtype=np.float32)
+    
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """embed_query 的异步版本"""
+        embeddings = self.embeddings
+        if isinstance(embeddings, QueryEmbeddingLRU):
+            return await embeddings.aembed_query_array(text)
+        return np.asarray(await embeddings.aembed_query(text), dtype=np.float32)
+    
+    def _wrap_with_cache(self, embeddings: Embeddings, model_name: str) -> Embeddings:
+        """按配置为 Embedding 模型套上持久化缓存"""
+        from config import config, CACHE_DIR
+        if not config.embedding_cache.enabled:
+            return embeddings
+        # 缓存存储跨 reset 复用，避免同一进程内多个句柄写同一文件
+        cache_dir = cache_dir_for_model(CACHE_DIR / "embeddings", model_name)
+        if self._embedding_cache is not None and self._embedding_cache.directory != cache_dir:
+            # 更换了模型或缓存目录
+            self._embedding_cache.close()
+            self._embedding_cache = None
+        if self._embedding_cache is None:
+            logger.info(f"启用 Embedding 缓存: {cache_dir}")
+            self._embedding_cache = EmbeddingCacheStore(
+                cache_dir, max_entries=config.embedding_cache.max_entries
+            )
+        return CachedEmbeddings(embeddings, self._embedding_cache, model_name)
     
     def reset(self) -> None:
         """重置所有模型实例"""
         logger.info("重置模型实例")
-        self._llm = None
-        self._embeddings = None
+        with self._lock:
+            self._llm = None
+            self._embeddings = None
 
 
 # 全局模型管理器实例
@@ -0,0 +1,114 @@
+"""
+小说分片注册表
+
+按小说（来源文件）分片存储时，记录来源路径 → 分片名的映射，
+分片名同时用作 Chroma 集合名、NumPy 后端与稀疏索引的子目录名
+"""
+import hashlib
+import json
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger("novel_rag.novel_registry")
+
+
+@dataclass
+class NovelEntry:
+    """一部小说对应的分片"""
+    source: str
+    shard: str
+    title: str
+
+
+def make_shard_name(source: str) -> str:
+    """由来源路径生成分片名（满足 Chroma 集合名的字符与长度限制）"""
+    return "novel_" + hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+
+class NovelRegistry:
+    """
+    小说分片注册表
+
+    持久化为 JSON 文件，每次新增或删除后原子写入；读取方法返回快照，可与写入并发调用
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, NovelEntry] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        self._entries = {
+            source: NovelEntry(**entry) for source, entry in data.get("novels", {}).items()
+        }
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"novels": {source: asdict(entry) for source, entry in self._entries.items()}}
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def lookup(self, source: str) -> Optional[str]:
+        """已注册来源的分片名（只读，查询路径使用）"""
+        with self._lock:
+            entry = self._entries.get(source)
+        return entry.shard if entry else None
+
+    def shard_for(self, source: str) -> str:
+        """来源对应的分片名，首次出现时注册（仅写入路径使用）"""
+        shard = self.lookup(source)
+        if shard is not None:
+            return shard
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is None:
+                title = Path(source).stem if source else "未知来源"
+                entry = NovelEntry(source=source, shard=make_shard_name(source), title=title)
+                self._entries[source] = entry
+                self._save()
+                logger.info(f"注册小说分片: {title} → {entry.shard}")
+        return entry.shard
+
+    def resolve(self, name: str) -> Optional[str]:
+        """按来源路径、分片名、标题或文件名查找分片名"""
+        with self._lock:
+            entry = self._entries.get(name)
+            entries = list(self._entries.values())
+        if entry is not None:
+            return entry.shard
+        for entry in entries:
+            if name in (entry.shard, entry.title, Path(entry.source).name):
+                return entry.shard
+        return None
+
+    def remove(self, source: str) -> Optional[str]:
+        """注销来源，返回其分片名"""
+        with self._lock:
+            entry = self._entries.pop(source, None)
+            if entry is not None:
+                self._save()
+        return entry.shard if entry else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.path.unlink(missing_ok=True)
+
+    def shards(self) -> List[str]:
+        with self._lock:
+            return [entry.shard for entry in self._entries.values()]
+
+    def entries(self) -> List[NovelEntry]:
+        """全部小说，按标题排序"""
+        with self._lock:
+            entries = list(self._entries.values())
+        return sorted(entries, key=lambda entry: entry.title)
@@ -0,0 +1,508 @@
+"""
+NumPy 向量后端
+
+精确检索的本地向量存储，适合几十万文本块规模：
+- 归一化向量按行存放于内存映射的 float32 / float16 矩阵，加载时不读入内存
+- 文本与 metadata 以 JSON 记录顺序追加到 docs.bin，按行对应的偏移表（rows.bin）定位
+- 查询为分块矩阵乘法 + argpartition，支持一次检索多个查询向量
+- 删除与覆盖写入为标记删除，无效行比例过高时压缩
+- 可选 IVF-PQ 近似索引（index="ivfpq"），摄取结束时按需训练，索引之后新增的行仍精确检索
+
+持久化目录结构:
+    meta.json      维度、精度、已提交行数及各文件的有效长度（提交点）
+    vectors.bin    向量矩阵（容量按倍数扩展）
+    rows.bin       每行文档记录的 (偏移, 长度)，int64
+    docs.bin       文档记录（UTF-8 JSON）
+    ids.txt        每行一个文本块 ID
+    tombstones.bin 已删除的行号，int64
+    ann/           IVF-PQ 索引（可选）
+"""
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from core.ann_index import IVFPQIndex
+from core.vectorstore import VectorBackend
+from utils.logger import get_logger
+from utils.exceptions import VectorStoreError
+
+logger = get_logger("novel_rag.numpy_backend")
+
+FORMAT_VERSION = 1
+_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+# 检索时每块转换为 float32 的数据量上限
+_BLOCK_BYTES = 64 << 20
+# 无效行超过该比例时压缩
+_COMPACT_RATIO = 0.25
+
+
+class NumpyVectorBackend(VectorBackend):
+    """内存映射 NumPy 矩阵向量后端（精确 top-k，可选 IVF-PQ 近似索引）"""
+
+    name = "numpy"
+
+    def __init__(
+        self,
+        directory: Path,
+        dtype: str = "float32",
+        index: str = "flat",
+        nlist: int = 0,
+        pq_m: int = 16,
+        nprobe: int = 32,
+        rescore: int = 400,
+        ann_min_rows: int = 50_000,
+        rebuild_ratio: float = 0.2,
+    ):
+        """
+        Args:
+            directory: 存储目录
+            dtype: 向量存储精度，float32 或 float16（体积减半，检索时转换为 float32 计算）
+            index: flat（精确检索）或 ivfpq（近似检索，见 core/ann_index.py）
+            nlist: IVF 簇数量，0 表示自动
+            pq_m: PQ 子空间数量，需整除向量维度
+            nprobe: 每次查询扫描的簇数量
+            rescore: 近似分数最高的多少个候选用原始向量精确重算，0 表示不重算
+            ann_min_rows: 有效行数达到该值才构建近似索引
+            rebuild_ratio: 索引之后变更的行数超过该比例时重建
+        """
+        if dtype not in _DTYPES:
+            raise VectorStoreError("不支持的向量精度", dtype)
+        if index not in ("flat", "ivfpq"):
+            raise VectorStoreError("不支持的索引类型", index)
+        self._dir = directory
+        self._dtype = _DTYPES[dtype]
+        self._index = index
+        self._nlist = nlist
+        self._pq_m = pq_m
+        self._nprobe = nprobe
+        self._rescore = rescore
+        self._ann_min_rows = ann_min_rows
+        self._rebuild_ratio = rebuild_ratio
+        self._lock = threading.RLock()
+        self._generation = 0  # 每次重新加载（压缩、清空）后递增，行号随之失效
+        self._load()
+
+    # ── 加载与提交 ────────────────────────────────────────────
+
+    def _path(self, name: str) -> Path:
+        return self._dir / name
+
+    def _reset_state(self) -> None:
+        self._generation += 1
+        self._dim = 0
+        self._rows = 0
+        self._capacity = 0
+        self._matrix: Optional[np.memmap] = None
+        self._offsets = np.zeros((0, 2), dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._sizes = {"docs.bin": 0, "ids.txt": 0, "tombstones.bin": 0}
+        self._reader = None
+        self._ann: Optional[IVFPQIndex] = None
+
+    def _load(self) -> None:
+        self._reset_state()
+        meta_path = self._path("meta.json")
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("version") != FORMAT_VERSION:
+            raise VectorStoreError("向量库格式版本不匹配", str(meta.get("version")))
+        if np.dtype(meta["dtype"]) != self._dtype:
+            raise VectorStoreError(
+                "向量库精度与配置不一致", f"已存储 {meta['dtype']}，配置为 {self._dtype.name}"
+            )
+        self._dim = meta["dim"]
+        self._rows = meta["rows"]
+        self._sizes = meta["sizes"]
+        # 截掉上次未提交的尾部数据，保证后续追加位置与提交点一致
+        self._truncate("rows.bin", self._rows * 16)
+        for name, size in self._sizes.items():
+            self._truncate(name, size)
+
+        self._offsets = np.fromfile(self._path("rows.bin"), dtype=np.int64).reshape(-1, 2)
+        ids_text = self._path("ids.txt").read_text(encoding="utf-8")
+        self._ids = ids_text.split("\n")[:-1] if ids_text else []
+        self._alive = np.ones(self._rows, dtype=bool)
+        if self._sizes["tombstones.bin"]:
+            self._alive[np.fromfile(self._path("tombstones.bin"), dtype=np.int64)] = False
+        self._id_to_row = {
+            chunk_id: row for row, chunk_id in enumerate(self._ids) if self._alive[row]
+        }
+        self._open_matrix()
+        if self._index == "ivfpq":
+            self._ann = IVFPQIndex.load(self._path("ann"))
+            if self._ann is not None and (self._ann.rows > self._rows or self._ann.dim != self._dim):
+                logger.warning("IVF-PQ 索引与向量库不一致，已忽略")
+                self._ann = None
+        logger.info(f"NumPy 向量库已加载: {len(self._id_to_row)} 个文档, 维度 {self._dim}")
+
+    def _truncate(self, name: str, size: int) -> None:
+        path = self._path(name)
+        if path.exists() and path.stat().st_size > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def _open_matrix(self) -> None:
+        path = self._path("vectors.bin")
+        row_bytes = self._dim * self._dtype.itemsize
+        self._capacity = path.stat().st_size // row_bytes if path.exists() else 0
+        self._matrix = (
+            np.memmap(path, dtype=self._dtype, mode="r+", shape=(self._capacity, self._dim))
+            if self._capacity
+            else None
+        )
+
+    def _ensure_capacity(self, rows: int) -> None:
+        """容量不足时按倍数扩展向量文件"""
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._path("vectors.bin"), "ab") as f:
+            f.truncate(capacity * self._dim * self._dtype.itemsize)
+        self._open_matrix()
+
+    def _commit(self) -> None:
+        """原子写入 meta.json，此前追加的数据自此生效"""
+        if self._matrix is not None:
+            self._matrix.flush()
+        meta = {
+            "version": FORMAT_VERSION,
+            "dim": self._dim,
+            "dtype": self._dtype.name,
+            "rows": self._rows,
+            "sizes": self._sizes,
+        }
+        tmp_path = self._path("meta.tmp")
+        tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+        tmp_path.replace(self._path("meta.json"))
+
+    def _append(self, name: str, data: bytes) -> int:
+        """追加写入文件，返回写入前的长度"""
+        offset = self._sizes[name]
+        with open(self._path(name), "ab") as f:
+            f.write(data)
+        self._sizes[name] = offset + len(data)
+        return offset
+
+    # ── 写入 ──────────────────────────────────────────────────
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: List[Document],
+    ) -> None:
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        records = [
+            json.dumps(
+                {"text": doc.page_content, "metadata": doc.metadata or {}}, ensure_ascii=False
+            ).encode("utf-8")
+            for doc in documents
+        ]
+        with self._lock:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            if self._dim == 0:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise VectorStoreError("向量维度不一致", f"库中为 {self._dim}，写入为 {vectors.shape[1]}")
+
+            start, count = self._rows, len(ids)
+            self._ensure_capacity(start + count)
+            self._matrix[start:start + count] = vectors.astype(self._dtype)
+
+            lengths = np.fromiter((len(r) for r in records), dtype=np.int64, count=count)
+            offsets = np.empty((count, 2), dtype=np.int64)
+            offsets[:, 0] = self._append("docs.bin", b"".join(records)) + np.concatenate(
+                [[0], np.cumsum(lengths)[:-1]]
+            )
+            offsets[:, 1] = lengths
+            with open(self._path("rows.bin"), "ab") as f:
+                f.write(offsets.tobytes())
+            self._append("ids.txt", "".join(f"{chunk_id}\n" for chunk_id in ids).encode("utf-8"))
+
+            # 被覆盖的旧行（含同一批内的重复 ID）标记删除
+            replaced = []
+            for i, chunk_id in enumerate(ids):
+                old = self._id_to_row.get(chunk_id)
+                if old is not None:
+                    replaced.append(old)
+                self._id_to_row[chunk_id] = start + i
+            self._offsets = np.concatenate([self._offsets, offsets])
+            self._alive = np.concatenate([self._alive, np.ones(count, dtype=bool)])
+            self._ids.extend(ids)
+            self._rows += count
+            self._kill(replaced)
+            self._commit()
+            self._maybe_compact()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            rows = [row for row in (self._id_to_row.pop(i, None) for i in ids) if row is not None]
+            if not rows:
+                return
+            self._kill(rows)
+            self._commit()
+            self._maybe_compact()
+
+    def _kill(self, rows: List[int]) -> None:
+        if rows:
+            self._alive[rows] = False
+            self._append("tombstones.bin", np.asarray(rows, dtype=np.int64).tobytes())
+
+    def clear(self) -> None:
+        with self._lock:
+            self.close()
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._reset_state()
+
+    def _maybe_compact(self) -> None:
+        dead = self._rows - len(self._id_to_row)
+        if self._rows >= 1024 and dead > self._rows * _COMPACT_RATIO:
+            self.compact()
+
+    def compact(self) -> None:
+        """重写存储，移除已删除的行"""
+        with self._lock:
+            keep = np.flatnonzero(self._alive)
+            logger.info(f"压缩 NumPy 向量库: {self._rows} → {len(keep)} 行")
+            tmp = NumpyVectorBackend(self._dir.with_name(self._dir.name + ".compact"), self._dtype.name)
+            tmp.clear()
+            block = max(1, _BLOCK_BYTES // max(1, self._dim * 4))
+            for start in range(0, len(keep), block):
+                rows = keep[start:start + block]
+                tmp.upsert(
+                    [self._ids[row] for row in rows],
+                    self._matrix[rows].astype(np.float32),
+                    self._read_documents(rows),
+                )
+            tmp.close()
+            self.close()
+            old = self._dir.with_name(self._dir.name + ".old")
+            shutil.rmtree(old, ignore_errors=True)
+            if self._dir.exists():
+                self._dir.rename(old)
+            if tmp._dir.exists():
+                tmp._dir.rename(self._dir)
+            shutil.rmtree(old, ignore_errors=True)
+            self._load()
+            # 行号已变化，原索引随旧目录删除
+            self.build_index()
+
+    # ── 读取 ──────────────────────────────────────────────────
+
+    def count(self) -> int:
+        return len(self._id_to_row)
+
+    def warm_up(self) -> None:
+        # 一次检索即扫过内存映射的全部向量（及 IVF-PQ 编码），由操作系统读入页缓存
+        if self._dim:
+            self.search(np.ones((1, self._dim), dtype=np.float32), 1)
+
+    def _read_documents(self, rows: Sequence[int]) -> List[Document]:
+        if self._reader is None:
+            self._reader = open(self._path("docs.bin"), "rb")
+        documents = []
+        for row in rows:
+            offset, length = self._offsets[row]
+            self._reader.seek(int(offset))
+            record = json.loads(self._reader.read(int(length)))
+            documents.append(
+                Document(id=self._ids[row], page_content=record["text"], metadata=record["metadata"])
+            )
+        return documents
+
+    def get_documents(self, ids: List[str]) -> List[Document]:
+        with self._lock:
+            rows = [self._id_to_row[i] for i in ids if i in self._id_to_row]
+            return self._read_documents(rows)
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            found = [i for i in ids if i in self._id_to_row]
+            if not found:
+                return {}
+            matrix = np.asarray(self._matrix[[self._id_to_row[i] for i in found]], dtype=np.float32)
+            return dict(zip(found, matrix))
+
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        rescore: Optional[int] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        检索：有 IVF-PQ 索引时近似检索已索引的行，其余（索引之后新增的）行精确检索，合并取 top-k；
+        无索引时全部精确检索（分块计算，逐块保留 top-k 候选再合并）
+
+        Args:
+            nprobe: 覆盖配置的扫描簇数
+            rescore: 覆盖配置的精确重算候选数
+
+        分数为余弦相似度（-1 ~ 1）
+        """
+        queries = _normalize(np.asarray(query_vectors, dtype=np.float32))
+        n_queries = len(queries)
+        # 打分在锁外进行；期间若发生压缩，行号已重新编号，按新数据重新检索
+        while True:
+            with self._lock:
+                generation = self._generation
+                matrix, rows, alive, ann = self._matrix, self._rows, self._alive, self._ann
+            if matrix is None or rows == 0 or k <= 0:
+                return [[] for _ in range(n_queries)]
+            if queries.shape[1] != matrix.shape[1]:
+                raise VectorStoreError(
+                    "查询向量维度不一致", f"库中为 {matrix.shape[1]}，查询为 {queries.shape[1]}"
+                )
+            best_scores, best_rows = self._top_rows(matrix, rows, alive, ann, queries, k, nprobe, rescore)
+            with self._lock:
+                if self._generation != generation:
+                    continue
+                results = []
+                for q in range(n_queries):
+                    valid = np.isfinite(best_scores[:, q])
+                    docs = self._read_documents(best_rows[valid, q])
+                    results.append(list(zip(docs, best_scores[valid, q].astype(float).tolist())))
+                return results
+
+    def _top_rows(
+        self,
+        matrix: np.ndarray,
+        rows: int,
+        alive: np.ndarray,
+        ann: Optional[IVFPQIndex],
+        queries: np.ndarray,
+        k: int,
+        nprobe: Optional[int],
+        rescore: Optional[int],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """在一份数据快照上计算 top-k，返回按分数降序的 (分数, 行号)，形状均为 (≤k, 查询数)"""
+        n_queries = len(queries)
+        best_scores, best_rows = self._exact_top(matrix, alive, queries, ann.rows if ann else 0, rows, k)
+        if ann is not None:
+            nprobe = nprobe or self._nprobe
+            rescore = self._rescore if rescore is None else rescore
+            hits = [
+                ann.search(query, k, nprobe, alive, rescore, exact_fn=lambda r: matrix[r])
+                for query in queries
+            ]
+            width = max(len(r) for r, _ in hits)
+            ann_rows = np.zeros((width, n_queries), dtype=np.int64)
+            ann_scores = np.full((width, n_queries), -np.inf, dtype=np.float32)
+            for q, (hit_rows, hit_scores) in enumerate(hits):
+                ann_rows[:len(hit_rows), q] = hit_rows
+                ann_scores[:len(hit_scores), q] = hit_scores
+            best_scores = np.concatenate([best_scores, ann_scores])
+            best_rows = np.concatenate([best_rows, ann_rows])
+            keep = _top_k_rows(best_scores, k)
+            best_scores = np.take_along_axis(best_scores, keep, axis=0)
+            best_rows = np.take_along_axis(best_rows, keep, axis=0)
+
+        order = np.argsort(-best_scores, axis=0, kind="stable")
+        return np.take_along_axis(best_scores, order, axis=0), np.take_along_axis(best_rows, order, axis=0)
+
+    def _exact_top(
+        self,
+        matrix: np.ndarray,
+        alive: np.ndarray,
+        queries: np.ndarray,
+        start: int,
+        end: int,
+        k: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """精确计算 [start, end) 行的 top-k，返回 (分数, 行号)，形状均为 (≤k, 查询数)"""
+        n_queries = len(queries)
+        block = max(1024, _BLOCK_BYTES // (matrix.shape[1] * 4))
+        best_scores = np.empty((0, n_queries), dtype=np.float32)
+        best_rows = np.empty((0, n_queries), dtype=np.int64)
+        for block_start in range(start, end, block):
+            block_end = min(block_start + block, end)
+            part = matrix[block_start:block_end]
+            if part.dtype != np.float32:
+                part = part.astype(np.float32)
+            scores = part @ queries.T  # (块行数, 查询数)
+            scores[~alive[block_start:block_end]] = -np.inf
+            top = _top_k_rows(scores, k)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=0)])
+            best_rows = np.concatenate([best_rows, top + block_start])
+            if len(best_scores) > k:
+                keep = _top_k_rows(best_scores, k)
+                best_scores = np.take_along_axis(best_scores, keep, axis=0)
+                best_rows = np.take_along_axis(best_rows, keep, axis=0)
+        return best_scores, best_rows
+
+    # ── 近似索引 ──────────────────────────────────────────────
+
+    @property
+    def ann_index(self) -> Optional[IVFPQIndex]:
+        """当前加载的 IVF-PQ 索引"""
+        return self._ann
+
+    def build_index(self, force: bool = False) -> bool:
+        """
+        按需训练 IVF-PQ 索引
+
+        index 为 ivfpq 且有效行数达到 ann_min_rows 时构建；已有索引时，
+        仅在索引之后新增或删除的行超过 rebuild_ratio 时重建
+
+        Returns:
+            是否重新构建了索引
+        """
+        if self._index != "ivfpq":
+            return False
+        with self._lock:
+            live = len(self._id_to_row)
+            if self._matrix is None or live < self._ann_min_rows:
+                return False
+            if not force and self._ann is not None:
+                stale = (self._rows - self._ann.rows) + int((~self._alive[:self._ann.rows]).sum())
+                if stale <= self._ann.rows * self._rebuild_ratio:
+                    return False
+            started = time.perf_counter()
+            index = IVFPQIndex.build(
+                self._matrix[:self._rows], nlist=self._nlist, m=self._pq_m
+            )
+            index.save(self._path("ann"))
+            self._ann = IVFPQIndex.load(self._path("ann"))
+            logger.info(
+                f"IVF-PQ 索引构建完成: {index.rows} 行, nlist={index.nlist}, "
+                f"{index.nbytes / 2**20:.1f} MB, 耗时 {time.perf_counter() - started:.1f}s"
+            )
+            return True
+
+    def close(self) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行 L2 归一化（零向量保持不变）"""
+    vectors = np.atleast_2d(vectors)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """每列取分数最高的 k 个行号（未排序）"""
+    if len(scores) <= k:
+        return np.broadcast_to(np.arange(len(scores))[:, None], scores.shape).copy()
+    return np.argpartition(-scores, k - 1, axis=0)[:k]
@@ -0,0 +1,113 @@
+"""
+上下文打包模块
+
+按 token 预算而不是固定文档数选择送入 LLM 的段落：
+按分数从高到低依次放入，直到预算用完；放不下的第一个段落在句子边界处截断后放入，
+使 Prompt 大小稳定在预算以内，生成延迟的长尾随之收紧
+"""
+import re
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from core.context import QueryContext
+from core.tokens import TokenCounter, get_token_counter
+
+# 句子结束位置：句末标点（含其后的右引号、右括号）或换行
+_SENTENCE_END = re.compile(r"[。！？!?…]+[”’」』）)]*|\n+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句末标点与换行切分，各句保留结尾标点，拼接后与原文一致"""
+    sentences, start = [], 0
+    for match in _SENTENCE_END.finditer(text):
+        sentences.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def truncate_to_tokens(text: str, budget: int, counter: TokenCounter) -> str:
+    """在句子边界截断文本，使 token 数不超过预算；第一句就放不下时返回空串"""
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        tokens = counter.count(sentence)
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    return "".join(kept).rstrip()
+
+
+def pack_documents(
+    documents: List[Document],
+    scores: List[float],
+    budget: int,
+    min_tail_tokens: int = 48,
+    counter: Optional[TokenCounter] = None,
+) -> Tuple[List[Document], List[float], int]:
+    """
+    按分数贪心填充 token 预算
+
+    Args:
+        documents: 候选段落
+        scores: 与段落一一对应的分数
+        budget: token 预算
+        min_tail_tokens: 截断后的段落至少保留的 token 数，不足则不放入
+        counter: Token 计数器
+
+    Returns:
+        (选中的段落, 分数, 使用的 token 数)，按分数降序；至少包含一个段落（必要时截断）
+    """
+    counter = counter or get_token_counter()
+    order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+    packed: List[Document] = []
+    packed_scores: List[float] = []
+    used = 0
+    for i in order:
+        doc = documents[i]
+        tokens = counter.count_document(doc)
+        if used + tokens <= budget:
+            packed.append(doc)
+            packed_scores.append(scores[i])
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= min_tail_tokens or not packed:
+            text = truncate_to_tokens(doc.page_content, remaining, counter)
+            if text:
+                packed.append(_truncated(doc, text))
+                packed_scores.append(scores[i])
+                used += counter.count(text)
+        break
+    return packed, packed_scores, used
+
+
+def _truncated(doc: Document, text: str) -> Document:
+    metadata = dict(doc.metadata)
+    metadata.pop("token_count", None)
+    metadata["truncated"] = True
+    if "start_index" in metadata:
+        metadata["end_index"] = metadata["start_index"] + len(text)
+    return Document(id=doc.id, page_content=text, metadata=metadata)
+
+
+def pack_context(ctx: QueryContext) -> None:
+    """按配置的 token 预算截取上下文中的段落，统计写入 ctx.metadata["context_tokens"]"""
+    from config import config
+    budget = config.context.token_budget
+    if budget <= 0 or not ctx.documents:
+        return
+    with ctx.timer("pack"):
+        documents, scores, used = pack_documents(
+            ctx.documents, ctx.scores, budget, config.context.min_tail_tokens
+        )
+        ctx.metadata["context_tokens"] = {
+            "budget": budget,
+            "used": used,
+            "candidates": len(ctx.documents),
+            "packed": len(documents),
+            "truncated": bool(documents and documents[-1].metadata.get("truncated")),
+        }
+        ctx.set_results(documents, scores)
@@ -0,0 +1,132 @@
+"""
+上下文组装模块
+
+检索与重排之后、生成之前的一步：同一来源中相互重叠或相邻的文本块合并为连续段落，
+重叠部分只保留一份，避免 Prompt 中重复出现同一段原文。
+合并后的段落在 metadata 中记录覆盖的原文区间与文本块 ID，供引用定位
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from core.context import QueryContext
+
+
+@dataclass
+class _Passage:
+    """合并中的段落"""
+    source: str
+    start: int
+    end: int
+    text: str
+    score: float
+    rank: int  # 成员中最靠前的排名，决定输出顺序
+    first: Document
+    chunk_ids: List[str]
+    spans: List[Tuple[int, int]]
+
+    def absorb(self, doc: Document, start: int, end: int, score: float, rank: int, max_gap: int) -> bool:
+        """尝试并入下一个文本块（start 不小于本段起点），成功返回 True"""
+        if start > self.end + max_gap:
+            return False
+        if start <= self.end:
+            # 重叠（或被本段完全包含）部分须与已有文本一致，否则（如来源文件已变化）不合并
+            head = self.text[start - self.start:start - self.start + len(doc.page_content)]
+            if not doc.page_content.startswith(head):
+                return False
+            self.text += doc.page_content[len(head):]
+        else:
+            # 相邻：中间仅隔着分块时去掉的空白，以换行占位，保持文本长度与原文区间一致
+            self.text += "\n" * (start - self.end) + doc.page_content
+        self.end = max(self.end, end)
+        self.score = max(self.score, score)
+        self.rank = min(self.rank, rank)
+        if doc.id:
+            self.chunk_ids.append(doc.id)
+        self.spans.append((start, end))
+        return True
+
+    def to_document(self) -> Document:
+        if len(self.spans) == 1:
+            return self.first
+        metadata = dict(self.first.metadata)
+        metadata.pop("token_count", None)  # 属于首个文本块，段落需重新计数
+        metadata.update({
+            "start_index": self.start,
+            "end_index": self.end,
+            "chunk_ids": self.chunk_ids,
+            "spans": self.spans,
+        })
+        return Document(id=self.first.id, page_content=self.text, metadata=metadata)
+
+
+def _span(doc: Document) -> Optional[Tuple[str, int, int]]:
+    """文本块的 (来源, 起点, 终点)，缺少偏移信息时为 None"""
+    metadata = doc.metadata or {}
+    source, start = metadata.get("source"), metadata.get("start_index")
+    if source is None or start is None or start < 0:
+        return None
+    return source, start, metadata.get("end_index", start + len(doc.page_content))
+
+
+def merge_passages(
+    documents: List[Document],
+    scores: List[float],
+    max_gap: int = 2,
+) -> Tuple[List[Document], List[float]]:
+    """
+    合并同一来源中重叠或相邻的文本块
+
+    Args:
+        documents: 检索（重排）后的文本块，按相关性排序
+        scores: 与文档一一对应的分数
+        max_gap: 两个文本块之间最多间隔多少个字符仍视为相邻
+
+    Returns:
+        (段落, 分数)，段落分数取成员最高分，按成员中最靠前的排名排序；
+        未合并的文本块原样返回，缺少来源或偏移信息的文本块不参与合并
+    """
+    by_source: Dict[str, List[Tuple[int, int, int, Document, float]]] = {}
+    passages: List[_Passage] = []
+    for rank, (doc, score) in enumerate(zip(documents, scores)):
+        span = _span(doc)
+        if span is None:
+            passages.append(_Passage("", 0, 0, doc.page_content, score, rank, doc, [], [(0, 0)]))
+            continue
+        source, start, end = span
+        by_source.setdefault(source, []).append((start, end, rank, doc, score))
+
+    for source, hits in by_source.items():
+        hits.sort(key=lambda hit: (hit[0], -hit[1]))
+        current: Optional[_Passage] = None
+        for start, end, rank, doc, score in hits:
+            if current is not None and current.absorb(doc, start, end, score, rank, max_gap):
+                continue
+            current = _Passage(
+                source, start, end, doc.page_content, score, rank, doc,
+                [doc.id] if doc.id else [], [(start, end)],
+            )
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage.rank)
+    return [p.to_document() for p in passages], [p.score for p in passages]
+
+
+def assemble_context(ctx: QueryContext) -> None:
+    """按配置合并上下文中的文本块，合并统计写入 ctx.metadata["passages"]"""
+    from config import config
+    if not config.retrieval.merge_passages or len(ctx.documents) < 2:
+        return
+    with ctx.timer("assemble"):
+        chunks = len(ctx.documents)
+        chars = sum(len(doc.page_content) for doc in ctx.documents)
+        documents, scores = merge_passages(ctx.documents, ctx.scores, config.retrieval.merge_gap)
+        if len(documents) == chunks:
+            return
+        ctx.set_results(documents, scores)
+        ctx.metadata["passages"] = {
+            "chunks": chunks,
+            "passages": len(documents),
+            "chars_saved": chars - sum(len(doc.page_content) for doc in documents),
+        }
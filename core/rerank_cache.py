@@ -0,0 +1,54 @@
+"""
+重排分数缓存模块
+
+按「规范化问题 + 文本块 ID」缓存 LLM 给出的相关性分数，
+同一问题（或仅空白、标点、全半角不同的问题）再次出现时只对未缓存的候选调用 LLM
+"""
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from utils.cache import LRUCache
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题：NFKC 全半角统一、转小写、去除空白与标点符号"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in "PZSC")
+
+
+class RerankScoreCache:
+    """(问题, 文本块) 相关性分数缓存"""
+
+    def __init__(
+        self,
+        max_size: int = 50_000,
+        ttl: float = 24 * 3600,
+        version_fn: Optional[Callable[[], Any]] = None,
+    ):
+        """
+        Args:
+            max_size: 最大缓存分数条数
+            ttl: 过期时间（秒），0 表示不过期
+            version_fn: 索引版本函数，版本变化时缓存整体失效
+        """
+        self._cache: LRUCache[float] = LRUCache(max_size=max_size, ttl=ttl, version_fn=version_fn)
+
+    def get_many(self, question: str, chunk_ids: Iterable[str]) -> Dict[str, float]:
+        """返回已缓存的 文本块 ID → 分数"""
+        normalized = normalize_question(question)
+        found = {}
+        for chunk_id in chunk_ids:
+            score = self._cache.get((normalized, chunk_id))
+            if score is not None:
+                found[chunk_id] = score
+        return found
+
+    def put_many(self, question: str, scores: Dict[str, float]) -> None:
+        """写入一批分数"""
+        normalized = normalize_question(question)
+        for chunk_id, score in scores.items():
+            self._cache.put((normalized, chunk_id), score)
+
+    def stats(self) -> Dict[str, float]:
+        """命中率等统计信息"""
+        return self._cache.stats()
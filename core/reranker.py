@@ -1,23 +1,193 @@
 """
 重排器模块（核心功能）
 
-基于 Gemini LLM 对检索结果进行重排，提升相关性
+对检索结果进行重排，提升相关性。提供两种实现：
+- GeminiReranker: 基于 Gemini LLM 评分，效果好但需要一次远程调用
+- LocalReranker: 进程内特征打分（字面重合、候选集 BM25、向量余弦），毫秒级完成
 """
+import asyncio
 import json
 import re
-from typing import List, Dict, Any
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 
+import numpy as np
 from langchain_core.documents import Document
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.language_models import BaseChatModel
 
 from core.prompts import Prompts, format_docs_for_rerank
+from core.rerank_cache import RerankScoreCache
+from core.sparse_index import tokenize
+from utils.metrics import metrics
 from utils.logger import get_logger
 from utils.exceptions import RerankerError
 
 logger = get_logger("novel_rag.reranker")
 
+# 分片评分共用的线程池（各请求的并行度由 max_parallel_shards 限制）
+_shard_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="rerank-shard")
 
-class GeminiReranker:
+
+class BaseReranker(ABC):
+    """
+    重排器基类
+    
+    子类实现 _rank 返回按相关性降序的 (文档, 0-1 分数)；
+    输入为空、数量不超过 top_k 以及打分失败时的处理由基类统一完成
+    """
+    
+    def __init__(self, top_k: int = 5):
+        self._top_k = top_k
+        
+    @property
+    def top_k(self) -> int:
+        return self._top_k
+    
+    def rerank(
+        self,
+        question: str,
+        documents: List[Document],
+    ) -> List[Document]:
+        """
+        对文档进行重排
+        
+        Args:
+            question: 用户问题
+            documents: 待重排的文档列表
+            
+        Returns:
+            重排后的文档列表（最多 top_k 个）
+        """
+        reranked, _ = self.rerank_with_scores(question, documents)
+        return reranked
+    
+    def rerank_with_scores(
+        self,
+        question: str,
+        documents: List[Document],
+        scores: Optional[List[float]] = None,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> Tuple[List[Document], List[float]]:
+        """
+        对文档进行重排，并返回对应评分
+        
+        Args:
+            question: 用户问题
+            documents: 待重排的文档列表
+            scores: 可选的原始检索分数，重排跳过或失败时沿用
+            query_vector: 可选的查询向量（本地重排用于计算余弦相似度）
+            
+        Returns:
+            (重排后的文档列表, 归一化到 0-1 的评分列表)，最多 top_k 个
+        """
+        scores = [0.0] * len(documents) if scores is None else scores
+        try:
+            return self.rerank_or_raise(question, documents, scores, query_vector)
+        except Exception as e:
+            logger.error(f"重排失败，使用原始顺序: {e}")
+            metrics.count("rerank_fallbacks_total", "重排降级（按检索顺序返回）次数", reason="error")
+            return documents[:self._top_k], scores[:self._top_k]
+    
+    def rerank_or_raise(
+        self,
+        question: str,
+        documents: List[Document],
+        scores: Optional[List[float]] = None,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> Tuple[List[Document], List[float]]:
+        """与 rerank_with_scores 相同，但打分失败时抛出异常而不是回退（供调用方自行降级）"""
+        scores = [0.0] * len(documents) if scores is None else scores
+        if not self._needs_rank(question, documents):
+            return documents, scores
+        return self._finish(self._rank(question, documents, scores, query_vector))
+    
+    async def arerank(
+        self,
+        question: str,
+        documents: List[Document],
+    ) -> List[Document]:
+        """rerank 的异步版本"""
+        reranked, _ = await self.arerank_with_scores(question, documents)
+        return reranked
+    
+    async def arerank_with_scores(
+        self,
+        question: str,
+        documents: List[Document],
+        scores: Optional[List[float]] = None,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> Tuple[List[Document], List[float]]:
+        """rerank_with_scores 的异步版本"""
+        scores = [0.0] * len(documents) if scores is None else scores
+        try:
+            return await self.arerank_or_raise(question, documents, scores, query_vector)
+        except Exception as e:
+            logger.error(f"重排失败，使用原始顺序: {e}")
+            metrics.count("rerank_fallbacks_total", "重排降级（按检索顺序返回）次数", reason="error")
+            return documents[:self._top_k], scores[:self._top_k]
+    
+    async def arerank_or_raise(
+        self,
+        question: str,
+        documents: List[Document],
+        scores: Optional[List[float]] = None,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> Tuple[List[Document], List[float]]:
+        """rerank_or_raise 的异步版本"""
+        scores = [0.0] * len(documents) if scores is None else scores
+        if not self._needs_rank(question, documents):
+            return documents, scores
+        return self._finish(await self._arank(question, documents, scores, query_vector))
+    
+    def _needs_rank(self, question: str, documents: List[Document]) -> bool:
+        """输入为空或数量不超过 top_k 时无需重排"""
+        if not documents:
+            logger.warning("重排输入为空")
+            return False
+        
+        if len(documents) <= self._top_k:
+            logger.debug(f"文档数({len(documents)}) <= top_k({self._top_k})，跳过重排")
+            return False
+        
+        logger.info(f"开始重排: 问题长度={len(question)}, 文档数={len(documents)}")
+        return True
+        
+    def _finish(
+        self,
+        ranked: List[Tuple[Document, float]],
+    ) -> Tuple[List[Document], List[float]]:
+        """截取 top_k 并拆分为文档与评分"""
+        reranked = ranked[:self._top_k]
+        if not reranked:
+            raise RerankerError("评分结果无效", "没有可用的文档索引")
+        logger.info(f"重排完成: 返回 {len(reranked)} 个文档")
+        return [doc for doc, _ in reranked], [score for _, score in reranked]
+    
+    @abstractmethod
+    def _rank(
+        self,
+        question: str,
+        documents: List[Document],
+        scores: List[float],
+        query_vector: Optional[Sequence[float]],
+    ) -> List[Tuple[Document, float]]:
+        """对全部候选打分并降序排列"""
+    
+    async def _arank(
+        self,
+        question: str,
+        documents: List[Document],
+        scores: List[float],
+        query_vector: Optional[Sequence[float]],
+    ) -> List[Tuple[Document, float]]:
+        """_rank 的异步版本，默认在线程池中执行（本地计算无需覆盖）"""
+        return await asyncio.to_thread(self._rank, question, documents, scores, query_vector)
+
+
+class GeminiReranker(BaseReranker):
     """
     基于 Gemini 的文档重排器
     
@@ -26,9 +196,13 @@ class GeminiReranker:
     
     def __init__(
         self,
-        llm: ChatGoogleGenerativeAI,
+        llm: BaseChatModel,
         top_k: int = 5,
         preview_length: int = 300,
+        cache: Optional[RerankScoreCache] = None,
+        shard_size: int = 0,
+        max_parallel_shards: int = 4,
+        shard_timeout: float = 20.0,
     ):
         """
         初始化重排器
@@ -37,45 +211,200 @@ class GeminiReranker:
             llm: 用于评分的 LLM 实例
             top_k: 重排后保留的文档数量
             preview_length: 文档预览长度
+            cache: 可选的 (问题, 文本块) 分数缓存
+            shard_size: 每个分片的文档数，> 0 时候选拆分为多个 Prompt 并行评分
+            max_parallel_shards: 单次重排同时评分的分片数上限
+            shard_timeout: 分片评分超时（秒）
         """
+        super().__init__(top_k)
         self._llm = llm
-        self._top_k = top_k
         self._preview_length = preview_length
-        logger.info(f"重排器初始化: top_k={top_k}, preview_length={preview_length}")
+        self._cache = cache
+        self._shard_size = shard_size
+        self._max_parallel_shards = max(1, max_parallel_shards)
+        self._shard_timeout = shard_timeout
+        logger.info(
+            f"重排器初始化: top_k={top_k}, preview_length={preview_length}, "
+            f"缓存={'启用' if cache else '禁用'}, 分片={shard_size or '关闭'}"
+        )
     
-    def rerank(
+    @property
+    def cache(self) -> Optional[RerankScoreCache]:
+        return self._cache
+    
+    def _rank(
         self,
         question: str,
         documents: List[Document],
-    ) -> List[Document]:
-        """
-        对文档进行重排
+        scores: List[float],
+        query_vector: Optional[Sequence[float]],
+    ) -> List[Tuple[Document, float]]:
+        """调用 LLM 评分并排序"""
+        doc_scores, pending = self._cached_scores(question, documents)
+        shards = self._split_shards(pending)
+        if len(shards) == 1:
+            llm_scores = self._get_relevance_scores(question, [documents[i] for i in pending])
+            self._merge_scores(question, documents, pending, llm_scores, doc_scores)
+        elif shards:
+            self._score_shards(question, documents, shards, doc_scores)
+        return self._sort_by_scores(documents, doc_scores)
+    
+    async def _arank(
+        self,
+        question: str,
+        documents: List[Document],
+        scores: List[float],
+        query_vector: Optional[Sequence[float]],
+    ) -> List[Tuple[Document, float]]:
+        """异步调用 LLM 评分并排序"""
+        doc_scores, pending = self._cached_scores(question, documents)
+        shards = self._split_shards(pending)
+        if len(shards) == 1:
+            llm_scores = await self._aget_relevance_scores(question, [documents[i] for i in pending])
+            self._merge_scores(question, documents, pending, llm_scores, doc_scores)
+        elif shards:
+            await self._ascore_shards(question, documents, shards, doc_scores)
+        return self._sort_by_scores(documents, doc_scores)
+    
+    # ── 分片评分 ──────────────────────────────────────────────
+    # 候选拆成多个小 Prompt 并行评分，总耗时约等于最慢的一个分片；
+    # 单个分片失败或超时只影响该分片，其文档按原始检索排名给出兜底分数
+    
+    def _split_shards(self, pending: List[int]) -> List[List[int]]:
+        if not pending:
+            return []
+        if self._shard_size <= 0 or len(pending) <= self._shard_size:
+            return [pending]
+        size = self._shard_size
+        return [pending[i:i + size] for i in range(0, len(pending), size)]
+    
+    def _score_shards(
+        self,
+        question: str,
+        documents: List[Document],
+        shards: List[List[int]],
+        doc_scores: Dict[int, float],
+    ) -> None:
+        """在共用线程池中并行评分各分片，同时进行的分片数不超过 max_parallel_shards"""
+        deadline = time.monotonic() + self._shard_timeout
+        semaphore = threading.Semaphore(self._max_parallel_shards)
+        futures = {}
+        for shard in shards:
+            # 等待空位也计入分片超时，等不到的分片按超时兜底
+            if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                break
+            future = _shard_executor.submit(
+                self._get_relevance_scores, question, [documents[i] for i in shard]
+            )
+            future.add_done_callback(lambda _: semaphore.release())
+            futures[future] = shard
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        for shard in shards[len(futures):]:
+            self._fallback_shard(len(documents), shard, doc_scores, "超时")
+        for future, shard in futures.items():
+            if future not in done:
+                # 尚未开始的分片不再执行；已在执行的不等待其结束
+                future.cancel()
+                self._fallback_shard(len(documents), shard, doc_scores, "超时")
+            elif future.exception() is not None:
+                self._fallback_shard(len(documents), shard, doc_scores, future.exception())
+            else:
+                self._merge_scores(question, documents, shard, future.result(), doc_scores)
+    
+    async def _ascore_shards(
+        self,
+        question: str,
+        documents: List[Document],
+        shards: List[List[int]],
+        doc_scores: Dict[int, float],
+    ) -> None:
+        """_score_shards 的异步版本"""
+        semaphore = asyncio.Semaphore(self._max_parallel_shards)
         
-        Args:
-            question: 用户问题
-            documents: 待重排的文档列表
-            
-        Returns:
-            重排后的文档列表（最多 top_k 个）
+        async def score(shard: List[int]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await asyncio.wait_for(
+                    self._aget_relevance_scores(question, [documents[i] for i in shard]),
+                    timeout=self._shard_timeout,
+                )
+        
+        results = await asyncio.gather(*(score(shard) for shard in shards), return_exceptions=True)
+        for shard, result in zip(shards, results):
+            if isinstance(result, BaseException):
+                reason = "超时" if isinstance(result, asyncio.TimeoutError) else result
+                self._fallback_shard(len(documents), shard, doc_scores, reason)
+            else:
+                self._merge_scores(question, documents, shard, result, doc_scores)
+    
+    @staticmethod
+    def _fallback_shard(
+        total: int,
+        shard: List[int],
+        doc_scores: Dict[int, float],
+        reason: Any,
+    ) -> None:
         """
-        if not documents:
-            logger.warning("重排输入为空")
-            return []
+        分片评分失败时按原始检索排名给出兜底分数（不写入缓存）
         
-        if len(documents) <= self._top_k:
-            logger.debug(f"文档数({len(documents)}) <= top_k({self._top_k})，跳过重排")
-            return documents
+        兜底分数落在 0-5 之间：排名靠前的候选保留中等分数，
+        不会压过 LLM 明确判为相关的文档
+        """
+        logger.warning(f"重排分片失败（{len(shard)} 个文档），按检索排名兜底: {reason}")
+        metrics.count(
+            "rerank_fallbacks_total",
+            "重排降级（按检索顺序返回）次数",
+            reason="shard_timeout" if reason == "超时" else "shard_error",
+        )
+        for i in shard:
+            doc_scores[i] = 5.0 * (1 - i / total)
+    
+    def _cached_scores(
+        self,
+        question: str,
+        documents: List[Document],
+    ) -> Tuple[Dict[int, float], List[int]]:
+        """
+        查询评分缓存
         
-        logger.info(f"开始重排: 问题长度={len(question)}, 文档数={len(documents)}")
+        Returns:
+            (已缓存的 索引 → 原始评分 0-10, 需要交给 LLM 评分的文档索引)
+        """
+        if not self._cache:
+            return {}, list(range(len(documents)))
+        chunk_ids = [doc.id for doc in documents]
+        cached = self._cache.get_many(question, filter(None, chunk_ids))
+        doc_scores = {
+            i: cached[chunk_id] for i, chunk_id in enumerate(chunk_ids) if chunk_id in cached
+        }
+        pending = [i for i in range(len(documents)) if i not in doc_scores]
+        metrics.cache_lookup("rerank_score", hits=len(doc_scores), misses=len(pending))
+        if cached:
+            logger.info(f"重排缓存命中 {len(cached)} 个，需评分 {len(pending)} 个")
+        return doc_scores, pending
         
-        try:
-            scores = self._get_relevance_scores(question, documents)
-            reranked = self._sort_by_scores(documents, scores)
-            logger.info(f"重排完成: 返回 {len(reranked)} 个文档")
-            return reranked
-        except Exception as e:
-            logger.error(f"重排失败，使用原始顺序: {e}")
-            return documents[:self._top_k]
+    def _merge_scores(
+        self,
+        question: str,
+        documents: List[Document],
+        pending: List[int],
+        llm_scores: List[Dict[str, Any]],
+        doc_scores: Dict[int, float],
+    ) -> None:
+        """将 LLM 对 pending 文档的评分并入 doc_scores，并写入缓存"""
+        fresh = {
+            pending[local]: score
+            for local, score in self._index_scores(llm_scores, len(pending)).items()
+        }
+        doc_scores.update(fresh)
+        if self._cache:
+            self._cache.put_many(
+                question,
+                {documents[i].id: score for i, score in fresh.items() if documents[i].id},
+            )
+    
+    def _build_prompt(self, question: str, documents: List[Document]) -> str:
+        documents_str = format_docs_for_rerank(documents, self._preview_length)
+        return Prompts.RERANK.format(question=question, documents=documents_str)
     
     def _get_relevance_scores(
         self,
@@ -83,19 +412,33 @@ class GeminiReranker:
         documents: List[Document],
     ) -> List[Dict[str, Any]]:
         """调用 LLM 获取相关性评分"""
-        documents_str = format_docs_for_rerank(documents, self._preview_length)
-        prompt = Prompts.RERANK.format(question=question, documents=documents_str)
+        prompt = self._build_prompt(question, documents)
         
         logger.debug("调用 LLM 进行相关性评分")
-        response = self._llm.invoke(prompt)
+        with metrics.track("rerank", "llm_call"):
+            response = self._llm.invoke(prompt)
         response_text = response.content.strip()
         
         return self._parse_scores(response_text)
     
+    async def _aget_relevance_scores(
+        self,
+        question: str,
+        documents: List[Document],
+    ) -> List[Dict[str, Any]]:
+        """异步调用 LLM 获取相关性评分"""
+        prompt = self._build_prompt(question, documents)
+        
+        logger.debug("异步调用 LLM 进行相关性评分")
+        with metrics.track("rerank", "llm_call"):
+            response = await self._llm.ainvoke(prompt)
+        return self._parse_scores(response.content.strip())
+    
     def _parse_scores(self, response_text: str) -> List[Dict[str, Any]]:
         """解析 LLM 返回的评分 JSON"""
         json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
         if not json_match:
+            metrics.count("rerank_parse_failures_total", "LLM 重排评分解析失败次数")
             raise RerankerError("无法解析评分结果", "未找到 JSON 数组")
         
         try:
@@ -103,31 +446,193 @@ class GeminiReranker:
             logger.debug(f"解析到 {len(scores)} 个评分")
             return scores
         except json.JSONDecodeError as e:
+            metrics.count("rerank_parse_failures_total", "LLM 重排评分解析失败次数")
             raise RerankerError("JSON 解析失败", str(e))
     
+    @staticmethod
+    def _index_scores(scores: List[Dict[str, Any]], count: int) -> Dict[int, float]:
+        """将 LLM 返回的 [{"index": 1-based, "score": n}] 转为 0-based 索引 → 分数"""
+        result = {}
+        for item in scores:
+            try:
+                idx = int(item.get("index", 0)) - 1  # 转为 0-based 索引
+                score = float(item.get("score", 0))
+            except (AttributeError, TypeError, ValueError):
+                continue
+            if 0 <= idx < count:
+                result[idx] = score
+        return result
+    
     def _sort_by_scores(
         self,
         documents: List[Document],
-        scores: List[Dict[str, Any]],
-    ) -> List[Document]:
-        """根据评分排序文档"""
-        scores.sort(key=lambda x: x.get("score", 0), reverse=True)
+        doc_scores: Dict[int, float],
+    ) -> List[Tuple[Document, float]]:
+        """根据评分排序文档，评分归一化到 0-1"""
+        ranked = sorted(doc_scores.items(), key=lambda item: item[1], reverse=True)
         
         reranked_docs = []
-        for item in scores[:self._top_k]:
-            idx = item.get("index", 1) - 1  # 转为 0-based 索引
-            if 0 <= idx < len(documents):
-                reranked_docs.append(documents[idx])
-                logger.debug(f"选中文档 {idx+1}, 得分: {item.get('score', 0)}")
+        for idx, score in ranked[:self._top_k]:
+            reranked_docs.append((documents[idx], score / 10))
+            logger.debug(f"选中文档 {idx+1}, 得分: {score}")
         
-        return reranked_docs if reranked_docs else documents[:self._top_k]
+        return reranked_docs
 
 
-def create_reranker(llm: ChatGoogleGenerativeAI) -> GeminiReranker:
-    """工厂函数：创建重排器实例"""
+class LocalReranker(BaseReranker):
+    """
+    本地重排器（无需网络）
+    
+    对候选文档计算以下特征并加权求和，全部以 NumPy 向量化完成：
+    - cosine: 查询向量与文档向量的余弦相似度
+    - bm25: 以候选集为语料的 BM25 分数
+    - overlap: 问题字二元组在文档中的覆盖率
+    - prior: 初始检索排名（越靠前越高）
+    各特征先在候选集内做 min-max 归一化
+    """
+    
+    DEFAULT_WEIGHTS = {"cosine": 0.4, "bm25": 0.3, "overlap": 0.2, "prior": 0.1}
+    
+    def __init__(
+        self,
+        top_k: int = 5,
+        weights: Optional[Dict[str, float]] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        """
+        初始化本地重排器
+        
+        Args:
+            top_k: 重排后保留的文档数量
+            weights: 特征权重，缺省项使用 DEFAULT_WEIGHTS
+            k1: BM25 参数 k1
+            b: BM25 参数 b
+        """
+        super().__init__(top_k)
+        self._weights = {**self.DEFAULT_WEIGHTS, **(weights or {})}
+        self._k1 = k1
+        self._b = b
+        logger.info(f"本地重排器初始化: top_k={top_k}, weights={self._weights}")
+    
+    def _rank(
+        self,
+        question: str,
+        documents: List[Document],
+        scores: List[float],
+        query_vector: Optional[Sequence[float]],
+    ) -> List[Tuple[Document, float]]:
+        """计算特征并按加权分数排序"""
+        n = len(documents)
+        overlap, bm25 = self._lexical_features(question, documents)
+        prior = 1.0 - np.arange(n, dtype=np.float32) / max(n - 1, 1)
+        columns = {"overlap": overlap, "bm25": bm25, "prior": prior}
+        cosine = self._cosine_feature(documents, query_vector)
+        if cosine is not None:
+            columns["cosine"] = cosine
+        
+        total_weight = sum(self._weights.get(name, 0.0) for name in columns)
+        combined = np.zeros(n, dtype=np.float32)
+        for name, values in columns.items():
+            combined += self._weights.get(name, 0.0) * _min_max(values)
+        if total_weight > 0:
+            combined /= total_weight
+        
+        order = np.argsort(-combined, kind="stable")
+        return [(documents[i], float(combined[i])) for i in order]
+    
+    def _lexical_features(
+        self,
+        question: str,
+        documents: List[Document],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """字面重合率与候选集内 BM25"""
+        query_terms = list(dict.fromkeys(tokenize(question)))
+        n = len(documents)
+        if not query_terms:
+            return np.zeros(n, dtype=np.float32), np.zeros(n, dtype=np.float32)
+        
+        term_index = {term: i for i, term in enumerate(query_terms)}
+        tf = np.zeros((n, len(query_terms)), dtype=np.float32)
+        lengths = np.zeros(n, dtype=np.float32)
+        for row, doc in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            lengths[row] = len(tokens)
+            for token in tokens:
+                col = term_index.get(token)
+                if col is not None:
+                    tf[row, col] += 1
+        
+        present = tf > 0
+        overlap = present.mean(axis=1)
+        
+        df = present.sum(axis=0)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avg_length = lengths.mean() if lengths.mean() > 0 else 1.0
+        norm = self._k1 * (1 - self._b + self._b * lengths / avg_length)
+        bm25 = (idf * tf * (self._k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+        return overlap.astype(np.float32), bm25.astype(np.float32)
+    
+    def _cosine_feature(
+        self,
+        documents: List[Document],
+        query_vector: Optional[Sequence[float]],
+    ) -> Optional[np.ndarray]:
+        """查询向量与候选文档向量的余弦相似度（缺少向量时返回 None）"""
+        if query_vector is None:
+            return None
+        from core.vectorstore import vectorstore_manager
+        ids = [doc.id for doc in documents]
+        if not all(ids):
+            return None
+        shards = vectorstore_manager.shards_of_documents(documents)
+        matrix = vectorstore_manager.get_embeddings(ids, shards)
+        if matrix is None:
+            return None
+        query = np.asarray(query_vector, dtype=np.float32)
+        doc_norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        doc_norms[doc_norms == 0] = 1.0
+        return (matrix @ query) / doc_norms
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    """候选集内 min-max 归一化（常数列归零）"""
+    low, high = float(values.min()), float(values.max())
+    if high - low < 1e-9:
+        return np.zeros_like(values, dtype=np.float32)
+    return ((values - low) / (high - low)).astype(np.float32)
+
+
+def create_reranker(llm: Optional[BaseChatModel] = None) -> BaseReranker:
+    """
+    工厂函数：按 RerankConfig.mode 创建重排器实例
+    
+    Args:
+        llm: LLM 模式使用的模型，缺省时取 model_manager.llm
+    """
     from config import config
-    return GeminiReranker(
-        llm=llm,
-        top_k=config.retrieval.search_k,
-        preview_length=config.rerank.doc_preview_length,
-    )
+    mode = config.rerank.mode
+    if mode == "local":
+        return LocalReranker(top_k=config.result_k)
+    if mode == "llm":
+        if llm is None:
+            from core.models import model_manager
+            llm = model_manager.llm
+        cache = None
+        if config.rerank.cache_enabled:
+            from core.vectorstore import vectorstore_manager
+            cache = RerankScoreCache(
+                max_size=config.rerank.cache_size,
+                ttl=config.rerank.cache_ttl,
+                version_fn=lambda: vectorstore_manager.version,
+            )
+        return GeminiReranker(
+            llm=llm,
+            top_k=config.result_k,
+            preview_length=config.rerank.doc_preview_length,
+            cache=cache,
+            shard_size=config.rerank.shard_size,
+            max_parallel_shards=config.rerank.max_parallel_shards,
+            shard_timeout=config.rerank.shard_timeout,
+        )
+    raise RerankerError("未知的重排模式", mode)
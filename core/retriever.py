@@ -1,52 +1,67 @@
 """
 检索器模块
 
-集成向量检索和重排功能
+集成向量检索、BM25 稀疏检索（RRF 融合）和重排功能
 """
-from typing import List, Optional
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
 
 from langchain_core.documents import Document
 
-from core.models import model_manager
+from core.context import QueryContext
 from core.vectorstore import vectorstore_manager
-from core.reranker import GeminiReranker, create_reranker
+from core.sparse_index import sparse_index_manager
+from core.reranker import BaseReranker, create_reranker
+from utils.circuit_breaker import CircuitBreaker
+from utils.metrics import metrics
 from utils.logger import get_logger
 from utils.exceptions import RetrievalError
 
 logger = get_logger("novel_rag.retriever")
 
+# 混合检索时并行执行稠密检索的线程池
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retriever")
+# 有时间预算时执行同步重排的线程池（超时后调用方不再等待）
+_rerank_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="rerank")
+
 
 class RAGRetriever:
     """
     RAG 检索器
     
-    封装向量检索 + 重排的完整流程
+    封装向量检索 + 重排的完整流程；上下文带时间预算时，
+    向量检索超时只用 BM25 结果，重排超时、失败或熔断时保持检索顺序
     """
     
-    def __init__(self, reranker: Optional[GeminiReranker] = None):
+    def __init__(
+        self,
+        reranker: Optional[BaseReranker] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
         """
         初始化检索器
         
         Args:
             reranker: 可选的重排器实例
+            breaker: 可选的重排熔断器
         """
         self._reranker = reranker
-        self._base_retriever = None
+        self._breaker = breaker
         logger.info(f"检索器初始化: 重排={'启用' if reranker else '禁用'}")
     
     @property
-    def base_retriever(self):
-        """获取基础向量检索器"""
-        if self._base_retriever is None:
-            from config import config
-            search_k = (
-                config.rerank.candidates 
-                if config.rerank.enabled and self._reranker 
-                else config.retrieval.search_k
-            )
-            self._base_retriever = vectorstore_manager.get_retriever(search_k)
-            logger.info(f"基础检索器初始化: k={search_k}")
-        return self._base_retriever
+    def breaker(self) -> Optional[CircuitBreaker]:
+        return self._breaker
+    
+    @property
+    def search_k(self) -> int:
+        """向量检索的候选数量"""
+        from config import config
+        if config.rerank.enabled and self._reranker:
+            return config.rerank.candidates
+        return config.result_k
     
     def retrieve(self, question: str) -> List[Document]:
         """
@@ -58,30 +73,337 @@ class RAGRetriever:
         Returns:
             检索（并重排）后的文档列表
         """
-        from config import config
+        return self.retrieve_context(QueryContext(question=question)).documents
+    
+    def retrieve_context(self, ctx: QueryContext) -> QueryContext:
+        """
+        在请求上下文中执行检索，结果与各阶段耗时写回上下文
+        
+        Args:
+            ctx: 请求上下文
+            
+        Returns:
+            填充了文档、评分和耗时的同一上下文
+        """
+        question = ctx.question
         logger.info(f"检索问题: {question[:50]}...")
         
         try:
-            docs = self.base_retriever.invoke(question)
-            logger.info(f"向量检索返回 {len(docs)} 个文档")
-            
-            if self._reranker and config.rerank.enabled and len(docs) > config.retrieval.search_k:
-                docs = self._reranker.rerank(question, docs)
-            
-            return docs
+            with ctx.span("retrieve"):
+                if self._use_hybrid(ctx):
+                    # 稠密检索（含查询向量计算）与 BM25 并行执行
+                    dense_future = _search_executor.submit(self._dense_search, ctx)
+                    sparse_hits = self._sparse_search(ctx)
+                    dense_hits = self._wait_dense(ctx, dense_future)
+                    with ctx.timer("fuse"):
+                        docs, scores = self._fuse(dense_hits, sparse_hits, ctx.scope)
+                    self._set_fused(ctx, docs, scores, dense_hits, sparse_hits)
+                elif self._dense_timeout(ctx) is None:
+                    self._set_dense(ctx, self._dense_search(ctx))
+                else:
+                    dense_hits = self._wait_dense(ctx, _search_executor.submit(self._dense_search, ctx))
+                    if "dense" in ctx.skipped:
+                        self._sparse_fallback(ctx)
+                    else:
+                        self._set_dense(ctx, dense_hits)
+                
+                self._rerank_step(ctx)
+                return ctx
+        except Exception as e:
+            raise RetrievalError("文档检索失败", str(e))
+    
+    async def aretrieve(self, question: str) -> List[Document]:
+        """retrieve 的异步版本"""
+        return (await self.aretrieve_context(QueryContext(question=question))).documents
+    
+    async def aretrieve_context(self, ctx: QueryContext) -> QueryContext:
+        """
+        retrieve_context 的异步版本
+        
+        查询向量与 LLM 重排走异步接口；本地的向量库、BM25 查询放到线程池执行，不阻塞事件循环
+        """
+        question = ctx.question
+        logger.info(f"检索问题: {question[:50]}...")
+        
+        try:
+            with ctx.span("retrieve"):
+                if self._use_hybrid(ctx):
+                    dense_task = asyncio.ensure_future(self._adense_search(ctx))
+                    sparse_hits = await asyncio.to_thread(self._sparse_search, ctx)
+                    dense_hits = await self._await_dense(ctx, dense_task)
+                    with ctx.timer("fuse"):
+                        docs, scores = await asyncio.to_thread(
+                            self._fuse, dense_hits, sparse_hits, ctx.scope
+                        )
+                    self._set_fused(ctx, docs, scores, dense_hits, sparse_hits)
+                else:
+                    dense_hits = await self._await_dense(ctx, asyncio.ensure_future(self._adense_search(ctx)))
+                    if "dense" in ctx.skipped:
+                        await asyncio.to_thread(self._sparse_fallback, ctx)
+                    else:
+                        self._set_dense(ctx, dense_hits)
+                
+                await self._arerank_step(ctx)
+                return ctx
         except Exception as e:
             raise RetrievalError("文档检索失败", str(e))
     
+    # ── 重排（时间预算 + 熔断） ─────────────────────────────────
+    
+    def _rerank_step(self, ctx: QueryContext) -> None:
+        """执行重排；超时、失败或熔断时保持检索顺序"""
+        allowed, timeout = self._rerank_gate(ctx)
+        if not allowed:
+            return
+        started = time.perf_counter()
+        args = (ctx.question, ctx.documents, ctx.scores, ctx.query_vector)
+        try:
+            with ctx.timer("rerank"):
+                if timeout is None:
+                    result = self._reranker.rerank_or_raise(*args)
+                else:
+                    # 超时后不再等待，后台线程完成的评分仍会写入重排缓存
+                    future = _rerank_executor.submit(self._reranker.rerank_or_raise, *args)
+                    result = future.result(timeout=max(timeout, 0))
+        except FutureTimeoutError:
+            return self._rerank_failed(ctx, "timeout")
+        except Exception as e:
+            logger.error(f"重排失败，使用检索顺序: {e}")
+            return self._rerank_failed(ctx, "error")
+        except BaseException:
+            self._rerank_abandoned()
+            raise
+        self._rerank_succeeded(ctx, started, result)
+    
+    async def _arerank_step(self, ctx: QueryContext) -> None:
+        """_rerank_step 的异步版本，超时会取消进行中的重排"""
+        allowed, timeout = self._rerank_gate(ctx)
+        if not allowed:
+            return
+        started = time.perf_counter()
+        try:
+            with ctx.timer("rerank"):
+                result = await asyncio.wait_for(
+                    self._reranker.arerank_or_raise(
+                        ctx.question, ctx.documents, ctx.scores, ctx.query_vector
+                    ),
+                    timeout=None if timeout is None else max(timeout, 0),
+                )
+        except asyncio.TimeoutError:
+            return self._rerank_failed(ctx, "timeout")
+        except Exception as e:
+            logger.error(f"重排失败，使用检索顺序: {e}")
+            return self._rerank_failed(ctx, "error")
+        except BaseException:
+            self._rerank_abandoned()
+            raise
+        self._rerank_succeeded(ctx, started, result)
+    
+    def _rerank_gate(self, ctx: QueryContext) -> Tuple[bool, Optional[float]]:
+        """
+        判断是否执行重排
+        
+        Returns:
+            (是否执行, 可用时间（秒），None 表示不限)
+        """
+        if not self._should_rerank(ctx):
+            return False, None
+        timeout = ctx.stage_timeout("rerank")
+        if timeout is not None and timeout <= 0:
+            self._skip_rerank(ctx, "deadline")
+            return False, None
+        if self._breaker is not None and not self._breaker.allow():
+            self._skip_rerank(ctx, "circuit_open")
+            return False, None
+        return True, timeout
+    
+    def _rerank_succeeded(
+        self,
+        ctx: QueryContext,
+        started: float,
+        result: Tuple[List[Document], List[float]],
+    ) -> None:
+        if self._breaker is not None:
+            self._breaker.record(time.perf_counter() - started)
+        ctx.set_results(*result)
+    
+    def _rerank_abandoned(self) -> None:
+        """重排被取消（如请求协程被取消）：不计成败，但须释放半开探测名额"""
+        if self._breaker is not None:
+            self._breaker.release()
+    
+    def _rerank_failed(self, ctx: QueryContext, reason: str) -> None:
+        if self._breaker is not None:
+            self._breaker.record_failure()
+        self._skip_rerank(ctx, reason)
+    
+    def _skip_rerank(self, ctx: QueryContext, reason: str) -> None:
+        """跳过重排，按检索顺序截取 result_k 个文档"""
+        from config import config
+        k = config.result_k
+        logger.warning(f"跳过重排（{reason}），使用检索顺序")
+        metrics.count("rerank_fallbacks_total", "重排降级（按检索顺序返回）次数", reason=reason)
+        ctx.skip("rerank", reason)
+        ctx.set_results(ctx.documents[:k], ctx.scores[:k])
+    
+    # ── 向量检索 ──────────────────────────────────────────────
+    
+    @staticmethod
+    def _dense_timeout(ctx: QueryContext) -> Optional[float]:
+        """
+        向量检索可用时间：search 预算（尚未计算查询向量时再加 embed 预算）与剩余时间取小
+        """
+        stages = ("search",) if ctx.query_vector is not None else ("embed", "search")
+        budgets = [ctx.budgets[stage] for stage in stages if stage in ctx.budgets]
+        limits = [limit for limit in (sum(budgets) if budgets else None, ctx.remaining()) if limit is not None]
+        return min(limits) if limits else None
+    
+    def _wait_dense(self, ctx: QueryContext, future: Future) -> List[Tuple[Document, float]]:
+        """在时间预算内等待向量检索，超时返回空结果"""
+        timeout = self._dense_timeout(ctx)
+        try:
+            return future.result(timeout=None if timeout is None else max(timeout, 0))
+        except FutureTimeoutError:
+            return self._skip_dense(ctx)
+    
+    async def _await_dense(
+        self, ctx: QueryContext, task: "asyncio.Future"
+    ) -> List[Tuple[Document, float]]:
+        """_wait_dense 的异步版本"""
+        timeout = self._dense_timeout(ctx)
+        done, _ = await asyncio.wait({task}, timeout=None if timeout is None else max(timeout, 0))
+        if task in done:
+            return task.result()
+        # 不取消：查询向量算完后仍会进入缓存，供后续请求复用
+        task.add_done_callback(_consume_result)
+        return self._skip_dense(ctx)
+    
+    @staticmethod
+    def _skip_dense(ctx: QueryContext) -> List[Tuple[Document, float]]:
+        logger.warning("向量检索超出时间预算，仅使用 BM25 结果")
+        ctx.skip("dense", "timeout")
+        return []
+    
+    def _sparse_fallback(self, ctx: QueryContext) -> None:
+        """非混合模式下向量检索超时：有 BM25 索引时改用 BM25 结果，否则返回空结果"""
+        sparse_hits = self._sparse_search(ctx) if self._has_sparse(ctx) else []
+        with ctx.timer("fuse"):
+            docs, scores = self._fuse([], sparse_hits, ctx.scope)
+        self._set_fused(ctx, docs, scores, [], sparse_hits)
+    
+    @staticmethod
+    def _has_sparse(ctx: QueryContext) -> bool:
+        shards = vectorstore_manager.shards() if ctx.scope is None else ctx.scope
+        return sparse_index_manager.size(shards) > 0
+    
+    @classmethod
+    def _use_hybrid(cls, ctx: QueryContext) -> bool:
+        from config import config
+        return config.retrieval.hybrid and cls._has_sparse(ctx)
+    
+    def _should_rerank(self, ctx: QueryContext) -> bool:
+        from config import config
+        return bool(
+            self._reranker
+            and config.rerank.enabled
+            and len(ctx.documents) > config.result_k
+        )
+    
+    @staticmethod
+    def _set_dense(ctx: QueryContext, hits: List[Tuple[Document, float]]) -> None:
+        ctx.set_results([doc for doc, _ in hits], [score for _, score in hits])
+        logger.info(f"向量检索返回 {len(ctx.documents)} 个文档")
+    
+    @staticmethod
+    def _set_fused(
+        ctx: QueryContext,
+        docs: List[Document],
+        scores: List[float],
+        dense_hits: List[Tuple[Document, float]],
+        sparse_hits: List[Tuple[str, float]],
+    ) -> None:
+        ctx.set_results(docs, scores)
+        logger.info(
+            f"混合检索: 向量 {len(dense_hits)} + BM25 {len(sparse_hits)} → 融合 {len(docs)} 个文档"
+        )
+    
+    def _dense_search(self, ctx: QueryContext) -> List[Tuple[Document, float]]:
+        """计算查询向量（上下文中已有时直接复用）并执行向量检索"""
+        if ctx.query_vector is None:
+            with ctx.timer("embed"):
+                ctx.query_vector = vectorstore_manager.embed_query(ctx.question)
+        with ctx.timer("search"):
+            return vectorstore_manager.search_by_vector(ctx.query_vector, self.search_k, ctx.scope)
+    
+    async def _adense_search(self, ctx: QueryContext) -> List[Tuple[Document, float]]:
+        """_dense_search 的异步版本"""
+        if ctx.query_vector is None:
+            with ctx.timer("embed"):
+                ctx.query_vector = await vectorstore_manager.aembed_query(ctx.question)
+        with ctx.timer("search"):
+            return await asyncio.to_thread(
+                vectorstore_manager.search_by_vector, ctx.query_vector, self.search_k, ctx.scope
+            )
+    
+    @staticmethod
+    def _sparse_search(ctx: QueryContext) -> List[Tuple[str, float]]:
+        """BM25 检索（限定范围时只查范围内的分片）"""
+        from config import config
+        shards = vectorstore_manager.shards() if ctx.scope is None else ctx.scope
+        with ctx.timer("sparse"):
+            return sparse_index_manager.search(ctx.question, config.retrieval.sparse_k, shards)
+    
+    def _fuse(
+        self,
+        dense_hits: List[Tuple[Document, float]],
+        sparse_hits: List[Tuple[str, float]],
+        scope: Optional[List[str]] = None,
+    ) -> Tuple[List[Document], List[float]]:
+        """
+        倒数排名融合（RRF）
+        
+        score(d) = Σ 1 / (rrf_k + rank)，只依赖排名，无需对齐两路分数的量纲
+        """
+        from config import config
+        rrf_k = config.retrieval.rrf_k
+        fused: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        for rank, (doc, _) in enumerate(dense_hits, 1):
+            docs[doc.id] = doc
+            fused[doc.id] = fused.get(doc.id, 0.0) + 1.0 / (rrf_k + rank)
+        for rank, (chunk_id, _) in enumerate(sparse_hits, 1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+        
+        ranked = sorted(fused, key=fused.get, reverse=True)[:self.search_k]
+        missing = [chunk_id for chunk_id in ranked if chunk_id not in docs]
+        for doc in vectorstore_manager.get_documents(missing, scope):
+            docs[doc.id] = doc
+        ranked = [chunk_id for chunk_id in ranked if chunk_id in docs]
+        return [docs[chunk_id] for chunk_id in ranked], [fused[chunk_id] for chunk_id in ranked]
+    
     def reset(self) -> None:
         """重置检索器状态"""
         logger.info("重置检索器")
-        self._base_retriever = None
+
+
+def _consume_result(task: "asyncio.Future") -> None:
+    """读取后台任务的结果，避免未处理异常告警"""
+    if not task.cancelled():
+        task.exception()
 
 
 def create_retriever() -> RAGRetriever:
     """工厂函数：创建检索器实例"""
     from config import config
     reranker = None
+    breaker = None
     if config.rerank.enabled:
-        reranker = create_reranker(model_manager.llm)
-    return RAGRetriever(reranker=reranker)
+        reranker = create_reranker()
+        deadline = config.deadline
+        breaker = CircuitBreaker(
+            "rerank",
+            failure_threshold=deadline.breaker_failures,
+            reset_timeout=deadline.breaker_reset,
+            slow_call_threshold=deadline.breaker_slow_call,
+        )
+    return RAGRetriever(reranker=reranker, breaker=breaker)
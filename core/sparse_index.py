@@ -0,0 +1,376 @@
+"""
+稀疏检索模块
+
+进程内 BM25 索引，补足向量检索对人名、地名、功法名等精确字面的召回：
+- 中文按字二元组（bigram）切分，英文/数字按整词
+- 正排索引（每个文本块的词项 ID 与词频）以 NumPy 平铺数组存储，支持增量写入和删除
+- 倒排索引由正排索引一次性构建为 CSR 数组，查询为纯向量化计算
+"""
+import heapq
+import json
+import re
+import shutil
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger("novel_rag.sparse_index")
+
+_TOKEN_PATTERN = re.compile(r"[一-鿿㐀-䶿]+|[A-Za-z0-9]+")
+_CJK_PATTERN = re.compile(r"[一-鿿㐀-䶿]")
+
+
+def tokenize(text: str) -> List[str]:
+    """切分为检索词项：中文连续片段取字二元组（单字片段保留单字），英文数字取小写整词"""
+    tokens: List[str] = []
+    for run in _TOKEN_PATTERN.findall(text):
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+class SparseIndex:
+    """
+    BM25 稀疏索引
+
+    持久化目录结构:
+        forward.npz   正排数组（doc_offsets / term_ids / term_freqs / alive）
+        vocab.txt     词表，每行一个词项
+        chunk_ids.txt 文本块 ID，每行一个
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self._k1 = k1
+        self._b = b
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        """重置为空索引（锁对象保持不变）"""
+        self._vocab: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._chunk_ids: List[str] = []
+        self._id_to_doc: Dict[str, int] = {}
+        # 正排：已固化部分为 NumPy 数组，新写入部分先暂存在列表中
+        self._doc_offsets = np.zeros(1, dtype=np.int64)
+        self._term_ids = np.zeros(0, dtype=np.int32)
+        self._term_freqs = np.zeros(0, dtype=np.uint16)
+        self._alive = np.zeros(0, dtype=bool)
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_dead: List[int] = []
+        # 倒排（查询时使用，写入后惰性重建）
+        self._postings: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._doc_lengths = np.zeros(0, dtype=np.float32)
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._avg_length = 0.0
+        self._dirty = False  # 有未保存的修改
+
+    # ── 写入 ──────────────────────────────────────────────────
+
+    @property
+    def size(self) -> int:
+        """有效文本块数量"""
+        with self._lock:
+            self._flush_pending()
+            return int(self._alive.sum())
+
+    def chunk_ids(self) -> set:
+        """当前有效的文本块 ID 集合"""
+        with self._lock:
+            return set(self._id_to_doc)
+
+    def add(self, chunk_ids: Sequence[str], texts: Sequence[str]) -> int:
+        """
+        写入文本块（已存在的 ID 跳过，可重复调用）
+
+        Returns:
+            实际新增的文本块数
+        """
+        added = 0
+        with self._lock:
+            for chunk_id, text in zip(chunk_ids, texts):
+                if chunk_id in self._id_to_doc:
+                    continue
+                counts = Counter(tokenize(text))
+                term_ids = np.fromiter(
+                    (self._term_id(term) for term in counts), dtype=np.int32, count=len(counts)
+                )
+                freqs = np.fromiter(
+                    (min(freq, 65535) for freq in counts.values()), dtype=np.uint16, count=len(counts)
+                )
+                self._id_to_doc[chunk_id] = len(self._chunk_ids)
+                self._chunk_ids.append(chunk_id)
+                self._pending.append((term_ids, freqs))
+                added += 1
+            if added:
+                self._postings = None
+                self._dirty = True
+        return added
+
+    def remove(self, chunk_ids: Sequence[str]) -> int:
+        """删除文本块（标记删除，保存时按需压缩）"""
+        removed = 0
+        with self._lock:
+            for chunk_id in chunk_ids:
+                doc = self._id_to_doc.pop(chunk_id, None)
+                if doc is not None:
+                    self._pending_dead.append(doc)
+                    removed += 1
+            if removed:
+                self._postings = None
+                self._dirty = True
+        return removed
+
+    def clear(self) -> None:
+        """清空索引"""
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    @property
+    def dirty(self) -> bool:
+        """是否有未保存的修改"""
+        return self._dirty
+
+    def _term_id(self, term: str) -> int:
+        term_id = self._vocab.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            self._vocab[term] = term_id
+            self._terms.append(term)
+        return term_id
+
+    def _flush_pending(self) -> None:
+        """将暂存的写入合并进正排数组"""
+        if self._pending:
+            lengths = np.fromiter((len(t) for t, _ in self._pending), dtype=np.int64, count=len(self._pending))
+            self._doc_offsets = np.concatenate([self._doc_offsets, self._doc_offsets[-1] + np.cumsum(lengths)])
+            self._term_ids = np.concatenate([self._term_ids] + [t for t, _ in self._pending])
+            self._term_freqs = np.concatenate([self._term_freqs] + [f for _, f in self._pending])
+            self._alive = np.concatenate([self._alive, np.ones(len(self._pending), dtype=bool)])
+            self._pending = []
+        if self._pending_dead:
+            self._alive[self._pending_dead] = False
+            self._pending_dead = []
+
+    # ── 查询 ──────────────────────────────────────────────────
+
+    def _build_postings(self) -> None:
+        """由正排数组构建 CSR 倒排与 BM25 统计量"""
+        self._flush_pending()
+        n_docs = len(self._chunk_ids)
+        per_doc = np.diff(self._doc_offsets)
+        doc_of_entry = np.repeat(np.arange(n_docs, dtype=np.int32), per_doc)
+        alive_entry = self._alive[doc_of_entry]
+
+        term_ids = self._term_ids[alive_entry]
+        docs = doc_of_entry[alive_entry]
+        freqs = self._term_freqs[alive_entry].astype(np.float32)
+
+        order = np.argsort(term_ids, kind="stable")
+        counts = np.bincount(term_ids, minlength=len(self._terms))
+        offsets = np.zeros(len(self._terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        self._postings = (offsets, docs[order], freqs[order])
+
+        self._doc_lengths = np.bincount(docs, weights=freqs, minlength=n_docs).astype(np.float32)
+        n_alive = int(self._alive.sum())
+        self._avg_length = float(self._doc_lengths.sum() / n_alive) if n_alive else 0.0
+        self._idf = np.log1p((n_alive - counts + 0.5) / (counts + 0.5)).astype(np.float32)
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """
+        BM25 检索
+
+        Returns:
+            (文本块 ID, BM25 分数) 列表，按分数降序
+        """
+        with self._lock:
+            if self._postings is None:
+                self._build_postings()
+            offsets, post_docs, post_freqs = self._postings
+            doc_lengths, idf, avg_length = self._doc_lengths, self._idf, self._avg_length
+            chunk_ids = self._chunk_ids
+            term_ids = [self._vocab[t] for t in set(tokenize(query)) if t in self._vocab]
+
+        if not term_ids or avg_length == 0:
+            return []
+
+        scores = np.zeros(len(doc_lengths), dtype=np.float32)
+        norm = self._k1 * (1 - self._b + self._b * doc_lengths / avg_length)
+        for term_id in term_ids:
+            start, end = offsets[term_id], offsets[term_id + 1]
+            docs = post_docs[start:end]
+            tf = post_freqs[start:end]
+            # 同一词项的倒排列表内文档不重复，可直接花式索引累加
+            scores[docs] += idf[term_id] * tf * (self._k1 + 1) / (tf + norm[docs])
+
+        hit_count = int(np.count_nonzero(scores))
+        if hit_count == 0:
+            return []
+        k = min(k, hit_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(chunk_ids[i], float(scores[i])) for i in top]
+
+    # ── 持久化 ────────────────────────────────────────────────
+
+    def save(self, directory: Path) -> None:
+        """保存索引（删除比例较高时先压缩）"""
+        with self._lock:
+            self._flush_pending()
+            if len(self._alive) and (~self._alive).mean() > 0.2:
+                self._compact()
+            directory.mkdir(parents=True, exist_ok=True)
+            np.savez(
+                directory / "forward.npz",
+                doc_offsets=self._doc_offsets,
+                term_ids=self._term_ids,
+                term_freqs=self._term_freqs,
+                alive=self._alive,
+            )
+            (directory / "vocab.txt").write_text("\n".join(self._terms), encoding="utf-8")
+            (directory / "chunk_ids.txt").write_text("\n".join(self._chunk_ids), encoding="utf-8")
+            (directory / "meta.json").write_text(
+                json.dumps({"k1": self._k1, "b": self._b, "docs": len(self._chunk_ids)}),
+                encoding="utf-8",
+            )
+            self._dirty = False
+        logger.info(f"稀疏索引已保存: {self.size} 个文本块, {len(self._terms)} 个词项")
+
+    @classmethod
+    def load(cls, directory: Path, k1: float = 1.2, b: float = 0.75) -> "SparseIndex":
+        """加载索引，目录不存在时返回空索引"""
+        index = cls(k1=k1, b=b)
+        if not (directory / "forward.npz").exists():
+            return index
+        with np.load(directory / "forward.npz") as data:
+            index._doc_offsets = data["doc_offsets"]
+            index._term_ids = data["term_ids"]
+            index._term_freqs = data["term_freqs"]
+            index._alive = data["alive"]
+        vocab_text = (directory / "vocab.txt").read_text(encoding="utf-8")
+        index._terms = vocab_text.split("\n") if vocab_text else []
+        index._vocab = {term: i for i, term in enumerate(index._terms)}
+        ids_text = (directory / "chunk_ids.txt").read_text(encoding="utf-8")
+        index._chunk_ids = ids_text.split("\n") if ids_text else []
+        index._id_to_doc = {
+            chunk_id: i for i, chunk_id in enumerate(index._chunk_ids) if index._alive[i]
+        }
+        logger.info(f"稀疏索引已加载: {len(index._id_to_doc)} 个文本块")
+        return index
+
+    def _compact(self) -> None:
+        """移除已删除的文本块，重排文档编号"""
+        keep = np.flatnonzero(self._alive)
+        per_doc = np.diff(self._doc_offsets)
+        entry_keep = np.repeat(self._alive, per_doc)
+        self._term_ids = self._term_ids[entry_keep]
+        self._term_freqs = self._term_freqs[entry_keep]
+        self._doc_offsets = np.concatenate([[0], np.cumsum(per_doc[keep])]).astype(np.int64)
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._chunk_ids = [self._chunk_ids[i] for i in keep]
+        self._id_to_doc = {chunk_id: i for i, chunk_id in enumerate(self._chunk_ids)}
+        self._postings = None
+
+
+class SparseIndexManager:
+    """
+    稀疏索引管理器 - 单例模式，与向量库同目录持久化
+
+    与向量库一致按分片组织：默认分片（未分片时的全部数据）位于 sparse/，
+    各小说的分片位于 sparse_shards/<分片名>/
+    """
+
+    _instance: Optional["SparseIndexManager"] = None
+    _indexes: Dict[str, SparseIndex]
+
+    def __new__(cls) -> "SparseIndexManager":
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._indexes = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def directory(self, shard: str = "") -> Path:
+        """分片的持久化目录"""
+        from config import VECTORSTORE_DIR
+        if shard:
+            return VECTORSTORE_DIR / "sparse_shards" / shard
+        return VECTORSTORE_DIR / "sparse"
+
+    @property
+    def index(self) -> SparseIndex:
+        """获取默认分片的索引实例（懒加载）"""
+        return self.shard("")
+
+    def shard(self, name: str) -> SparseIndex:
+        """获取分片的索引实例（懒加载）"""
+        index = self._indexes.get(name)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(name)
+                if index is None:
+                    index = SparseIndex.load(self.directory(name))
+                    self._indexes[name] = index
+        return index
+
+    def size(self, shards: Sequence[str]) -> int:
+        """若干分片的有效文本块总数"""
+        return sum(self.shard(name).size for name in shards)
+
+    def search(self, query: str, k: int, shards: Sequence[str]) -> List[Tuple[str, float]]:
+        """
+        在若干分片中检索，合并 top-k
+
+        各分片的 IDF 与平均文档长度不同，BM25 分数不可直接比较；
+        多个分片时按分片内排名做倒数排名融合（RRF），返回的分数为融合分数
+        """
+        if len(shards) == 1:
+            return self.shard(shards[0]).search(query, k)
+        from config import config
+        rrf_k = config.retrieval.rrf_k
+        hits = [
+            (chunk_id, 1.0 / (rrf_k + rank))
+            for name in shards
+            for rank, (chunk_id, _) in enumerate(self.shard(name).search(query, k), 1)
+        ]
+        return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+
+    def drop(self, name: str) -> None:
+        """删除分片及其持久化文件"""
+        with self._lock:
+            self._indexes.pop(name, None)
+        shutil.rmtree(self.directory(name), ignore_errors=True)
+
+    def clear(self) -> None:
+        """清空全部分片"""
+        with self._lock:
+            self._indexes = {}
+        from config import VECTORSTORE_DIR
+        shutil.rmtree(VECTORSTORE_DIR / "sparse_shards", ignore_errors=True)
+        self.shard("").clear()
+
+    def save(self) -> None:
+        """持久化有修改的分片"""
+        for name, index in list(self._indexes.items()):
+            if index.dirty:
+                index.save(self.directory(name))
+
+    def reset(self) -> None:
+        """重置索引实例（下次访问时从磁盘重新加载）"""
+        self._indexes = {}
+
+
+# 全局稀疏索引管理器实例
+sparse_index_manager = SparseIndexManager()
@@ -0,0 +1,174 @@
+"""
+中文小说分块模块
+
+单遍扫描的分块器，针对中文长篇小说：
+- 识别「第X章 / 第X回」等章节标题，文本块不跨章节
+- 以句末标点（。！？；）及换行为切分点，整句装入文本块
+- 遵循 chunk_size / chunk_overlap，重叠部分尽量以整句对齐
+- 在 metadata 中记录章节序号、章节标题与原文起止偏移
+- 支持流式输入，内存只保留当前文本块附近的文本
+"""
+import re
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# 章节标题独占一行：「第X章」之后为行尾，或（经分隔符）接标题；标题中不含句中/句末标点
+CHAPTER_PATTERN = re.compile(
+    r"[ \t\u3000]*第[0-9０-９零〇一二两三四五六七八九十百千万]+[章回节卷集部篇]"
+    r"(?P<separator>[ \t\u3000:：·、.．\-—]*)(?P<title>[^。！？；，!?;,\n]*)\s*"
+)
+# 不带分隔符、紧接标题的标题行（如「第一章风起云涌」）的最大长度，更长的视为正文
+INLINE_HEADING_LENGTH = 20
+
+# 句子片段：以句末标点（含其后的引号/括号）或换行结束
+_SEGMENT_PATTERN = re.compile(
+    r"[^。！？；!?;\n]*[。！？；!?;]+[”’」』\"）)]*\n*"
+    r"|[^。！？；!?;\n]+\n*"
+    r"|\n+"
+)
+
+Span = Tuple[int, int]
+
+
+class ChineseNovelSplitter:
+    """中文小说分块器"""
+
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        max_heading_length: int = 40,
+    ):
+        """
+        初始化分块器
+
+        Args:
+            chunk_size: 文本块最大字符数
+            chunk_overlap: 相邻文本块的重叠字符数
+            max_heading_length: 章节标题行的最大长度，超过视为正文
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap 必须小于 chunk_size")
+        self._chunk_size = chunk_size
+        self._chunk_overlap = chunk_overlap
+        self._max_heading_length = max_heading_length
+
+    def split_text(self, text: str) -> List[Document]:
+        """对完整文本分块"""
+        return list(self.split_stream([text]))
+
+    def split_stream(self, blocks: Iterable[str]) -> Iterator[Document]:
+        """
+        对连续文本块流式分块
+
+        Args:
+            blocks: 按顺序读取的文本块
+
+        Yields:
+            文本块文档，metadata 含 start_index / end_index / chapter_index / chapter_title
+        """
+        buffer = ""
+        base = 0  # buffer[0] 在原文中的偏移
+        pos = 0  # buffer 中尚未扫描的位置
+        segments: List[Span] = []  # 当前文本块内的片段（原文偏移）
+        chapter_index = 0
+        chapter_title = ""
+        at_line_start = True
+
+        def make_chunk() -> Optional[Document]:
+            start, end = segments[0][0], segments[-1][1]
+            raw = buffer[start - base:end - base]
+            content = raw.strip()
+            if not content:
+                return None
+            start += len(raw) - len(raw.lstrip())
+            return Document(
+                page_content=content,
+                metadata={
+                    "start_index": start,
+                    "end_index": start + len(content),
+                    "chapter_index": chapter_index,
+                    "chapter_title": chapter_title,
+                },
+            )
+
+        for block in chain(blocks, [None]):
+            final = block is None
+            if not final:
+                buffer += block
+
+            for match in _SEGMENT_PATTERN.finditer(buffer, pos):
+                start, end = match.span()
+                if not final and end == len(buffer):
+                    break  # 末尾片段可能尚未结束，等待后续文本
+                pos = end
+                span = (base + start, base + end)
+                line_start, at_line_start = at_line_start, buffer[end - 1] == "\n"
+
+                if line_start and self._is_heading(buffer, start, end):
+                    if segments:
+                        chunk = make_chunk()
+                        if chunk:
+                            yield chunk
+                    chapter_index += 1
+                    chapter_title = buffer[start:end].strip()
+                    segments = [span]
+                    continue
+
+                pieces = (span,) if end - start <= self._chunk_size else self._pieces(span)
+                for piece in pieces:
+                    if segments and piece[1] - segments[0][0] > self._chunk_size:
+                        chunk = make_chunk()
+                        if chunk:
+                            yield chunk
+                        segments = self._overlap(segments)
+                        while segments and piece[1] - segments[0][0] > self._chunk_size:
+                            segments.pop(0)
+                    segments.append(piece)
+
+            # 丢弃已不再需要的文本
+            keep_from = segments[0][0] if segments else base + pos
+            drop = keep_from - base
+            if drop > 0:
+                buffer = buffer[drop:]
+                base += drop
+                pos -= drop
+
+        if segments:
+            chunk = make_chunk()
+            if chunk:
+                yield chunk
+
+    def _is_heading(self, buffer: str, start: int, end: int) -> bool:
+        """行首片段是否为章节标题（整个片段即标题行，以换行或文本末尾结束）"""
+        match = CHAPTER_PATTERN.fullmatch(buffer, start, end)
+        if match is None:
+            return False
+        length = len(buffer[start:end].strip())
+        if match["title"].strip() and not match["separator"]:
+            return length <= min(INLINE_HEADING_LENGTH, self._max_heading_length)
+        return length <= self._max_heading_length
+
+    def _pieces(self, span: Span) -> List[Span]:
+        """超长片段按 chunk_size 硬切分"""
+        start, end = span
+        return [
+            (offset, min(offset + self._chunk_size, end))
+            for offset in range(start, end, self._chunk_size)
+        ]
+
+    def _overlap(self, segments: List[Span]) -> List[Span]:
+        """取上一文本块末尾不超过 chunk_overlap 的整句作为重叠；末句过长时截取其尾部"""
+        if self._chunk_overlap <= 0:
+            return []
+        end = segments[-1][1]
+        kept: List[Span] = []
+        for span in reversed(segments):
+            if end - span[0] > self._chunk_overlap:
+                break
+            kept.insert(0, span)
+        if not kept:
+            kept = [(end - self._chunk_overlap, end)]
+        return kept
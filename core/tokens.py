@@ -0,0 +1,92 @@
+"""
+Token 计数模块
+
+用 tiktoken 估算文本的 token 数，供上下文打包按预算截取；
+编码文件无法加载（如离线环境首次运行）时退回按字符估算
+"""
+import re
+import threading
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from utils.cache import LRUCache
+from utils.logger import get_logger
+
+logger = get_logger("novel_rag.tokens")
+
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """按字符估算 token 数：中日文字符与全角标点约 1 个 token，其余约 4 个字符 1 个 token"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class TokenCounter:
+    """
+    Token 计数器
+
+    文本块的 token 数在摄取时写入 metadata["token_count"]；
+    缺少该字段的文档（旧数据、合并或截断后的段落）按文档 ID 与长度缓存计数结果
+    """
+
+    def __init__(self, encoding: str = "cl100k_base", cache_size: int = 50_000):
+        self._encoding_name = encoding
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._cache: LRUCache[int] = LRUCache(max_size=cache_size)
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self._encoding_name)
+                    except Exception as e:
+                        logger.warning(f"tiktoken 编码 {self._encoding_name} 加载失败，按字符估算 token 数: {e}")
+                    self._loaded = True
+        return self._encoding
+
+    @property
+    def exact(self) -> bool:
+        """是否使用 tiktoken 精确计数"""
+        return self._get_encoding() is not None
+
+    def count(self, text: str) -> int:
+        """计算文本的 token 数"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return estimate_tokens(text)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_document(self, doc: Document) -> int:
+        """文档的 token 数，优先使用摄取时记录的值"""
+        cached = (doc.metadata or {}).get("token_count")
+        if cached is not None:
+            return cached
+        key: Optional[tuple] = None
+        if doc.id:
+            key = (doc.id, doc.metadata.get("start_index"), len(doc.page_content))
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+        tokens = self.count(doc.page_content)
+        if key is not None:
+            self._cache.put(key, tokens)
+        return tokens
+
+
+_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    """按配置获取全局 Token 计数器"""
+    global _counter
+    if _counter is None:
+        from config import config
+        _counter = TokenCounter(config.context.tokenizer)
+    return _counter
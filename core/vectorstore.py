@@ -1,85 +1,647 @@
 """
 向量库管理模块
 
-管理 ChromaDB 向量库的创建、加载和操作
+管理向量库的创建、加载和操作。存储后端可插拔：
+- chroma: ChromaDB（默认）
+- numpy: 内存映射的 NumPy 矩阵，精确检索（见 core/numpy_backend.py）
+
+默认按小说分片：每个来源文件一个集合（分片），分片登记在注册表中；
+限定小说的查询只检索对应分片，不限定时并行检索全部分片后合并 top-k
 """
-from typing import Optional, List
+import heapq
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, List, Sequence, Set, Tuple, Union
 from pathlib import Path
 
-from langchain_community.vectorstores import Chroma
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 
 from core.models import model_manager
+from core.novel_registry import NovelEntry, NovelRegistry
 from utils.logger import get_logger
 from utils.exceptions import VectorStoreError
 
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import Chroma
+
 logger = get_logger("novel_rag.vectorstore")
 
+# Chroma 单次写入有批量上限，分批提交
+_WRITE_BATCH_SIZE = 1000
+# 未分片时使用的 Chroma 默认集合
+DEFAULT_COLLECTION = "langchain"
+# 未分片时的分片名
+DEFAULT_SHARD = ""
+
+# 多分片并行检索的线程池
+_fanout_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="vs-fanout")
+
+
+class VectorBackend(ABC):
+    """
+    向量存储后端接口
+    
+    文档以文本块 ID 为主键；检索结果中的 Document.id 为文本块 ID，分数越高越相关
+    """
+    
+    name: str = ""
+    
+    @abstractmethod
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: List[Document],
+    ) -> None:
+        """按 ID 写入文档及其向量（已存在则覆盖）"""
+    
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        """按 ID 删除文档"""
+    
+    @abstractmethod
+    def clear(self) -> None:
+        """清空全部数据"""
+    
+    @abstractmethod
+    def search(self, query_vectors: np.ndarray, k: int) -> List[List[Tuple[Document, float]]]:
+        """
+        批量检索
+        
+        Args:
+            query_vectors: (查询数, 维度) 的 float32 矩阵
+            k: 每个查询返回的文档数量
+        
+        Returns:
+            每个查询的 (文档, 相关性分数) 列表
+        """
+    
+    @abstractmethod
+    def get_documents(self, ids: List[str]) -> List[Document]:
+        """按 ID 读取文档（忽略不存在的 ID，保持输入顺序）"""
+    
+    @abstractmethod
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """按 ID 读取文档向量（忽略不存在的 ID）"""
+    
+    @abstractmethod
+    def count(self) -> int:
+        """文档数量"""
+    
+    def build_index(self, force: bool = False) -> bool:
+        """按需构建近似检索索引，返回是否重新构建（默认无操作）"""
+        return False
+    
+    def warm_up(self) -> None:
+        """打开存储并把索引读入内存，使首次检索不再承担加载开销（默认只打开存储）"""
+        self.count()
+    
+    def close(self) -> None:
+        """释放资源"""
+
+
+class ChromaBackend(VectorBackend):
+    """ChromaDB 后端"""
+    
+    name = "chroma"
+    # 各分片并行首次打开时串行创建：chromadb 的导入与共享客户端的初始化都不是线程安全的
+    _open_lock = threading.Lock()
+    
+    def __init__(self, persist_dir: Path, collection_name: str = DEFAULT_COLLECTION):
+        self._persist_dir = persist_dir
+        self._collection_name = collection_name
+        self._vectorstore: Optional["Chroma"] = None
+    
+    @property
+    def vectorstore(self) -> "Chroma":
+        """Chroma 实例（懒加载）"""
+        if self._vectorstore is None:
+            with self._open_lock:
+                if self._vectorstore is None:
+                    self._vectorstore = self._open()
+        return self._vectorstore
+    
+    def _open(self) -> "Chroma":
+        logger.info(f"加载向量库: {self._persist_dir} ({self._collection_name})")
+        try:
+            # chromadb 导入较慢，首次打开时才导入
+            from langchain_community.vectorstores import Chroma
+            vectorstore = Chroma(
+                collection_name=self._collection_name,
+                persist_directory=str(self._persist_dir),
+                embedding_function=model_manager.embeddings,
+            )
+            logger.info("向量库加载成功")
+            return vectorstore
+        except Exception as e:
+            raise VectorStoreError("向量库加载失败", str(e))
+    
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: List[Document],
+    ) -> None:
+        collection = self.vectorstore._collection
+        for start in range(0, len(documents), _WRITE_BATCH_SIZE):
+            end = start + _WRITE_BATCH_SIZE
+            batch = documents[start:end]
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=[doc.page_content for doc in batch],
+                metadatas=[doc.metadata or None for doc in batch],
+            )
+    
+    def delete(self, ids: List[str]) -> None:
+        for start in range(0, len(ids), _WRITE_BATCH_SIZE):
+            self.vectorstore.delete(ids=ids[start:start + _WRITE_BATCH_SIZE])
+    
+    def clear(self) -> None:
+        self.vectorstore.delete_collection()
+        self._vectorstore = None
+    
+    def search(self, query_vectors: np.ndarray, k: int) -> List[List[Tuple[Document, float]]]:
+        store = self.vectorstore
+        results = store._collection.query(
+            query_embeddings=list(query_vectors),
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+        relevance_fn = store._select_relevance_score_fn()
+        return [
+            [
+                (Document(id=doc_id, page_content=text, metadata=metadata or {}), relevance_fn(distance))
+                for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ]
+            for ids, texts, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+    
+    def get_documents(self, ids: List[str]) -> List[Document]:
+        results = self.vectorstore._collection.get(ids=ids, include=["documents", "metadatas"])
+        found = {
+            doc_id: Document(id=doc_id, page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(
+                results["ids"], results["documents"], results["metadatas"]
+            )
+        }
+        return [found[doc_id] for doc_id in ids if doc_id in found]
+    
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        results = self.vectorstore._collection.get(ids=ids, include=["embeddings"])
+        return {
+            doc_id: np.asarray(vector, dtype=np.float32)
+            for doc_id, vector in zip(results["ids"], results["embeddings"])
+        }
+    
+    def count(self) -> int:
+        return self.vectorstore._collection.count()
+    
+    def warm_up(self) -> None:
+        # Chroma 在首次查询时才加载 HNSW 索引，用库中任一向量查询一次
+        collection = self.vectorstore._collection
+        sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+        if sample is not None and len(sample):
+            collection.query(query_embeddings=[list(sample[0])], n_results=1, include=[])
+    
+    def close(self) -> None:
+        self._vectorstore = None
+
+
+class BackendRetriever(BaseRetriever):
+    """基于 VectorStoreManager 的 LangChain 检索器（非 Chroma 后端使用）"""
+    
+    manager: Any
+    k: int = 5
+    
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+    ) -> List[Document]:
+        vector = self.manager.embed_query(query)
+        return [doc for doc, _ in self.manager.search_by_vector(vector, self.k)]
+
 
 class VectorStoreManager:
     """向量库管理器"""
     
     _instance: Optional["VectorStoreManager"] = None
-    _vectorstore: Optional[Chroma] = None
+    _backends: Dict[str, VectorBackend]
+    _registry: Optional[NovelRegistry] = None
+    _legacy_default: Optional[bool] = None
+    _persist_dir: Optional[Path] = None
+    _version: int = 0
     
     def __new__(cls) -> "VectorStoreManager":
         if cls._instance is None:
             cls._instance = super().__new__(cls)
+            cls._instance._backends = {}
+            cls._instance._lock = threading.Lock()
         return cls._instance
     
     @property
-    def vectorstore(self) -> Chroma:
-        """获取向量库实例（懒加载）"""
-        if self._vectorstore is None:
-            self._load_vectorstore()
-        return self._vectorstore
+    def version(self) -> int:
+        """索引版本号，每次写入、删除或重新加载后递增，供上层缓存判断失效"""
+        return self._version
     
-    def _load_vectorstore(self) -> None:
-        """加载持久化的向量库"""
+    def _bump_version(self) -> None:
+        self._version += 1
+    
+    # ── 分片 ──────────────────────────────────────────────────
+    
+    @property
+    def persist_dir(self) -> Path:
         from config import VECTORSTORE_DIR
-        logger.info(f"加载向量库: {VECTORSTORE_DIR}")
-        try:
-            self._vectorstore = Chroma(
-                persist_directory=str(VECTORSTORE_DIR),
-                embedding_function=model_manager.embeddings,
+        return self._persist_dir or VECTORSTORE_DIR
+    
+    @property
+    def sharded(self) -> bool:
+        """是否按小说分片"""
+        from config import config
+        return config.vectorstore.per_novel
+    
+    @property
+    def registry(self) -> NovelRegistry:
+        """小说分片注册表（懒加载）"""
+        if self._registry is None:
+            self._registry = NovelRegistry(self.persist_dir / "novels.json")
+        return self._registry
+    
+    def shard_of(self, source: Optional[str]) -> str:
+        """
+        来源文件对应的分片名（只读，不注册新来源）
+        
+        未分片或来源未注册时为默认分片：未注册来源的文本块只可能是分片之前写入默认集合的旧数据
+        """
+        if not self.sharded:
+            return DEFAULT_SHARD
+        return self.registry.lookup(source or "") or DEFAULT_SHARD
+    
+    def register_shard(self, source: Optional[str]) -> str:
+        """写入时使用：来源文件对应的分片名，首次写入时注册（未分片时为默认分片）"""
+        if not self.sharded:
+            return DEFAULT_SHARD
+        return self.registry.shard_for(source or "")
+    
+    def shards(self) -> List[str]:
+        """全部分片名；分片存储下默认集合仍有旧数据时包括默认分片"""
+        if not self.sharded:
+            return [DEFAULT_SHARD]
+        shards = self.registry.shards()
+        if self._has_legacy_data():
+            shards.append(DEFAULT_SHARD)
+        return shards
+    
+    def _has_legacy_data(self) -> bool:
+        """
+        按小说分片时，默认集合中是否还有开启分片之前写入的文本块
+        
+        这些数据在重新摄取（布局变化时自动清空重建）之前一并检索，避免升级后查询结果为空；
+        分片存储不再写入默认集合，因此只在删除、清空或重新加载后重新检查
+        """
+        if self._legacy_default is None:
+            try:
+                count = self.backend.count()
+            except Exception as e:
+                raise VectorStoreError("向量库统计失败", str(e))
+            self._legacy_default = count > 0
+            if count:
+                logger.warning(
+                    f"默认集合中有 {count} 个按小说分片之前写入的文本块，检索时一并查询，"
+                    f"但无法按小说限定范围；需要重新摄取以迁移到分片存储"
+                )
+        return self._legacy_default
+    
+    def shards_of_documents(self, documents: Iterable[Document]) -> List[str]:
+        """文档所在的分片（按 metadata["source"]），保持首次出现的顺序"""
+        return list(dict.fromkeys(self.shard_of(doc.metadata.get("source")) for doc in documents))
+    
+    def resolve_scope(self, novels: Union[None, str, Sequence[str]]) -> Optional[List[str]]:
+        """
+        将小说名（标题、文件名或来源路径）解析为分片名列表
+        
+        Returns:
+            分片名列表；未限定范围或未分片时为 None（检索全部）
+        
+        Raises:
+            VectorStoreError: 小说不存在
+        """
+        if not novels or not self.sharded:
+            return None
+        if isinstance(novels, str):
+            novels = [novels]
+        shards = []
+        for name in novels:
+            shard = self.registry.resolve(name)
+            if shard is None:
+                if self._has_legacy_data():
+                    name += "（分片之前写入的小说需要重新摄取后才能限定范围）"
+                raise VectorStoreError("未找到指定的小说", name)
+            shards.append(shard)
+        return shards
+    
+    def novels(self) -> List[NovelEntry]:
+        """已入库的小说列表"""
+        return self.registry.entries() if self.sharded else []
+    
+    def shard_backend(self, shard: str) -> VectorBackend:
+        """获取分片的存储后端（懒加载）"""
+        backend = self._backends.get(shard)
+        if backend is None:
+            with self._lock:
+                backend = self._backends.get(shard)
+                if backend is None:
+                    backend = self._create_backend(self.persist_dir, shard)
+                    self._backends[shard] = backend
+        return backend
+    
+    @property
+    def backend(self) -> VectorBackend:
+        """默认分片的存储后端（未分片时即全部数据）"""
+        return self.shard_backend(DEFAULT_SHARD)
+    
+    def _create_backend(self, persist_dir: Path, shard: str = DEFAULT_SHARD) -> VectorBackend:
+        """按 config.vectorstore.backend 创建分片的存储后端"""
+        from config import config
+        name = config.vectorstore.backend
+        if name == "chroma":
+            return ChromaBackend(persist_dir, collection_name=shard or DEFAULT_COLLECTION)
+        if name == "numpy":
+            from core.numpy_backend import NumpyVectorBackend
+            vs_config = config.vectorstore
+            directory = persist_dir / "numpy_shards" / shard if shard else persist_dir / "numpy"
+            return NumpyVectorBackend(
+                directory,
+                dtype=vs_config.numpy_dtype,
+                index=vs_config.index,
+                nlist=vs_config.ivf_lists,
+                pq_m=vs_config.pq_subspaces,
+                nprobe=vs_config.nprobe,
+                rescore=vs_config.rescore,
+                ann_min_rows=vs_config.ann_min_rows,
+                rebuild_ratio=vs_config.ann_rebuild_ratio,
             )
-            logger.info("向量库加载成功")
-        except Exception as e:
-            raise VectorStoreError("向量库加载失败", str(e))
+        raise VectorStoreError("未知的向量后端", name)
+    
+    def _fanout(self, shards: Sequence[str], fn) -> list:
+        """对多个分片并行执行 fn(backend)，按分片顺序返回结果"""
+        if len(shards) == 1:
+            return [fn(self.shard_backend(shards[0]))]
+        futures = [_fanout_executor.submit(fn, self.shard_backend(shard)) for shard in shards]
+        return [future.result() for future in futures]
+    
+    @property
+    def vectorstore(self) -> "Chroma":
+        """获取默认分片的 Chroma 实例（仅 chroma 后端可用）"""
+        backend = self.backend
+        if not isinstance(backend, ChromaBackend):
+            raise VectorStoreError("当前向量后端不是 Chroma", backend.name)
+        return backend.vectorstore
+    
+    # ── 写入 ──────────────────────────────────────────────────
     
     def create_from_documents(
         self,
         documents: List[Document],
         persist_dir: Optional[Path] = None,
-    ) -> Chroma:
-        """从文档创建向量库"""
-        from config import VECTORSTORE_DIR
-        persist_dir = persist_dir or VECTORSTORE_DIR
+    ) -> VectorBackend:
+        """从文档创建向量库（文档无 ID 时生成随机 ID）"""
         logger.info(f"创建向量库，文档数: {len(documents)}")
+        if persist_dir is not None:
+            self.reset()
+            self._persist_dir = persist_dir
+        ids = [doc.id or uuid.uuid4().hex for doc in documents]
+        self.upsert_documents(documents, ids)
+        logger.info(f"向量库创建成功: {self.backend.name}")
+        return self.backend
+    
+    def upsert_documents(self, documents: List[Document], ids: List[str]) -> None:
+        """按 ID 写入文档（已存在则覆盖）"""
+        if not documents:
+            return
+        logger.info(f"写入向量库，文档数: {len(documents)}")
         try:
-            self._vectorstore = Chroma.from_documents(
-                documents=documents,
-                embedding=model_manager.embeddings,
-                persist_directory=str(persist_dir),
+            embeddings = model_manager.embeddings.embed_documents(
+                [doc.page_content for doc in documents]
             )
-            logger.info(f"向量库创建成功: {persist_dir}")
-            return self._vectorstore
         except Exception as e:
-            raise VectorStoreError("向量库创建失败", str(e))
+            raise VectorStoreError("向量库写入失败", str(e))
+        self.upsert_embeddings(documents, embeddings, ids)
+    
+    def upsert_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        ids: List[str],
+    ) -> None:
+        """按 ID 写入已计算好向量的文档（不再调用 Embedding 模型），按来源写入各自的分片"""
+        if not documents:
+            return
+        groups: Dict[str, List[int]] = {}
+        for i, doc in enumerate(documents):
+            groups.setdefault(self.register_shard(doc.metadata.get("source")), []).append(i)
+        try:
+            for shard, rows in groups.items():
+                self.shard_backend(shard).upsert(
+                    [ids[i] for i in rows],
+                    [embeddings[i] for i in rows],
+                    [documents[i] for i in rows],
+                )
+        except Exception as e:
+            raise VectorStoreError("向量库写入失败", str(e))
+        finally:
+            self._bump_version()
+    
+    def delete_documents(self, ids: List[str], source: Optional[str] = None) -> None:
+        """按 ID 删除文档；给出来源文件时只在其分片中删除"""
+        if not ids:
+            return
+        logger.info(f"从向量库删除 {len(ids)} 个文档")
+        shards = [self.shard_of(source)] if source is not None else self.shards()
+        try:
+            self._fanout(shards, lambda backend: backend.delete(ids))
+        except Exception as e:
+            raise VectorStoreError("向量库删除失败", str(e))
+        finally:
+            if DEFAULT_SHARD in shards:
+                self._legacy_default = None
+            self._bump_version()
+    
+    def drop_novel(self, source: str) -> bool:
+        """删除整部小说的分片（未分片时不做任何事，返回 False）"""
+        if not self.sharded:
+            return False
+        shard = self.registry.remove(source)
+        if shard is None:
+            return False
+        logger.info(f"删除小说分片: {source}")
+        try:
+            backend = self.shard_backend(shard)
+            backend.clear()
+            backend.close()
+            self._backends.pop(shard, None)
+        except Exception as e:
+            raise VectorStoreError("向量库删除失败", str(e))
+        finally:
+            self._bump_version()
+        return True
+    
+    def _stored_shards(self) -> Set[str]:
+        """磁盘上可能有数据的分片：注册表中的分片即使当前未分片也包括在内（切换分片方式时不留旧数据）"""
+        return set(self.registry.shards()) | set(self._backends) | {DEFAULT_SHARD}
+    
+    def stored_count(self) -> int:
+        """全部分片（包括当前布局之外的旧数据）的文本块总数"""
+        try:
+            return sum(self.shard_backend(shard).count() for shard in self._stored_shards())
+        except Exception as e:
+            raise VectorStoreError("向量库统计失败", str(e))
     
-    def get_retriever(self, search_k: Optional[int] = None):
+    def clear(self) -> None:
+        """清空向量库（全部分片）"""
+        logger.info("清空向量库")
+        try:
+            for shard in self._stored_shards():
+                self.shard_backend(shard).clear()
+            self.registry.clear()
+        except Exception as e:
+            raise VectorStoreError("向量库清空失败", str(e))
+        finally:
+            self._legacy_default = None
+        self._bump_version()
+    
+    def build_index(self, force: bool = False) -> None:
+        """按需构建各分片的近似检索索引（摄取结束时调用）"""
+        try:
+            rebuilt = self._fanout(self.shards(), lambda backend: backend.build_index(force=force))
+        except Exception as e:
+            raise VectorStoreError("索引构建失败", str(e))
+        if any(rebuilt):
+            self._bump_version()
+    
+    def warm_up(self) -> int:
+        """打开全部分片并将索引读入内存（启动预热），返回分片数"""
+        shards = self.shards()
+        try:
+            self._fanout(shards, lambda backend: backend.warm_up())
+        except Exception as e:
+            raise VectorStoreError("向量库预热失败", str(e))
+        return len(shards)
+    
+    # ── 检索 ──────────────────────────────────────────────────
+    
+    def get_retriever(self, search_k: Optional[int] = None) -> BaseRetriever:
         """获取检索器"""
         from config import config
         k = search_k or config.retrieval.search_k
-        return self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": k},
-        )
+        if isinstance(self.backend, ChromaBackend) and not self.sharded:
+            return self.vectorstore.as_retriever(
+                search_type="similarity",
+                search_kwargs={"k": k},
+            )
+        return BackendRetriever(manager=self, k=k)
+    
+    def embed_query(self, question: str) -> np.ndarray:
+        """计算查询向量（float32 数组）"""
+        return model_manager.embed_query(question)
+    
+    async def aembed_query(self, question: str) -> np.ndarray:
+        """异步计算查询向量"""
+        return await model_manager.aembed_query(question)
+    
+    def search_by_vector(
+        self,
+        query_vector: Sequence[float],
+        k: int,
+        shards: Optional[Sequence[str]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        按查询向量检索
+        
+        Args:
+            query_vector: 查询向量
+            k: 返回的文档数量
+            shards: 检索的分片，None 表示全部
+            
+        Returns:
+            (文档, 相关性分数) 列表，分数越高越相关；文档 id 为文本块 ID
+        """
+        return self.search_by_vectors([query_vector], k, shards)[0]
+    
+    def search_by_vectors(
+        self,
+        query_vectors: Sequence[Sequence[float]],
+        k: int,
+        shards: Optional[Sequence[str]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """批量按查询向量检索，每个查询返回一个结果列表；多个分片并行检索后合并 top-k"""
+        shards = self.shards() if shards is None else list(shards)
+        if not shards:
+            return [[] for _ in query_vectors]
+        try:
+            matrix = np.asarray(query_vectors, dtype=np.float32)
+            matrix = matrix.reshape(len(matrix), -1)
+            per_shard = self._fanout(shards, lambda backend: backend.search(matrix, k))
+        except Exception as e:
+            raise VectorStoreError("向量检索失败", str(e))
+        if len(per_shard) == 1:
+            return per_shard[0]
+        return [
+            heapq.nlargest(k, (hit for results in per_shard for hit in results[q]), key=lambda hit: hit[1])
+            for q in range(len(matrix))
+        ]
+    
+    def get_documents(self, ids: List[str], shards: Optional[Sequence[str]] = None) -> List[Document]:
+        """按 ID 读取文档（忽略不存在的 ID，保持输入顺序）"""
+        if not ids:
+            return []
+        shards = self.shards() if shards is None else list(shards)
+        try:
+            per_shard = self._fanout(shards, lambda backend: backend.get_documents(ids))
+        except Exception as e:
+            raise VectorStoreError("文档读取失败", str(e))
+        if len(per_shard) == 1:
+            return per_shard[0]
+        found = {doc.id: doc for docs in per_shard for doc in docs}
+        return [found[doc_id] for doc_id in ids if doc_id in found]
+    
+    def get_embeddings(
+        self,
+        ids: List[str],
+        shards: Optional[Sequence[str]] = None,
+    ) -> Optional[np.ndarray]:
+        """按 ID 读取文档向量，按输入顺序返回矩阵；有 ID 缺失时返回 None"""
+        if not ids:
+            return None
+        shards = self.shards() if shards is None else list(shards)
+        try:
+            per_shard = self._fanout(shards, lambda backend: backend.get_vectors(ids))
+        except Exception as e:
+            raise VectorStoreError("向量读取失败", str(e))
+        vectors = {doc_id: vector for found in per_shard for doc_id, vector in found.items()}
+        if any(doc_id not in vectors for doc_id in ids):
+            return None
+        return np.stack([vectors[doc_id] for doc_id in ids]).astype(np.float32, copy=False)
     
     def reset(self) -> None:
         """重置向量库实例"""
         logger.info("重置向量库实例")
-        self._vectorstore = None
+        for backend in self._backends.values():
+            backend.close()
+        self._backends = {}
+        self._registry = None
+        self._legacy_default = None
+        self._persist_dir = None
+        self._bump_version()
 
 
 # 全局向量库管理器实例
@@ -11,10 +11,10 @@ from services.ingest_service import ingest as do_ingest
 from utils.exceptions import NovelRAGError
 
 
-def ingest(data_dir: Path = DATA_DIR):
-    """执行摄取（兼容原有接口）"""
+def ingest(data_dir: Path = DATA_DIR, full: bool = False):
+    """执行摄取（兼容原有接口），默认只处理新增或变更的文件"""
     try:
-        chunk_count = do_ingest(data_dir)
+        chunk_count = do_ingest(data_dir, full=full)
         print(f"🎉 摄取完成！共 {chunk_count} 个文本块")
     except NovelRAGError as e:
         print(f"❌ {e}")
@@ -23,6 +23,6 @@ def ingest(data_dir: Path = DATA_DIR):
 
 if __name__ == "__main__":
     try:
-        ingest()
+        ingest(full="--full" in sys.argv[1:])
     except NovelRAGError:
         sys.exit(1)
@@ -1,13 +1,35 @@
 """服务层模块"""
 from services.ingest_service import IngestService, ingest
-from services.qa_service import QAService, qa_service, ask, reload_chain, QAResponse
+from services.ingest_jobs import IngestJob, IngestJobManager, ingest_jobs, submit_ingest
+from services.qa_service import (
+    QAService,
+    qa_service,
+    ask,
+    ask_stream,
+    aask,
+    aask_stream,
+    reload_chain,
+    QAResponse,
+    QAStreamEvent,
+)
+from services.warmup import warm_up, start_warmup
 
 __all__ = [
     "IngestService",
     "ingest",
+    "IngestJob",
+    "IngestJobManager",
+    "ingest_jobs",
+    "submit_ingest",
     "QAService",
     "qa_service",
     "ask",
+    "ask_stream",
+    "aask",
+    "aask_stream",
     "reload_chain",
     "QAResponse",
+    "QAStreamEvent",
+    "warm_up",
+    "start_warmup",
 ]
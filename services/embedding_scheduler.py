@@ -0,0 +1,262 @@
+"""
+Embedding 调度模块
+
+将文本分批并发送往 Embedding 接口：
+- 可配置批大小与并发数（线程池）
+- 令牌桶限制请求速率，避免触发配额
+- 配额类错误（429 / ResourceExhausted）按带抖动的指数退避重试
+- 每批完成即回调写入向量库，并统计吞吐量与错误数
+- 可传入取消事件：被设置后不再提交新批次、中断退避等待，不等待在途请求结束
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from utils.logger import get_logger
+from utils.exceptions import IngestError, IngestCancelledError
+
+logger = get_logger("novel_rag.embedding_scheduler")
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+BatchCallback = Callable[[int, List[str], List[List[float]]], None]
+
+# 有取消事件时，等待批次完成的同时按该间隔检查是否已取消（秒）
+_CANCEL_POLL = 0.2
+
+_QUOTA_MARKERS = ("429", "resourceexhausted", "resource_exhausted", "quota", "rate limit", "ratelimit")
+
+
+def is_quota_error(error: Exception) -> bool:
+    """判断是否为可重试的配额/限流错误"""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _QUOTA_MARKERS)
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器"""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            rate: 每秒补充的令牌数（<= 0 表示不限流）
+            capacity: 桶容量，默认等于 rate（允许约 1 秒的突发）
+        """
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self._capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """取出令牌，不足时阻塞等待"""
+        if self._rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_time = (tokens - self._tokens) / self._rate
+            self._sleep(wait_time)
+
+
+@dataclass
+class SchedulerStats:
+    """调度统计"""
+    texts: int = 0
+    batches: int = 0
+    retries: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """每秒处理的文本数"""
+        return self.texts / self.elapsed if self.elapsed > 0 else 0.0
+
+    def merge(self, other: "SchedulerStats") -> None:
+        """累加另一次运行的统计"""
+        self.texts += other.texts
+        self.batches += other.batches
+        self.retries += other.retries
+        self.errors += other.errors
+        self.elapsed += other.elapsed
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "texts": self.texts,
+            "batches": self.batches,
+            "retries": self.retries,
+            "errors": self.errors,
+            "elapsed": round(self.elapsed, 3),
+            "throughput": round(self.throughput, 2),
+        }
+
+
+class EmbeddingScheduler:
+    """
+    并发批量 Embedding 调度器
+
+    Embedding 调用在线程池中并发执行；完成回调始终在调用 run 的线程中执行，
+    因此向量库写入无需额外加锁
+    """
+
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        batch_size: int = 100,
+        max_concurrency: int = 4,
+        requests_per_minute: float = 0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        sleep: Callable[[float], None] = time.sleep,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        """
+        初始化调度器
+
+        Args:
+            embed_fn: 批量 Embedding 函数（如 embeddings.embed_documents）
+            batch_size: 每次请求的文本数
+            max_concurrency: 同时进行的请求数
+            requests_per_minute: 每分钟请求上限，0 表示不限
+            max_retries: 配额错误的最大重试次数
+            backoff_base: 退避基数（秒）
+            backoff_max: 单次退避上限（秒）
+            sleep: 限流等待函数（便于注入）
+            cancel_event: 被设置后 run 抛出 IngestCancelledError
+        """
+        self._embed_fn = embed_fn
+        self._batch_size = max(1, batch_size)
+        self._max_concurrency = max(1, max_concurrency)
+        self._bucket = TokenBucket(requests_per_minute / 60.0, sleep=sleep)
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._cancel_event = cancel_event
+        self._abort = threading.Event()  # 本次运行中止（失败或取消）时设置，打断退避等待
+        self._stats_lock = threading.Lock()
+        self.stats = SchedulerStats()
+
+    def run(self, texts: List[str], on_batch: Optional[BatchCallback] = None) -> SchedulerStats:
+        """
+        对文本执行 Embedding
+
+        Args:
+            texts: 待计算的文本
+            on_batch: 每批完成时的回调 (起始下标, 文本, 向量)
+
+        Returns:
+            本次运行的统计信息
+
+        Raises:
+            IngestError: 某批在重试后仍然失败
+            IngestCancelledError: 取消事件被设置
+        """
+        self.stats = SchedulerStats()
+        self._abort = threading.Event()
+        started = time.perf_counter()
+        starts = iter(range(0, len(texts), self._batch_size))
+        pending: Dict[Future, int] = {}
+        timeout = _CANCEL_POLL if self._cancel_event is not None else None
+
+        executor = ThreadPoolExecutor(max_workers=self._max_concurrency)
+        try:
+            def submit_next() -> bool:
+                start = next(starts, None)
+                if start is None:
+                    return False
+                batch = texts[start:start + self._batch_size]
+                pending[executor.submit(self._embed_with_retry, batch)] = start
+                return True
+
+            # 在途批次数量受并发数限制，避免一次性提交全部任务
+            for _ in range(self._max_concurrency):
+                if not submit_next():
+                    break
+
+            while pending:
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if self._cancel_event is not None and self._cancel_event.is_set():
+                    raise IngestCancelledError("摄取已取消")
+                for future in done:
+                    start = pending.pop(future)
+                    batch = texts[start:start + self._batch_size]
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        raise IngestError("Embedding 计算失败", str(e))
+                    if on_batch:
+                        on_batch(start, batch, vectors)
+                    self.stats.texts += len(batch)
+                    self.stats.batches += 1
+                    submit_next()
+        except BaseException:
+            # 失败或取消（含 on_batch 抛出的异常）时不等待在途批次：取消排队的批次，打断退避等待
+            self._abort.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.stats.elapsed = time.perf_counter() - started
+            raise
+        executor.shutdown()
+
+        self.stats.elapsed = time.perf_counter() - started
+        logger.info(
+            f"Embedding 完成: {self.stats.texts} 条, {self.stats.batches} 批, "
+            f"重试 {self.stats.retries}, 错误 {self.stats.errors}, "
+            f"{self.stats.throughput:.1f} 条/秒"
+        )
+        return self.stats
+
+    def _embed_with_retry(self, batch: List[str]) -> List[List[float]]:
+        """带限流与重试的单批 Embedding"""
+        attempt = 0
+        while True:
+            self._bucket.acquire()
+            try:
+                return self._embed_fn(batch)
+            except Exception as e:
+                with self._stats_lock:
+                    self.stats.errors += 1
+                if not is_quota_error(e) or attempt >= self._max_retries:
+                    raise
+                # Full jitter：在 [0, base * 2^attempt] 内随机等待
+                delay = random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+                attempt += 1
+                with self._stats_lock:
+                    self.stats.retries += 1
+                logger.warning(f"Embedding 触发限流，{delay:.1f}s 后第 {attempt} 次重试: {e}")
+                if self._abort.wait(delay):
+                    raise IngestCancelledError("Embedding 已中止")
+
+
+def create_embedding_scheduler(
+    embed_fn: EmbedFn, cancel_event: Optional[threading.Event] = None
+) -> EmbeddingScheduler:
+    """工厂函数：按配置创建调度器"""
+    from config import config
+    cfg = config.embedding_scheduler
+    return EmbeddingScheduler(
+        embed_fn=embed_fn,
+        batch_size=cfg.batch_size,
+        max_concurrency=cfg.max_concurrency,
+        requests_per_minute=cfg.requests_per_minute,
+        max_retries=cfg.max_retries,
+        backoff_base=cfg.backoff_base,
+        backoff_max=cfg.backoff_max,
+        cancel_event=cancel_event,
+    )
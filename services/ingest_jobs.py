@@ -0,0 +1,249 @@
+"""
+后台摄取任务模块
+
+摄取以任务形式提交到后台工作线程执行，提交方立即得到任务 ID：
+- 任务状态与分阶段进度（文件、已分块、已向量化的文本块）可随时查询，并持久化到向量库目录
+- 排队中的任务直接取消；运行中的任务在下一个文件、窗口或批次之间停止，已写入部分有检查点
+- 向量库与摄取清单只有一个写入者，任务按提交顺序逐个执行
+- 摄取直接写入正在服务的向量库与稀疏索引，问答期间无需重新加载；
+  写入会更新向量库版本，回答缓存随之失效
+"""
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from services.ingest_service import IngestProgress, IngestService
+from utils.logger import get_logger
+from utils.metrics import metrics
+from utils.exceptions import IngestCancelledError
+
+logger = get_logger("novel_rag.ingest_jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# 运行中的任务每隔该秒数持久化一次进度
+_SAVE_INTERVAL = 1.0
+
+
+@dataclass
+class IngestJob:
+    """摄取任务"""
+    id: str
+    data_dir: str
+    full: bool = False
+    files: List[str] = field(default_factory=list)  # 本次提交附带的文件名（仅用于展示）
+    status: str = QUEUED
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    chunks: int = 0  # 本次写入的文本块数
+    error: str = ""
+    progress: IngestProgress = field(default_factory=IngestProgress)
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self) -> float:
+        """已运行的秒数"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IngestJob":
+        data = dict(data)
+        progress = IngestProgress(**data.pop("progress", {}))
+        return cls(progress=progress, **data)
+
+
+class IngestJobManager:
+    """摄取任务管理器 - 单例模式，单个工作线程按提交顺序执行任务"""
+
+    _instance: Optional["IngestJobManager"] = None
+
+    def __new__(cls) -> "IngestJobManager":
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._lock = threading.RLock()
+            cls._instance._jobs = {}
+            cls._instance._futures = {}
+            cls._instance._cancel_events = {}
+            cls._instance._executor = None
+            cls._instance._loaded_from = None
+        return cls._instance
+
+    @property
+    def state_path(self) -> Path:
+        """任务状态文件"""
+        from config import VECTORSTORE_DIR
+        return VECTORSTORE_DIR / "ingest_jobs.json"
+
+    def _ensure_loaded(self) -> None:
+        """首次使用（或向量库目录变化）时读取持久化的任务，上次进程退出时未结束的任务记为失败"""
+        path = self.state_path
+        if self._loaded_from == path:
+            return
+        self._loaded_from = path
+        self._jobs = {}
+        if not path.exists():
+            return
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            jobs = [IngestJob.from_dict(item) for item in data.get("jobs", [])]
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"摄取任务状态读取失败，已忽略: {e}")
+            return
+        for job in jobs:
+            if not job.done:
+                job.status = FAILED
+                job.error = "进程退出时任务未完成，重新提交后从检查点继续"
+                job.finished = job.finished or time.time()
+            self._jobs[job.id] = job
+
+    def _save(self) -> None:
+        """原子写入全部任务状态"""
+        with self._lock:
+            data = {"jobs": [job.to_dict() for job in self._jobs.values()]}
+        path = self.state_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def _trim(self) -> None:
+        """只保留最近的若干个已结束任务"""
+        from config import config
+        finished = sorted((job for job in self._jobs.values() if job.done), key=lambda job: job.created)
+        for job in finished[:max(0, len(finished) - config.ingest.job_history)]:
+            del self._jobs[job.id]
+
+    def submit(self, data_dir: Path, full: bool = False, files: Sequence[str] = ()) -> IngestJob:
+        """
+        提交摄取任务
+
+        Args:
+            data_dir: 小说文件目录
+            full: 为 True 时忽略清单，重新摄取全部文件
+            files: 本次上传的文件名（仅用于展示）
+        """
+        with self._lock:
+            self._ensure_loaded()
+            job = IngestJob(id=uuid.uuid4().hex[:12], data_dir=str(data_dir), full=full, files=list(files))
+            self._jobs[job.id] = job
+            self._cancel_events[job.id] = threading.Event()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-job")
+            self._futures[job.id] = self._executor.submit(self._run, job)
+            self._trim()
+        self._save()
+        logger.info(f"提交摄取任务 {job.id}: {data_dir}" + (f", 文件: {', '.join(job.files)}" if job.files else ""))
+        return job
+
+    def _run(self, job: IngestJob) -> None:
+        cancel_event = self._cancel_events[job.id]
+        with self._lock:
+            if cancel_event.is_set():
+                self._finish(job, CANCELLED)
+                return
+            job.status = RUNNING
+            job.started = time.time()
+        self._save()
+        logger.info(f"开始执行摄取任务 {job.id}")
+
+        stop_saving = threading.Event()
+        saver = threading.Thread(
+            target=self._save_periodically, args=(stop_saving,), name=f"ingest-job-save-{job.id}", daemon=True
+        )
+        saver.start()
+        service = IngestService(Path(job.data_dir), progress=job.progress, cancel_event=cancel_event)
+        status, error = SUCCEEDED, ""
+        try:
+            job.chunks = service.ingest(full=job.full)
+        except IngestCancelledError:
+            status = CANCELLED
+        except Exception as e:
+            status, error = FAILED, str(e)
+            logger.error(f"摄取任务 {job.id} 失败: {e}")
+        finally:
+            stop_saving.set()
+            saver.join()
+        with self._lock:
+            job.error = error
+            self._finish(job, status)
+
+    def _finish(self, job: IngestJob, status: str) -> None:
+        job.status = status
+        job.finished = time.time()
+        self._futures.pop(job.id, None)
+        self._cancel_events.pop(job.id, None)
+        self._save()
+        metrics.count("ingest_jobs_total", "结束的摄取任务数", status=status)
+        logger.info(f"摄取任务 {job.id} 结束: {status}, 写入 {job.chunks} 个文本块, 耗时 {job.elapsed:.1f}s")
+
+    def _save_periodically(self, stop: threading.Event) -> None:
+        while not stop.wait(_SAVE_INTERVAL):
+            self._save()
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消任务：排队中的立即取消，运行中的在下一个文件、窗口或批次之间停止
+
+        Returns:
+            任务存在且尚未结束时为 True
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            self._cancel_events[job_id].set()
+            if job.status == QUEUED and self._futures[job_id].cancel():
+                self._finish(job, CANCELLED)
+        logger.info(f"请求取消摄取任务 {job_id}")
+        return True
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[IngestJob]:
+        """全部任务，最近提交的在前"""
+        with self._lock:
+            self._ensure_loaded()
+            return sorted(self._jobs.values(), key=lambda job: job.created, reverse=True)
+
+    def active(self) -> List[IngestJob]:
+        """排队中与运行中的任务"""
+        return [job for job in self.jobs() if not job.done]
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[IngestJob]:
+        """等待任务结束（超时抛出 concurrent.futures.TimeoutError），返回任务"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and not future.cancelled():
+            future.result(timeout=timeout)
+        return self.get(job_id)
+
+
+# 全局摄取任务管理器实例
+ingest_jobs = IngestJobManager()
+
+
+def submit_ingest(data_dir: Path, full: bool = False, files: Sequence[str] = ()) -> IngestJob:
+    """便捷函数：提交后台摄取任务"""
+    return ingest_jobs.submit(data_dir, full=full, files=files)
@@ -0,0 +1,153 @@
+"""
+流式摄取流水线
+
+以生成器串联「读取 → 分块 → 分窗」各阶段，内存占用与语料大小无关：
+- read_blocks: 按固定字符数增量读取文件
+- stream_split: 在滑动缓冲区上分块，只保留尾部未定型的文本
+- batched: 将文本块按固定窗口大小分组
+- prefetch: 在后台线程预取上游结果，有界队列提供背压
+"""
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+from langchain_core.documents import Document
+
+T = TypeVar("T")
+
+SplitFn = Callable[[str], List[Document]]
+
+
+def read_blocks(path: Path, block_chars: Optional[int] = 65536, encoding: str = "utf-8") -> Iterator[str]:
+    """
+    增量读取文本文件
+
+    Args:
+        path: 文件路径
+        block_chars: 每块字符数，None 表示一次读入全部
+        encoding: 文件编码
+    """
+    with open(path, "r", encoding=encoding) as f:
+        if block_chars is None:
+            yield f.read()
+            return
+        for block in iter(lambda: f.read(block_chars), ""):
+            yield block
+
+
+def stream_split(
+    blocks: Iterable[str],
+    split_fn: SplitFn,
+    source: str,
+    min_buffer_chars: int,
+    tail_chars: int,
+) -> Iterator[Document]:
+    """
+    对连续文本块流式分块
+
+    缓冲区达到 min_buffer_chars 后整体切分，距离缓冲区末尾 tail_chars 以内的
+    文本块可能因后续文本而改变，留待下一轮；其余文本块连同在文件中的
+    绝对偏移（metadata["start_index"]）依次输出
+
+    Args:
+        blocks: 文本块迭代器
+        split_fn: 分块函数，返回的文档需带有相对 start_index
+        source: 来源路径，写入 metadata["source"]
+        min_buffer_chars: 触发切分的缓冲区长度
+        tail_chars: 保留的尾部长度（通常为 chunk_size）
+    """
+    buffer = ""
+    base = 0
+    for block in blocks:
+        buffer += block
+        if len(buffer) < min_buffer_chars:
+            continue
+        chunks = split_fn(buffer)
+        stable_end = len(buffer) - tail_chars
+        cut = None
+        for chunk in chunks:
+            start = chunk.metadata["start_index"]
+            if start + len(chunk.page_content) > stable_end:
+                cut = start
+                break
+            yield _with_offset(chunk, source, base)
+        if cut is None:
+            cut = len(buffer)
+        buffer = buffer[cut:]
+        base += cut
+
+    if buffer:
+        for chunk in split_fn(buffer):
+            yield _with_offset(chunk, source, base)
+
+
+def _with_offset(chunk: Document, source: str, base: int) -> Document:
+    chunk.metadata["source"] = source
+    chunk.metadata["start_index"] = base + chunk.metadata["start_index"]
+    return chunk
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """按固定大小分组"""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_DONE = object()
+
+
+def prefetch(items: Iterable[T], maxsize: int = 2) -> Iterator[T]:
+    """
+    在后台线程中提前生成上游元素
+
+    队列满时生产者阻塞（背压），下游消费时上游可并行推进；
+    上游异常会在消费端重新抛出。消费端提前结束（关闭本生成器、异常或取消）时
+    通知生产者停止，并等待其关闭上游迭代器（释放打开的文件等资源）
+    """
+    iterator = iter(items)
+    buffer: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+        finally:
+            # 上游生成器只能在执行它的线程中关闭
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    worker = threading.Thread(target=produce, name="ingest-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
@@ -2,44 +2,153 @@
 文档摄取服务
 
 处理小说文档的加载、分块和向量化
+
+基于摄取清单增量处理：仅新增或变更的文件会被重新分块与向量化，
+文本块使用确定性 ID 写入向量库，已删除文件的文本块同步删除；
+单个文件按窗口流式处理，内存占用与文件大小无关，中断后可从检查点继续；
+摄取进度按阶段记录在 IngestProgress 中，可在文件、窗口与批次之间取消
 """
+import hashlib
+import sys
+import threading
+import time
+from contextlib import closing
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Set
 
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+from core.models import model_manager
+from core.splitter import ChineseNovelSplitter
 from core.vectorstore import vectorstore_manager
+from core.sparse_index import sparse_index_manager
+from core.tokens import get_token_counter
+from services.embedding_scheduler import SchedulerStats, create_embedding_scheduler
+from services.ingest_pipeline import batched, prefetch, read_blocks, stream_split
+from services.manifest import IngestManifest, file_sha256
 from utils.logger import get_logger
-from utils.exceptions import IngestError, ConfigurationError
+from utils.metrics import metrics
+from utils.exceptions import IngestError, IngestCancelledError, ConfigurationError
 
 logger = get_logger("novel_rag.ingest")
 
 
+def make_chunk_id(source: str, start_index: int, text: str) -> str:
+    """由来源、起始偏移和内容哈希生成确定性文本块 ID"""
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha1(f"{source}|{start_index}|{content_hash}".encode("utf-8")).hexdigest()
+
+
+def storage_layout() -> str:
+    """当前存储布局：向量后端名，按小说分片时加 /novel 后缀"""
+    from config import config
+    layout = config.vectorstore.backend
+    if config.vectorstore.per_novel:
+        layout += "/novel"
+    return layout
+
+
+@dataclass
+class IngestProgress:
+    """摄取进度：由摄取线程更新，其他线程只读"""
+    stage: str = "pending"  # pending | scanning | ingesting | indexing | done
+    files_total: int = 0  # 本次需要摄取的文件数（新增与变更）
+    files_done: int = 0
+    current_file: str = ""
+    chunks_split: int = 0  # 已分块的文本块数
+    chunks_embedded: int = 0  # 已向量化并写入的文本块数（含从检查点跳过的）
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
 class IngestService:
     """文档摄取服务"""
     
-    def __init__(self, data_dir: Path):
+    def __init__(
+        self,
+        data_dir: Path,
+        manifest_path: Optional[Path] = None,
+        progress: Optional[IngestProgress] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        """
+        Args:
+            data_dir: 小说文件目录
+            manifest_path: 摄取清单路径，默认在向量库目录下
+            progress: 写入进度的对象（供其他线程查询），默认新建
+            cancel_event: 被设置后在下一个文件、窗口或批次之间抛出 IngestCancelledError
+        """
+        from config import VECTORSTORE_DIR, config
         self.data_dir = data_dir
+        self.progress = progress or IngestProgress()
+        self._cancel_event = cancel_event
+        signature = config.chunking_signature
+        layout = storage_layout()
+        if layout != "chroma":
+            # 各后端、分片方式的数据互不相通，切换后需要重新摄取
+            signature = f"{signature}@{layout}"
+        self.manifest = IngestManifest(
+            manifest_path or VECTORSTORE_DIR / "manifest.json",
+            signature=signature,
+        )
+        self.embedding_stats = SchedulerStats()
     
-    def ingest(self) -> int:
+    def ingest(self, full: bool = False) -> int:
         """
-        执行完整的摄取流程
+        执行增量摄取流程
+        
+        Args:
+            full: 为 True 时忽略清单，重新摄取全部文件
         
         Returns:
-            摄取的文本块数量
+            本次写入的文本块数量
         """
         self._validate()
         
         logger.info(f"开始摄取: {self.data_dir}")
+        started = time.perf_counter()
+        self.progress.stage = "scanning"
         
-        docs = self._load_documents()
-        chunks = self._split_documents(docs)
-        vectorstore_manager.create_from_documents(chunks)
+        if full or self._layout_changed() or self._has_untracked_data():
+            self._drop_all()
+        else:
+            with metrics.track("ingest", "sync_sparse"):
+                self._sync_sparse_index()
         
-        logger.info(f"摄取完成: {len(chunks)} 个文本块")
-        return len(chunks)
+        diff = self.manifest.diff(self._list_files())
+        logger.info(
+            f"文件变更: 新增 {len(diff.added)}, 变更 {len(diff.changed)}, "
+            f"删除 {len(diff.removed)}, 未变 {len(diff.unchanged)}"
+        )
+        
+        for key in diff.removed:
+            self._remove_file(key)
+        
+        self.embedding_stats = SchedulerStats()
+        self.progress.files_total = len(diff.added) + len(diff.changed)
+        self.progress.stage = "ingesting"
+        total = 0
+        try:
+            for path in diff.added + diff.changed:
+                self._check_cancelled()
+                with metrics.track("ingest", "file"):
+                    total += self._ingest_file(path)
+                self.progress.files_done += 1
+                metrics.count("ingest_files_total", "摄取的文件数")
+        finally:
+            with metrics.track("ingest", "sparse_save"):
+                sparse_index_manager.save()
+        
+        self.progress.stage = "indexing"
+        with metrics.track("ingest", "build_index"):
+            vectorstore_manager.build_index()
+        self.manifest.save()
+        self.progress.stage = "done"
+        metrics.observe_stage("ingest", "run", time.perf_counter() - started)
+        logger.info(f"摄取完成: {total} 个文本块, Embedding 统计: {self.embedding_stats.to_dict()}")
+        return total
     
     def _validate(self) -> None:
         """验证摄取条件"""
@@ -47,42 +156,192 @@ class IngestService:
         if not config.is_configured:
             raise ConfigurationError("API 密钥未配置", "请设置环境变量 GOOGLE_API_KEY")
         
-        txt_files = list(self.data_dir.glob("**/*.txt"))
+        txt_files = self._list_files()
         if not txt_files:
             raise IngestError("未找到文档", f"在 {self.data_dir} 中未找到 .txt 文件")
     
-    def _load_documents(self) -> List[Document]:
-        """加载文档"""
-        logger.info(f"加载文档: {self.data_dir}")
-        try:
-            loader = DirectoryLoader(
-                str(self.data_dir),
-                glob="**/*.txt",
-                loader_cls=TextLoader,
-                loader_kwargs={"encoding": "utf-8"},
-                show_progress=True,
-            )
-            docs = loader.load()
-            logger.info(f"加载了 {len(docs)} 个文档")
-            return docs
-        except Exception as e:
-            raise IngestError("文档加载失败", str(e))
+    def _check_cancelled(self) -> None:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            # 已写入的窗口有检查点，重新摄取时从中断处继续
+            raise IngestCancelledError("摄取已取消", self.progress.current_file)
+    
+    def _list_files(self) -> List[Path]:
+        """列出待摄取的 .txt 文件"""
+        return sorted(self.data_dir.glob("**/*.txt"))
+    
+    def _layout_changed(self) -> bool:
+        """存储布局（后端、是否按小说分片）与清单记录的不一致时，旧数据无法按文件增量删除"""
+        stored = self.manifest.stored_signature
+        stored_layout = stored.rpartition("@")[2] if "@" in stored else "chroma"
+        changed = bool(self.manifest.files) and stored_layout != storage_layout()
+        if changed:
+            logger.info(f"存储布局已变化: {stored_layout} → {storage_layout()}，清空后重新摄取")
+        return changed
+    
+    def _has_untracked_data(self) -> bool:
+        """清单为空而向量库非空：升级前（无清单）写入的随机 ID 文本块无法按文件增量删除"""
+        if self.manifest.files:
+            return False
+        stored = vectorstore_manager.stored_count()
+        if stored:
+            logger.info(f"向量库中有 {stored} 个不在摄取清单中的文本块，清空后重新摄取")
+        return stored > 0
+    
+    def _drop_all(self) -> None:
+        """清空向量库与清单（包括清单之前遗留的无 ID 数据）"""
+        vectorstore_manager.clear()
+        sparse_index_manager.clear()
+        self.manifest.clear()
     
-    def _split_documents(self, docs: List[Document]) -> List[Document]:
-        """分割文档"""
+    def _remove_file(self, key: str) -> None:
+        """删除已不存在的文件：分片存储时直接删除整个分片，否则逐个删除文本块"""
+        ids = self.manifest.remove(key)
+        shard = vectorstore_manager.shard_of(key)
+        if vectorstore_manager.drop_novel(key):
+            sparse_index_manager.drop(shard)
+        else:
+            self._delete_chunks(ids, key)
+    
+    def _delete_chunks(self, ids: List[str], source: str) -> None:
+        """从来源文件所在分片的向量库和稀疏索引中删除文本块"""
+        vectorstore_manager.delete_documents(ids, source)
+        sparse_index_manager.shard(vectorstore_manager.shard_of(source)).remove(ids)
+    
+    def _sync_sparse_index(self) -> None:
+        """
+        使稀疏索引与清单一致
+        
+        稀疏索引在每次摄取结束时才落盘，进程中断可能使两者不一致；
+        按分片比对，缺失的文本块从向量库读取原文补入，多余的删除
+        """
         from config import config
-        logger.info("分割文档")
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.chunk.chunk_size,
-            chunk_overlap=config.chunk.chunk_overlap,
-            separators=list(config.chunk.separators),
-        )
-        chunks = splitter.split_documents(docs)
-        logger.info(f"分割为 {len(chunks)} 个文本块")
-        return chunks
+        if not config.retrieval.hybrid:
+            return
+        expected: Dict[str, Set[str]] = {shard: set() for shard in vectorstore_manager.shards()}
+        for key, record in self.manifest.files.items():
+            expected.setdefault(vectorstore_manager.shard_of(key), set()).update(record.chunk_ids)
+        for shard, shard_expected in expected.items():
+            index = sparse_index_manager.shard(shard)
+            indexed = index.chunk_ids()
+            extra = list(indexed - shard_expected)
+            missing = list(shard_expected - indexed)
+            if not extra and not missing:
+                continue
+            logger.info(f"同步稀疏索引 {shard or '默认分片'}: 补入 {len(missing)}, 删除 {len(extra)}")
+            index.remove(extra)
+            for start in range(0, len(missing), 1000):
+                docs = vectorstore_manager.get_documents(missing[start:start + 1000], [shard])
+                index.add([doc.id for doc in docs], [doc.page_content for doc in docs])
+        sparse_index_manager.save()
+    
+    def _ingest_file(self, path: Path) -> int:
+        """
+        流式摄取单个文件：读取 → 分块 → 按窗口向量化并写入
+        
+        每个窗口写入后记录检查点，中断后重跑会跳过已写入的文本块；
+        文件完成后删除该文件不再存在的旧文本块
+        """
+        from config import config
+        key = str(path)
+        sha256 = file_sha256(path)
+        resume_from = self.manifest.load_checkpoint(key, sha256)
+        if resume_from:
+            logger.info(f"从检查点继续: {path.name}, 已完成 {resume_from} 个文本块")
+        self.progress.current_file = path.name
+        
+        window_size = config.ingest.window_chunks if config.ingest.streaming else sys.maxsize
+        chunks = metrics.timed_iter(self._iter_chunks(path), "ingest", "read_split")
+        sparse_index = sparse_index_manager.shard(vectorstore_manager.register_shard(key))
+        chunk_ids: List[str] = []
+        # 提前结束（失败或取消）时立即停止预取线程并关闭文件
+        with closing(prefetch(batched(chunks, window_size), maxsize=config.ingest.prefetch_windows)) as windows:
+            for window in windows:
+                self._check_cancelled()
+                self.progress.chunks_split += len(window)
+                ids = [
+                    make_chunk_id(key, chunk.metadata.get("start_index", -1), chunk.page_content)
+                    for chunk in window
+                ]
+                skip = min(len(window), max(0, resume_from - len(chunk_ids)))
+                chunk_ids.extend(ids)
+                if config.retrieval.hybrid:
+                    with metrics.track("ingest", "sparse_add"):
+                        sparse_index.add(ids, [chunk.page_content for chunk in window])
+                self.progress.chunks_embedded += skip
+                if skip < len(window):
+                    self._embed_and_store(window[skip:], ids[skip:])
+                    self.manifest.save_checkpoint(key, sha256, len(chunk_ids))
+        
+        stale = set(self.manifest.remove(key)).difference(chunk_ids)
+        self._delete_chunks(list(stale), key)
+        self.manifest.record(path, chunk_ids, sha256=sha256)
+        # 每个文件完成后立即落盘，中途失败时已完成的文件无需重做
+        self.manifest.save()
+        self.manifest.clear_checkpoint(key)
+        logger.info(f"文件摄取完成: {path.name}, {len(chunk_ids)} 个文本块")
+        return len(chunk_ids)
+    
+    def _embed_and_store(self, chunks: List[Document], ids: List[str]) -> None:
+        """并发计算文本块向量，每批完成即写入向量库"""
+        # token 数随文本块存入 metadata，上下文打包时无需重新计数
+        counter = get_token_counter()
+        for chunk in chunks:
+            chunk.metadata["token_count"] = counter.count(chunk.page_content)
+        
+        embeddings = model_manager.embeddings
+        
+        def embed(texts: List[str]) -> List[List[float]]:
+            with metrics.track("ingest", "embed_batch"):
+                return embeddings.embed_documents(texts)
+        
+        def on_batch(start: int, texts: List[str], vectors: List[List[float]]) -> None:
+            self._check_cancelled()
+            end = start + len(texts)
+            with metrics.track("ingest", "write"):
+                vectorstore_manager.upsert_embeddings(chunks[start:end], vectors, ids[start:end])
+            self.progress.chunks_embedded += len(texts)
+        
+        scheduler = create_embedding_scheduler(embed, self._cancel_event)
+        stats = scheduler.run([chunk.page_content for chunk in chunks], on_batch=on_batch)
+        self.embedding_stats.merge(stats)
+        metrics.count("ingest_chunks_total", "向量化并写入的文本块数", len(chunks))
+        metrics.count("ingest_embedding_retries_total", "摄取时 Embedding 限流重试次数", stats.retries)
+    
+    def _iter_chunks(self, path: Path) -> Iterator[Document]:
+        """增量读取并分块（记录每个文本块在原文中的起始偏移）"""
+        from config import config
+        block_chars = config.ingest.read_block_chars if config.ingest.streaming else None
+        try:
+            blocks = read_blocks(path, block_chars)
+            if config.chunk.splitter == "chinese_novel":
+                splitter = ChineseNovelSplitter(
+                    chunk_size=config.chunk.chunk_size,
+                    chunk_overlap=config.chunk.chunk_overlap,
+                )
+                for chunk in splitter.split_stream(blocks):
+                    chunk.metadata["source"] = str(path)
+                    yield chunk
+                return
+            
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=config.chunk.chunk_size,
+                chunk_overlap=config.chunk.chunk_overlap,
+                separators=list(config.chunk.separators),
+                add_start_index=True,
+            )
+            yield from stream_split(
+                blocks,
+                split_fn=lambda text: splitter.create_documents([text]),
+                source=str(path),
+                min_buffer_chars=max(block_chars or 0, config.chunk.chunk_size * 4),
+                tail_chars=config.chunk.chunk_size,
+            )
+        except (OSError, UnicodeDecodeError) as e:
+            raise IngestError("文档加载失败", f"{path}: {e}")
 
 
-def ingest(data_dir: Path) -> int:
+def ingest(data_dir: Path, full: bool = False) -> int:
     """便捷函数：执行摄取"""
     service = IngestService(data_dir)
-    return service.ingest()
+    return service.ingest(full=full)
@@ -0,0 +1,193 @@
+"""
+摄取清单模块
+
+记录已入库文件的路径、大小、修改时间、内容哈希及其文本块 ID，
+用于增量摄取时判断哪些文件新增、变更或被删除
+"""
+import hashlib
+import json
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List
+
+from utils.logger import get_logger
+
+logger = get_logger("novel_rag.manifest")
+
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class FileRecord:
+    """单个文件的入库记录"""
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ManifestDiff:
+    """当前目录与清单的差异"""
+    added: List[Path] = field(default_factory=list)
+    changed: List[Path] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[Path] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """分块计算文件内容哈希"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """摄取清单（JSON 持久化）"""
+
+    def __init__(self, path: Path, signature: str = ""):
+        """
+        Args:
+            path: 清单文件路径
+            signature: 分块参数签名，与已保存的不一致时视为所有文件均已变更
+        """
+        self.path = path
+        self.checkpoint_path = path.with_name(path.stem + ".checkpoint.json")
+        self.signature = signature
+        self.stored_signature = signature
+        self.files: Dict[str, FileRecord] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"清单读取失败，按全新摄取处理: {e}")
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            logger.warning("清单版本不匹配，按全新摄取处理")
+            return
+        self.stored_signature = data.get("signature", "")
+        self.files = {
+            key: FileRecord(**record) for key, record in data.get("files", {}).items()
+        }
+
+    def save(self) -> None:
+        """原子写入清单"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "signature": self.signature,
+            "files": {key: asdict(record) for key, record in self.files.items()},
+        }
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def diff(self, paths: List[Path]) -> ManifestDiff:
+        """
+        比较目录中的文件与清单
+
+        大小和修改时间都未变时直接视为未变更；否则再比较内容哈希，
+        仅 mtime 变化（如重新复制同一文件）不会触发重新摄取
+        """
+        result = ManifestDiff()
+        seen = set()
+        resplit = self.stored_signature != self.signature
+        if resplit and self.files:
+            logger.info("分块参数已变化，全部文件需要重新摄取")
+        for path in paths:
+            key = str(path)
+            seen.add(key)
+            record = self.files.get(key)
+            if record is None:
+                result.added.append(path)
+                continue
+            if resplit:
+                result.changed.append(path)
+                continue
+            stat = path.stat()
+            if stat.st_size == record.size and stat.st_mtime == record.mtime:
+                result.unchanged.append(path)
+            elif stat.st_size == record.size and file_sha256(path) == record.sha256:
+                record.mtime = stat.st_mtime
+                result.unchanged.append(path)
+            else:
+                result.changed.append(path)
+        result.removed = [key for key in self.files if key not in seen]
+        return result
+
+    def record(self, path: Path, chunk_ids: List[str], sha256: str = "") -> None:
+        """记录文件已入库"""
+        stat = path.stat()
+        self.files[str(path)] = FileRecord(
+            path=str(path),
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            sha256=sha256 or file_sha256(path),
+            chunk_ids=chunk_ids,
+        )
+
+    def remove(self, key: str) -> List[str]:
+        """移除文件记录，返回其文本块 ID"""
+        record = self.files.pop(key, None)
+        return record.chunk_ids if record else []
+
+    def clear(self) -> None:
+        self.files = {}
+        self.stored_signature = self.signature
+        self.checkpoint_path.unlink(missing_ok=True)
+
+    # ── 断点续传 ──────────────────────────────────────────────
+    # 流式摄取按窗口推进，每个窗口写入后记录已完成的文本块数；
+    # 检查点文件只保存正在处理的文件，体积与库大小无关
+
+    def _read_checkpoints(self) -> Dict[str, Dict]:
+        if not self.checkpoint_path.exists():
+            return {}
+        try:
+            return json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _write_checkpoints(self, checkpoints: Dict[str, Dict]) -> None:
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(checkpoints, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self.checkpoint_path)
+
+    def load_checkpoint(self, key: str, sha256: str) -> int:
+        """返回文件上次中断时已写入的文本块数（内容或分块参数已变化则为 0）"""
+        checkpoint = self._read_checkpoints().get(key)
+        if (
+            checkpoint
+            and checkpoint.get("sha256") == sha256
+            and checkpoint.get("signature", "") == self.signature
+        ):
+            return int(checkpoint.get("chunks_done", 0))
+        return 0
+
+    def save_checkpoint(self, key: str, sha256: str, chunks_done: int) -> None:
+        """记录文件的摄取进度"""
+        checkpoints = self._read_checkpoints()
+        checkpoints[key] = {
+            "sha256": sha256,
+            "signature": self.signature,
+            "chunks_done": chunks_done,
+        }
+        self._write_checkpoints(checkpoints)
+
+    def clear_checkpoint(self, key: str) -> None:
+        """文件摄取完成后清除进度"""
+        checkpoints = self._read_checkpoints()
+        if checkpoints.pop(key, None) is not None:
+            self._write_checkpoints(checkpoints)
@@ -3,33 +3,73 @@
 
 处理用户问题，返回基于小说内容的回答
 """
-from typing import Dict, Any, List, Optional
-from dataclasses import dataclass
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple, Union
+from dataclasses import dataclass, field, replace
 
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.documents import Document
 
 from core.models import model_manager
+from core.context import QueryContext
+from core.answer_cache import SemanticAnswerCache, create_answer_cache
 from core.retriever import create_retriever, RAGRetriever
 from core.vectorstore import vectorstore_manager
+from core.sparse_index import sparse_index_manager
+from core.passages import assemble_context
+from core.packer import pack_context
 from core.prompts import Prompts, format_docs_for_context
 from utils.logger import get_logger
 from utils.exceptions import LLMError, ConfigurationError
+from utils.metrics import metrics
 
 logger = get_logger("novel_rag.qa")
 
+# 有时间预算时执行同步生成的线程池（超时后调用方不再等待）
+_generate_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="generate")
+# 有时间预算时为回答缓存计算查询向量的线程池（超时后调用方不再等待）
+_embed_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="embed")
+
+GENERATE_TIMEOUT_ANSWER = "抱歉，回答生成超时，请参考下方检索到的原文段落，或稍后重试。"
+
 
 @dataclass
 class QAResponse:
     """问答响应结构"""
     answer: str
-    sources: List[Dict[str, str]]
+    sources: List[Dict[str, Any]]
+    timings: Dict[str, float] = field(default_factory=dict)
+    cached: bool = False
+    metadata: Dict[str, Any] = field(default_factory=dict)  # 如 skipped_stages: 被跳过的阶段 → 原因
     
     def to_dict(self) -> Dict[str, Any]:
         return {
             "answer": self.answer,
             "sources": self.sources,
+            "timings": self.timings,
+            "cached": self.cached,
+            "metadata": self.metadata,
+        }
+
+
+@dataclass
+class QAStreamEvent:
+    """
+    流式问答事件
+    
+    依次为 sources（检索完成，携带来源）→ token（回答增量，多次）→ done（完整响应）
+    """
+    type: str
+    text: str = ""
+    response: Optional[QAResponse] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "text": self.text,
+            "response": self.response.to_dict() if self.response else None,
         }
 
 
@@ -49,6 +89,8 @@ class QAService:
             return
         self._chain = None
         self._retriever: Optional[RAGRetriever] = None
+        self._answer_cache: Optional[SemanticAnswerCache] = None
+        self._init_lock = threading.Lock()
         self._initialized = True
     
     def _ensure_initialized(self) -> None:
@@ -58,33 +100,35 @@ class QAService:
             raise ConfigurationError("API 密钥未配置")
         
         if self._chain is None:
-            self._build_chain()
+            # 后台预热与首个请求可能同时到达
+            with self._init_lock:
+                if self._chain is None:
+                    self._build_chain()
+    
+    def warm_up(self) -> None:
+        """提前构建问答链（检索器、重排器与 LLM 客户端），首个问题不再承担初始化开销"""
+        self._ensure_initialized()
     
     def _build_chain(self) -> None:
         """构建 RAG 链"""
         logger.info("构建 RAG 问答链")
         
         self._retriever = create_retriever()
+        self._answer_cache = create_answer_cache()
         llm = model_manager.llm
         
-        self._chain = (
-            {
-                "context": RunnableLambda(self._retriever.retrieve) | format_docs_for_context,
-                "question": RunnablePassthrough(),
-            }
-            | Prompts.NOVEL_QA
-            | llm
-            | StrOutputParser()
-        )
+        # 检索在链外执行一次，链只负责 Prompt → LLM → 解析
+        self._chain = Prompts.NOVEL_QA | llm | StrOutputParser()
         
         logger.info("RAG 链构建完成")
     
-    def ask(self, question: str) -> QAResponse:
+    def ask(self, question: str, novel: Optional[Union[str, List[str]]] = None) -> QAResponse:
         """
         处理用户问题
         
         Args:
             question: 用户问题
+            novel: 限定检索的小说（标题、文件名或来源路径，可为列表），None 表示全部
             
         Returns:
             包含回答和来源的响应对象
@@ -93,32 +137,312 @@ class QAService:
         
         logger.info(f"处理问题: {question[:50]}...")
         
+        ctx = self._new_context(question, novel)
         try:
-            answer = self._chain.invoke(question)
-            source_docs = self._retriever.retrieve(question)
+            with ctx.span("request"):
+                cached = self._lookup_answer(ctx)
+                if cached is not None:
+                    return cached
+                
+                self._retriever.retrieve_context(ctx)
+                assemble_context(ctx)
+                pack_context(ctx)
+                
+                answer = self._generate(ctx)
+                
+                return self._complete(answer, ctx)
             
-            sources = [
-                {
-                    "content": doc.page_content,
-                    "source": doc.metadata.get("source", "未知来源"),
-                }
-                for doc in source_docs
-            ]
+        except Exception as e:
+            logger.error(f"问答失败: {e}")
+            metrics.count("requests_failed_total", "失败的请求数", pipeline="qa")
+            raise LLMError("回答生成失败", str(e))
+    
+    async def aask(self, question: str, novel: Optional[Union[str, List[str]]] = None) -> QAResponse:
+        """
+        ask 的异步版本，远程调用（Embedding、重排、生成）均不占用线程
+        
+        Args:
+            question: 用户问题
+            novel: 限定检索的小说（标题、文件名或来源路径，可为列表），None 表示全部
             
-            logger.info(f"回答生成完成，来源数: {len(sources)}")
-            return QAResponse(answer=answer, sources=sources)
+        Returns:
+            包含回答和来源的响应对象
+        """
+        self._ensure_initialized()
+        
+        logger.info(f"处理问题: {question[:50]}...")
+        
+        ctx = self._new_context(question, novel)
+        try:
+            with ctx.span("request"):
+                cached = await self._alookup_answer(ctx)
+                if cached is not None:
+                    return cached
+                
+                await self._retriever.aretrieve_context(ctx)
+                assemble_context(ctx)
+                pack_context(ctx)
+                
+                answer = await self._agenerate(ctx)
+                
+                return self._complete(answer, ctx)
             
         except Exception as e:
             logger.error(f"问答失败: {e}")
+            metrics.count("requests_failed_total", "失败的请求数", pipeline="qa")
             raise LLMError("回答生成失败", str(e))
     
+    def ask_stream(
+        self, question: str, novel: Optional[Union[str, List[str]]] = None
+    ) -> Iterator[QAStreamEvent]:
+        """
+        流式处理用户问题：检索完成后先返回来源，再逐步返回回答
+        
+        时间预算只约束检索与重排；生成阶段已在逐字返回，不再截断
+        
+        Args:
+            question: 用户问题
+            novel: 限定检索的小说，None 表示全部
+            
+        Yields:
+            流式问答事件
+        """
+        self._ensure_initialized()
+        
+        logger.info(f"流式处理问题: {question[:50]}...")
+        
+        ctx = self._new_context(question, novel)
+        try:
+            with ctx.span("request"):
+                cached = self._lookup_answer(ctx)
+                if cached is not None:
+                    yield from self._cached_events(cached)
+                    return
+                
+                self._retriever.retrieve_context(ctx)
+                assemble_context(ctx)
+                pack_context(ctx)
+                yield QAStreamEvent("sources", response=self._build_response("", ctx))
+                
+                parts = []
+                with ctx.timer("generate"):
+                    for token in self._chain.stream(self._chain_input(ctx)):
+                        if token:
+                            parts.append(token)
+                            yield QAStreamEvent("token", text=token)
+                
+                yield QAStreamEvent("done", response=self._complete("".join(parts), ctx))
+            
+        except Exception as e:
+            logger.error(f"问答失败: {e}")
+            metrics.count("requests_failed_total", "失败的请求数", pipeline="qa")
+            raise LLMError("回答生成失败", str(e))
+    
+    async def aask_stream(
+        self, question: str, novel: Optional[Union[str, List[str]]] = None
+    ) -> AsyncIterator[QAStreamEvent]:
+        """ask_stream 的异步版本"""
+        self._ensure_initialized()
+        
+        logger.info(f"流式处理问题: {question[:50]}...")
+        
+        ctx = self._new_context(question, novel)
+        try:
+            with ctx.span("request"):
+                cached = await self._alookup_answer(ctx)
+                if cached is not None:
+                    for event in self._cached_events(cached):
+                        yield event
+                    return
+                
+                await self._retriever.aretrieve_context(ctx)
+                assemble_context(ctx)
+                pack_context(ctx)
+                yield QAStreamEvent("sources", response=self._build_response("", ctx))
+                
+                parts = []
+                with ctx.timer("generate"):
+                    async for token in self._chain.astream(self._chain_input(ctx)):
+                        if token:
+                            parts.append(token)
+                            yield QAStreamEvent("token", text=token)
+                
+                yield QAStreamEvent("done", response=self._complete("".join(parts), ctx))
+            
+        except Exception as e:
+            logger.error(f"问答失败: {e}")
+            metrics.count("requests_failed_total", "失败的请求数", pipeline="qa")
+            raise LLMError("回答生成失败", str(e))
+    
+    @staticmethod
+    def _new_context(question: str, novel: Optional[Union[str, List[str]]] = None) -> QueryContext:
+        """创建请求上下文：解析检索范围，启用时间预算时设置截止时间与各阶段预算"""
+        from config import config
+        ctx = QueryContext(question=question, scope=vectorstore_manager.resolve_scope(novel))
+        budget = config.deadline
+        if budget.enabled:
+            ctx.deadline = time.perf_counter() + budget.total
+            ctx.budgets = {
+                "embed": budget.embed,
+                "search": budget.search,
+                "rerank": budget.rerank,
+                "generate": budget.generate,
+            }
+        return ctx
+    
+    def _generate(self, ctx: QueryContext) -> str:
+        """生成回答；超出时间预算时返回超时提示"""
+        timeout = ctx.stage_timeout("generate")
+        with ctx.timer("generate"):
+            if timeout is None:
+                return self._chain.invoke(self._chain_input(ctx))
+            future = _generate_executor.submit(self._chain.invoke, self._chain_input(ctx))
+            try:
+                return future.result(timeout=max(timeout, 0))
+            except FutureTimeoutError:
+                return self._generate_timed_out(ctx)
+    
+    async def _agenerate(self, ctx: QueryContext) -> str:
+        """_generate 的异步版本，超时会取消进行中的生成"""
+        timeout = ctx.stage_timeout("generate")
+        with ctx.timer("generate"):
+            try:
+                return await asyncio.wait_for(
+                    self._chain.ainvoke(self._chain_input(ctx)),
+                    timeout=None if timeout is None else max(timeout, 0),
+                )
+            except asyncio.TimeoutError:
+                return self._generate_timed_out(ctx)
+    
+    @staticmethod
+    def _generate_timed_out(ctx: QueryContext) -> str:
+        logger.warning("回答生成超出时间预算")
+        ctx.skip("generate", "timeout")
+        return GENERATE_TIMEOUT_ANSWER
+    
+    @staticmethod
+    def _chain_input(ctx: QueryContext) -> Dict[str, str]:
+        """问答链的输入"""
+        return {
+            "context": format_docs_for_context(ctx.documents),
+            "question": ctx.question,
+        }
+    
+    def _complete(self, answer: str, ctx: QueryContext) -> QAResponse:
+        """构建响应并写入回答缓存（有阶段被跳过的降级回答不缓存）"""
+        response = self._build_response(answer, ctx)
+        if self._answer_cache is not None and ctx.query_vector is not None and not ctx.skipped:
+            self._answer_cache.put(ctx.query_vector, response, self._cache_namespace(ctx))
+        logger.info(
+            f"回答生成完成，来源数: {len(response.sources)}, "
+            f"耗时: {ctx.total_ms:.0f}ms"
+            + (f", 跳过阶段: {ctx.skipped}" if ctx.skipped else "")
+        )
+        return response
+    
+    @staticmethod
+    def _cached_events(cached: QAResponse) -> Iterator[QAStreamEvent]:
+        """缓存命中时的事件序列"""
+        yield QAStreamEvent("sources", response=replace(cached, answer=""))
+        yield QAStreamEvent("token", text=cached.answer)
+        yield QAStreamEvent("done", response=cached)
+    
+    def _lookup_answer(self, ctx: QueryContext) -> Optional[QAResponse]:
+        """
+        在语义回答缓存中查找相似问题
+        
+        查询向量写回上下文，未命中时检索阶段直接复用；
+        查询向量超出 embed 预算时跳过回答缓存，由检索阶段在剩余时间内处理
+        """
+        if self._answer_cache is None:
+            return None
+        timeout = ctx.stage_timeout("embed")
+        with ctx.timer("embed"):
+            if timeout is None:
+                ctx.query_vector = vectorstore_manager.embed_query(ctx.question)
+            else:
+                future = _embed_executor.submit(vectorstore_manager.embed_query, ctx.question)
+                try:
+                    ctx.query_vector = future.result(timeout=max(timeout, 0))
+                except FutureTimeoutError:
+                    return self._skip_answer_cache(ctx)
+        return self._match_answer(ctx)
+    
+    async def _alookup_answer(self, ctx: QueryContext) -> Optional[QAResponse]:
+        """_lookup_answer 的异步版本，超时会取消进行中的查询向量计算"""
+        if self._answer_cache is None:
+            return None
+        timeout = ctx.stage_timeout("embed")
+        with ctx.timer("embed"):
+            try:
+                ctx.query_vector = await asyncio.wait_for(
+                    vectorstore_manager.aembed_query(ctx.question),
+                    timeout=None if timeout is None else max(timeout, 0),
+                )
+            except asyncio.TimeoutError:
+                return self._skip_answer_cache(ctx)
+        return self._match_answer(ctx)
+    
+    @staticmethod
+    def _skip_answer_cache(ctx: QueryContext) -> None:
+        logger.warning("查询向量超出时间预算，跳过回答缓存")
+        ctx.skip("answer_cache", "timeout")
+        return None
+    
+    def _match_answer(self, ctx: QueryContext) -> Optional[QAResponse]:
+        with ctx.timer("answer_cache"):
+            hit = self._answer_cache.lookup(ctx.query_vector, self._cache_namespace(ctx))
+        metrics.cache_lookup("answer", hits=int(hit is not None), misses=int(hit is None))
+        if hit is None:
+            return None
+        response, similarity = hit
+        logger.info(f"命中回答缓存，相似度: {similarity:.3f}, 耗时: {ctx.total_ms:.0f}ms")
+        # trace 换成本次请求的
+        metadata = {key: value for key, value in response.metadata.items() if key != "trace"}
+        if "trace" in ctx.metadata:
+            metadata["trace"] = ctx.metadata["trace"]
+        return replace(response, timings=dict(ctx.timings), cached=True, metadata=metadata)
+    
+    @staticmethod
+    def _cache_namespace(ctx: QueryContext) -> Optional[Tuple[str, ...]]:
+        """回答缓存的命名空间：同一问题在不同检索范围下的回答互不复用"""
+        return tuple(sorted(ctx.scope)) if ctx.scope is not None else None
+    
+    @property
+    def answer_cache(self) -> Optional[SemanticAnswerCache]:
+        return self._answer_cache
+    
+    @staticmethod
+    def _build_response(answer: str, ctx: QueryContext) -> QAResponse:
+        """由请求上下文构建响应，来源与 Prompt 使用的上下文一致"""
+        sources = []
+        for doc, score in zip(ctx.documents, ctx.scores):
+            source = {
+                "content": doc.page_content,
+                "source": doc.metadata.get("source", "未知来源"),
+                "score": score,
+            }
+            # 原文区间与组成段落的文本块，供引用定位
+            for key in ("start_index", "end_index", "chapter_title", "chunk_ids"):
+                if key in doc.metadata:
+                    source[key] = doc.metadata[key]
+            sources.append(source)
+        return QAResponse(
+            answer=answer,
+            sources=sources,
+            timings=dict(ctx.timings),
+            metadata=dict(ctx.metadata),
+        )
+    
     def reload(self) -> None:
         """重新加载服务（文档更新后调用）"""
         logger.info("重新加载问答服务")
         self._chain = None
         self._retriever = None
+        self._answer_cache = None
         model_manager.reset()
         vectorstore_manager.reset()
+        sparse_index_manager.reset()
         self._ensure_initialized()
 
 
@@ -126,9 +450,28 @@ class QAService:
 qa_service = QAService()
 
 
-def ask(question: str) -> Dict[str, Any]:
-    """便捷函数：提问"""
-    return qa_service.ask(question).to_dict()
+def ask(question: str, novel: Optional[Union[str, List[str]]] = None) -> Dict[str, Any]:
+    """便捷函数：提问（novel 限定检索的小说）"""
+    return qa_service.ask(question, novel).to_dict()
+
+
+def ask_stream(question: str, novel: Optional[Union[str, List[str]]] = None) -> Iterator[Dict[str, Any]]:
+    """便捷函数：流式提问"""
+    for event in qa_service.ask_stream(question, novel):
+        yield event.to_dict()
+
+
+async def aask(question: str, novel: Optional[Union[str, List[str]]] = None) -> Dict[str, Any]:
+    """便捷函数：异步提问"""
+    return (await qa_service.aask(question, novel)).to_dict()
+
+
+async def aask_stream(
+    question: str, novel: Optional[Union[str, List[str]]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """便捷函数：异步流式提问"""
+    async for event in qa_service.aask_stream(question, novel):
+        yield event.to_dict()
 
 
 def reload_chain() -> None:
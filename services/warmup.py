@@ -0,0 +1,116 @@
+"""
+启动预热模块
+
+进程启动后在后台线程依次导入问答相关模块、打开向量库并将索引读入内存、加载稀疏索引、构建问答链，
+可选发送一次 Embedding 请求建立连接，使首个问题不再承担这些一次性开销；
+启动各阶段耗时写入日志与 startup_seconds 指标，便于发现启动变慢
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger("novel_rag.warmup")
+
+_timings: Dict[str, float] = {}
+_thread: Optional[threading.Thread] = None
+
+
+def record_startup(phase: str, seconds: float) -> None:
+    """记录启动阶段耗时（秒）"""
+    _timings[phase] = round(seconds, 4)
+    logger.info(f"启动阶段 {phase}: {seconds * 1000:.0f}ms")
+    if metrics.enabled:
+        metrics.gauge("startup_seconds", "启动各阶段耗时（秒）", ("phase",)).set(seconds, phase=phase)
+
+
+def startup_timings() -> Dict[str, float]:
+    """已记录的启动阶段耗时（秒）"""
+    return dict(_timings)
+
+
+def _import_modules() -> None:
+    import services.qa_service  # noqa: F401（LangChain、numpy 等依赖随之导入）
+
+
+def _open_vectorstore() -> None:
+    from core.vectorstore import vectorstore_manager
+    vectorstore_manager.warm_up()
+
+
+def _load_sparse_index() -> None:
+    from config import config
+    from core.sparse_index import sparse_index_manager
+    from core.vectorstore import vectorstore_manager
+    if config.retrieval.hybrid:
+        sparse_index_manager.search("预热", 1, vectorstore_manager.shards())
+
+
+def _build_chain() -> None:
+    from services.qa_service import qa_service
+    qa_service.warm_up()
+
+
+def _probe_embedding() -> None:
+    from core.models import model_manager
+    embeddings = model_manager.embeddings
+    # 绕过缓存层，确保请求真正发出
+    while hasattr(embeddings, "base_embeddings"):
+        embeddings = embeddings.base_embeddings
+    embeddings.embed_query("预热")
+
+
+def _steps(embedding: bool) -> List[Tuple[str, Callable[[], None]]]:
+    steps = [
+        ("imports", _import_modules),
+        ("vectorstore", _open_vectorstore),
+        ("sparse_index", _load_sparse_index),
+        ("chain", _build_chain),
+    ]
+    if embedding:
+        steps.append(("embedding", _probe_embedding))
+    return steps
+
+
+def warm_up(embedding: Optional[bool] = None) -> Dict[str, float]:
+    """
+    同步执行预热
+
+    单个步骤失败（如尚未配置 API 密钥、尚未摄取文档）只记录警告，不影响后续步骤，
+    对应的初始化留到首个请求时按原有方式进行
+
+    Args:
+        embedding: 是否发送一次 Embedding 请求，None 时取 config.startup.warmup_embedding
+
+    Returns:
+        成功步骤的耗时（秒），键为 warmup_<步骤名>，warmup 为总耗时
+    """
+    from config import config
+    if embedding is None:
+        embedding = config.startup.warmup_embedding
+
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    for name, step in _steps(embedding):
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"预热步骤 {name} 失败: {e}")
+            continue
+        timings[f"warmup_{name}"] = time.perf_counter() - step_started
+    timings["warmup"] = time.perf_counter() - started
+    for phase, seconds in timings.items():
+        record_startup(phase, seconds)
+    return timings
+
+
+def start_warmup(embedding: Optional[bool] = None) -> threading.Thread:
+    """在后台守护线程中预热（重复调用返回已启动的线程）"""
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=warm_up, args=(embedding,), name="warmup", daemon=True)
+        _thread.start()
+    return _thread
@@ -0,0 +1,36 @@
+"""测试共用的 fixture"""
+import pytest
+
+
+@pytest.fixture
+def fake_models(tmp_path, monkeypatch):
+    """
+    安装替身模型，向量库与缓存目录指向临时目录；结束后恢复被替换的全局状态
+
+    Returns:
+        install(llm=None, embeddings=None) -> 工作目录
+    """
+    import config
+    from benchmarks.fakes import install_fakes
+    from core.models import model_manager
+    from core.sparse_index import sparse_index_manager
+    from core.vectorstore import vectorstore_manager
+    from services.qa_service import qa_service
+
+    # 记录 install_fakes 与问答服务懒加载会改动的全局状态，测试结束时由 monkeypatch 还原
+    monkeypatch.setenv("GOOGLE_API_KEY", "offline")
+    monkeypatch.setattr(config, "VECTORSTORE_DIR", config.VECTORSTORE_DIR)
+    monkeypatch.setattr(config, "CACHE_DIR", config.CACHE_DIR)
+    monkeypatch.setattr(config.config.google, "api_key", config.config.google.api_key)
+    for name in ("_llm", "_embeddings", "_embedding_cache", "_llm_override", "_embeddings_override"):
+        monkeypatch.setattr(model_manager, name, getattr(model_manager, name))
+    for name in ("_chain", "_retriever", "_answer_cache"):
+        monkeypatch.setattr(qa_service, name, getattr(qa_service, name))
+
+    def install(llm=None, embeddings=None):
+        return install_fakes(llm=llm, embeddings=embeddings, workdir=tmp_path)
+
+    yield install
+    # 丢弃指向临时目录的实例，之后按还原的配置重新加载
+    vectorstore_manager.reset()
+    sparse_index_manager.reset()
@@ -0,0 +1,28 @@
+"""异步问答并发测试"""
+import asyncio
+
+from benchmarks.corpus import write_corpus
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+
+
+def test_concurrent_aask_overlaps(fake_models):
+    from services.ingest_service import ingest
+    from services.qa_service import qa_service
+
+    llm = FakeChatModel(latency=0.2)
+    workdir = fake_models(llm=llm, embeddings=FakeEmbeddings(dim=64, latency=0.0))
+    write_corpus(workdir / "data", novels=1, chars_per_novel=20_000, seed=0)
+    ingest(workdir / "data")
+
+    async def run():
+        await qa_service.aask("预热：萧炎是谁？")
+        llm.probe.peak = 0
+        return await asyncio.gather(
+            qa_service.aask("乌坦城发生了什么？"),
+            qa_service.aask("纳兰嫣然为何退婚？"),
+        )
+
+    responses = asyncio.run(run())
+    assert all(response.answer for response in responses)
+    # 两个请求的 LLM 调用同时在途，说明异步请求重叠执行而非排队
+    assert llm.probe.peak == 2
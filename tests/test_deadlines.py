@@ -0,0 +1,83 @@
+"""时间预算与熔断测试"""
+import asyncio
+
+import pytest
+
+from benchmarks.corpus import write_corpus
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+from utils.circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def slow_query_embeddings(fake_models, monkeypatch):
+    """摄取完成后把查询向量调慢，远超 embed / search 预算"""
+    import config
+    from services.ingest_service import ingest
+
+    embeddings = FakeEmbeddings(dim=64, latency=0.0)
+    workdir = fake_models(llm=FakeChatModel(latency=0.0), embeddings=embeddings)
+    write_corpus(workdir / "data", novels=1, chars_per_novel=20_000, seed=0)
+    ingest(workdir / "data")
+    embeddings.latency = 0.5
+    monkeypatch.setattr(config.config.deadline, "embed", 0.05)
+    monkeypatch.setattr(config.config.deadline, "search", 0.05)
+    return config.config
+
+
+@pytest.mark.parametrize("hybrid", [True, False])
+def test_slow_embedding_falls_back_to_sparse(slow_query_embeddings, monkeypatch, hybrid):
+    from services.qa_service import qa_service
+
+    monkeypatch.setattr(slow_query_embeddings.retrieval, "hybrid", hybrid)
+    response = qa_service.ask("乌坦城发生了什么？")
+    skipped = response.metadata["skipped_stages"]
+    assert skipped["answer_cache"] == "timeout"
+    assert skipped["dense"] == "timeout"
+    assert response.sources
+
+
+def test_slow_embedding_falls_back_to_sparse_async(slow_query_embeddings, monkeypatch):
+    from services.qa_service import qa_service
+
+    monkeypatch.setattr(slow_query_embeddings.retrieval, "hybrid", False)
+    response = asyncio.run(qa_service.aask("乌坦城发生了什么？"))
+    skipped = response.metadata["skipped_stages"]
+    assert skipped["answer_cache"] == "timeout"
+    assert skipped["dense"] == "timeout"
+    assert response.sources
+
+
+def test_cancelled_probe_releases_breaker():
+    from core.context import QueryContext
+    from core.retriever import RAGRetriever
+
+    now = [0.0]
+    breaker = CircuitBreaker("rerank", failure_threshold=1, reset_timeout=1.0, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 1.0
+    assert breaker.state == HALF_OPEN
+
+    started = asyncio.Event()
+
+    class HangingReranker:
+        async def arerank_or_raise(self, *args):
+            started.set()
+            await asyncio.Event().wait()
+
+    retriever = RAGRetriever(reranker=HangingReranker(), breaker=breaker)
+    ctx = QueryContext(question="萧炎是谁？")
+    ctx.set_results(list(range(100)), [0.0] * 100)
+
+    async def run():
+        task = asyncio.ensure_future(retriever._arerank_step(ctx))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    # 被取消的探测不计成败，下一个请求仍可探测
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
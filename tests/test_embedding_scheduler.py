@@ -0,0 +1,123 @@
+"""Embedding 调度器测试（本地替身 Embedding 函数，注入延迟与 429 错误）"""
+import threading
+import time
+
+import pytest
+
+import services.embedding_scheduler as embedding_scheduler
+from services.embedding_scheduler import EmbeddingScheduler, TokenBucket
+from utils.exceptions import IngestError
+
+
+class FakeEmbed:
+    """带延迟的替身 Embedding：每个文本的向量为 [文本序号]，可让指定批次先失败若干次"""
+
+    def __init__(self, latency: float = 0.01, failures=None, error: str = "429 Resource has been exhausted"):
+        self.latency = latency
+        self.failures = dict(failures or {})  # 批次首个文本 → 剩余失败次数
+        self.error = error
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            remaining = self.failures.get(texts[0], 0)
+            if remaining:
+                self.failures[texts[0]] = remaining - 1
+        try:
+            time.sleep(self.latency)
+            if remaining:
+                raise RuntimeError(self.error)
+            return [[float(text.removeprefix("t"))] for text in texts]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """记录退避抖动区间，不实际等待"""
+    ranges = []
+
+    def uniform(low, high):
+        ranges.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(embedding_scheduler.random, "uniform", uniform)
+    return ranges
+
+
+def _texts(n):
+    return [f"t{i}" for i in range(n)]
+
+
+def test_batches_complete_and_concurrency_bounded():
+    embed = FakeEmbed(latency=0.02)
+    scheduler = EmbeddingScheduler(embed, batch_size=3, max_concurrency=2)
+    texts = _texts(20)
+    batches = []
+    stats = scheduler.run(texts, on_batch=lambda start, batch, vectors: batches.append((start, batch, vectors)))
+
+    assert sorted(start for start, _, _ in batches) == list(range(0, 20, 3))
+    for start, batch, vectors in batches:
+        assert batch == texts[start:start + 3]
+        assert vectors == [[float(i)] for i in range(start, start + len(batch))]
+    assert embed.peak == 2
+    assert stats.texts == 20
+    assert stats.batches == 7
+    assert stats.errors == stats.retries == 0
+    assert stats.elapsed > 0 and stats.throughput > 0
+
+
+def test_quota_errors_retry_with_jittered_backoff(backoffs):
+    embed = FakeEmbed(failures={"t0": 3, "t4": 1})
+    scheduler = EmbeddingScheduler(embed, batch_size=2, max_concurrency=2, backoff_base=1.0, backoff_max=3.0)
+    batches = {}
+    stats = scheduler.run(_texts(6), on_batch=lambda start, batch, vectors: batches.setdefault(start, vectors))
+
+    assert sorted(batches) == [0, 2, 4]
+    assert stats.retries == stats.errors == 4
+    assert stats.texts == 6
+    # Full jitter：第 n 次重试在 [0, min(max, base·2^n)] 内等待
+    assert sorted(backoffs) == [(0, 1.0), (0, 1.0), (0, 2.0), (0, 3.0)]
+
+
+def test_quota_errors_give_up_after_max_retries(backoffs):
+    embed = FakeEmbed(failures={"t0": 10})
+    scheduler = EmbeddingScheduler(embed, batch_size=2, max_retries=2)
+    with pytest.raises(IngestError):
+        scheduler.run(_texts(4))
+    assert len(backoffs) == 2
+    assert scheduler.stats.errors == 3
+
+
+def test_non_quota_error_aborts_without_retry(backoffs):
+    embed = FakeEmbed(failures={"t0": 1}, error="invalid argument")
+    scheduler = EmbeddingScheduler(embed, batch_size=2, max_concurrency=1)
+    batches = []
+    with pytest.raises(IngestError):
+        scheduler.run(_texts(10), on_batch=lambda *args: batches.append(args))
+    assert not backoffs
+    assert not batches
+    assert scheduler.stats.retries == 0
+    assert scheduler.stats.errors == 1
+
+
+def test_token_bucket_waits_for_refill():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2.0, capacity=2.0, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        bucket.acquire()
+    assert sleeps == [0.5, 0.5]
+    assert now[0] == pytest.approx(1.0)
@@ -0,0 +1,40 @@
+"""流式摄取流水线测试"""
+import threading
+
+import pytest
+
+from services.ingest_pipeline import batched, prefetch, read_blocks
+
+
+def test_prefetch_preserves_order_and_reraises():
+    assert list(prefetch(range(10), maxsize=2)) == list(range(10))
+
+    def failing():
+        yield 1
+        raise ValueError("boom")
+
+    consumed = []
+    with pytest.raises(ValueError):
+        for item in prefetch(failing()):
+            consumed.append(item)
+    assert consumed == [1]
+
+
+def test_prefetch_early_exit_stops_producer_and_closes_source(tmp_path):
+    path = tmp_path / "novel.txt"
+    path.write_text("字" * 10_000, encoding="utf-8")
+    closed = threading.Event()
+
+    def source():
+        try:
+            yield from batched(read_blocks(path, block_chars=100), 2)
+        finally:
+            closed.set()
+
+    threads_before = threading.active_count()
+    windows = prefetch(source(), maxsize=1)
+    next(windows)
+    windows.close()
+    # 关闭返回时生产者线程已结束，上游生成器（及其打开的文件）已关闭
+    assert closed.is_set()
+    assert threading.active_count() == threads_before
@@ -0,0 +1,35 @@
+"""按小说分片测试"""
+from langchain_core.documents import Document
+
+from benchmarks.corpus import write_corpus
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+
+
+def test_legacy_default_collection_is_queried_until_reingest(fake_models, monkeypatch):
+    import config
+    from core.sparse_index import sparse_index_manager
+    from core.vectorstore import DEFAULT_SHARD, vectorstore_manager
+    from services.ingest_service import ingest
+    from services.qa_service import qa_service
+
+    # 开启分片之前写入的数据都在默认集合中
+    monkeypatch.setattr(config.config.vectorstore, "per_novel", False)
+    workdir = fake_models(llm=FakeChatModel(latency=0.0), embeddings=FakeEmbeddings(dim=64, latency=0.0))
+    write_corpus(workdir / "data", novels=2, chars_per_novel=5_000, seed=0)
+    ingest(workdir / "data")
+
+    monkeypatch.setattr(config.config.vectorstore, "per_novel", True)
+    vectorstore_manager.reset()
+    sparse_index_manager.reset()
+    assert vectorstore_manager.shards() == [DEFAULT_SHARD]
+    assert qa_service.ask("乌坦城发生了什么？").sources
+    # 查询路径不注册来源
+    unknown = Document(page_content="", metadata={"source": "未入库.txt"})
+    assert vectorstore_manager.shards_of_documents([unknown]) == [DEFAULT_SHARD]
+    assert vectorstore_manager.registry.shards() == []
+
+    # 布局变化后重新摄取，旧数据迁移到各小说的分片
+    ingest(workdir / "data")
+    shards = vectorstore_manager.shards()
+    assert len(shards) == 2 and DEFAULT_SHARD not in shards
+    assert vectorstore_manager.backend.count() == 0
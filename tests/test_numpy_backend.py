@@ -0,0 +1,53 @@
+"""NumPy 向量后端测试"""
+import numpy as np
+from langchain_core.documents import Document
+
+from core.numpy_backend import NumpyVectorBackend
+
+DIM = 16
+ROWS = 2048
+
+
+def _vector(i: int) -> np.ndarray:
+    return np.random.default_rng(i).standard_normal(DIM).astype(np.float32)
+
+
+def _populate(backend: NumpyVectorBackend, ids) -> None:
+    backend.upsert(
+        [f"id-{i}" for i in ids],
+        np.stack([_vector(i) for i in ids]),
+        [Document(page_content=f"text-{i}") for i in ids],
+    )
+
+
+def _assert_consistent(results) -> None:
+    for hits in results:
+        assert hits
+        for doc, _ in hits:
+            assert doc.page_content == "text-" + doc.id.removeprefix("id-")
+
+
+def test_search_during_compaction(tmp_path):
+    backend = NumpyVectorBackend(tmp_path / "store")
+    _populate(backend, range(ROWS))
+    queries = np.stack([_vector(i) for i in range(ROWS - 8, ROWS)])
+
+    # 第一次打分（锁外）期间删除前半部分行并触发压缩，行号整体前移
+    exact_top = backend._exact_top
+    calls = []
+
+    def exact_top_with_compaction(*args, **kwargs):
+        calls.append(1)
+        result = exact_top(*args, **kwargs)
+        if len(calls) == 1:
+            backend.delete([f"id-{i}" for i in range(ROWS // 2)])
+        return result
+
+    backend._exact_top = exact_top_with_compaction
+    results = backend.search(queries, 5)
+    assert len(calls) == 2
+    assert backend.count() == ROWS // 2
+    _assert_consistent(results)
+    # 每个查询向量即库中某一行，最相似的应是它本身
+    assert [hits[0][0].id for hits in results] == [f"id-{i}" for i in range(ROWS - 8, ROWS)]
+
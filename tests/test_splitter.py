@@ -0,0 +1,40 @@
+"""中文小说分块器测试"""
+from core.splitter import ChineseNovelSplitter
+
+
+def _chapters(text: str):
+    splitter = ChineseNovelSplitter(chunk_size=200, chunk_overlap=20)
+    return [(doc.metadata["chapter_index"], doc.metadata["chapter_title"]) for doc in splitter.split_text(text)]
+
+
+def test_heading_forms():
+    text = (
+        "第一章 风起\n\n萧炎站在石台上。\n"
+        "第2回：初入乌坦城\n众人沉默。\n"
+        "第三卷\n夜色渐深。\n"
+        "　　第十节·归来\n他回来了。\n"
+        "第十一章风起云涌\n风停了。"
+    )
+    titles = list(dict(_chapters(text)).values())
+    assert titles == ["第一章 风起", "第2回：初入乌坦城", "第三卷", "第十节·归来", "第十一章风起云涌"]
+
+
+def test_prose_starting_with_ordinal_is_not_heading():
+    text = (
+        "第一章 风起\n\n"
+        "第三回合，他出手了。\n"
+        "第三回合他终于出手了一拳打在对方胸口让所有人都愣住\n"
+        "第二次，药老开口。\n"
+        "第五章节的内容他早已背熟。\n"
+        "第十回他没有躲开！\n"
+        "第二章 落幕\n尘埃落定。"
+    )
+    chapters = dict(_chapters(text))
+    assert chapters == {1: "第一章 风起", 2: "第二章 落幕"}
+
+
+def test_heading_at_end_of_stream_blocks():
+    splitter = ChineseNovelSplitter(chunk_size=200, chunk_overlap=20)
+    blocks = ["正文开始。\n第一", "章 风起\n正文。\n第二章 落", "幕"]
+    docs = list(splitter.split_stream(blocks))
+    assert [doc.metadata["chapter_title"] for doc in docs] == ["", "第一章 风起", "第二章 落幕"]
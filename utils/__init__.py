@@ -1,11 +1,14 @@
 """工具模块"""
 from utils.logger import setup_logger, get_logger
+from utils.cache import LRUCache
+from utils.metrics import metrics, MetricsRegistry, start_metrics_server
 from utils.exceptions import (
     NovelRAGError,
     ConfigurationError,
     VectorStoreError,
     RerankerError,
     IngestError,
+    IngestCancelledError,
     RetrievalError,
     LLMError,
 )
@@ -13,11 +16,16 @@ from utils.exceptions import (
 __all__ = [
     "setup_logger",
     "get_logger",
+    "LRUCache",
+    "metrics",
+    "MetricsRegistry",
+    "start_metrics_server",
     "NovelRAGError",
     "ConfigurationError",
     "VectorStoreError",
     "RerankerError",
     "IngestError",
+    "IngestCancelledError",
     "RetrievalError",
     "LLMError",
 ]
@@ -0,0 +1,100 @@
+"""
+缓存工具模块
+
+线程安全的 LRU + TTL 缓存，带命中率统计
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """
+    有界 LRU 缓存
+
+    - 超过 max_size 时淘汰最久未访问的条目
+    - ttl > 0 时条目在写入 ttl 秒后过期
+    - version_fn 返回值变化时整体失效（如向量库版本变化）
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 0,
+        version_fn: Optional[Callable[[], Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._max_size = max(1, max_size)
+        self._ttl = ttl
+        self._version_fn = version_fn
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = version_fn() if version_fn else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self) -> None:
+        if self._version_fn is None:
+            return
+        version = self._version_fn()
+        if version != self._version:
+            self._data.clear()
+            self._version = version
+            self.invalidations += 1
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """读取条目，未命中或已过期返回 None"""
+        with self._lock:
+            self._check_version()
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires = item
+            if expires and expires < self._clock():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        """写入条目"""
+        with self._lock:
+            self._check_version()
+            expires = self._clock() + self._ttl if self._ttl > 0 else 0
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """命中率等统计信息"""
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,109 @@
+"""
+熔断器模块
+
+依赖的远程调用连续失败或过慢时暂时绕过它，到期后放行单个探测请求（半开），
+探测成功则恢复，失败则继续熔断；放行的调用被放弃时须调用 release，否则半开状态会一直拒绝
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    - closed: 正常放行；连续 failure_threshold 次失败（含慢调用）后转为 open
+    - open: 拒绝调用；reset_timeout 秒后转为 half_open
+    - half_open: 只放行一个探测调用，成功转为 closed，失败重新 open
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        slow_call_threshold: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            name: 名称（用于日志）
+            failure_threshold: 触发熔断的连续失败次数
+            reset_timeout: 熔断后等待多久（秒）开始探测
+            slow_call_threshold: 耗时超过该值（秒）的调用计为失败，None 表示不计
+            clock: 时钟函数
+        """
+        self.name = name
+        self._failure_threshold = max(1, failure_threshold)
+        self._reset_timeout = reset_timeout
+        self._slow_call_threshold = slow_call_threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= self._reset_timeout:
+            self._state = HALF_OPEN
+            self._probing = False
+
+    def allow(self) -> bool:
+        """是否放行本次调用（半开状态下只放行一个探测）"""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, elapsed: float) -> None:
+        """记录一次完成的调用，过慢时按失败处理"""
+        if self._slow_call_threshold is not None and elapsed > self._slow_call_threshold:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self._failure_threshold:
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+    def release(self) -> None:
+        """放行的调用未完成即被放弃（如被取消）时调用：不计成败，半开状态下允许下一个探测"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "rejected": self.rejected,
+            }
@@ -39,6 +39,11 @@ class IngestError(NovelRAGError):
     pass
 
 
+class IngestCancelledError(IngestError):
+    """摄取任务被取消"""
+    pass
+
+
 class RetrievalError(NovelRAGError):
     """检索相关错误"""
     pass
@@ -0,0 +1,348 @@
+"""
+指标模块
+
+进程内的计数器、直方图与仪表盘，以 Prometheus 文本格式导出，并可在本地 HTTP 端口提供 /metrics；
+未启用时各记录方法在检查开关后立即返回，几乎没有额外开销
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from utils.logger import get_logger
+
+logger = get_logger("novel_rag.metrics")
+
+# 秒，覆盖本地检索（毫秒级）到远程生成（十秒级）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+T = TypeVar("T")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    """带标签的指标基类"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表盘（如进行中的请求数）"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 → [各桶计数（非累积，末位为 +Inf）, 总和]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.label_names, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    enabled 首次读取时取 config.metrics.enabled，也可用 configure 显式设置；
+    未启用时 observe / inc / track 等记录方法直接返回
+    """
+
+    def __init__(self, namespace: str = "novel_rag"):
+        self.namespace = namespace
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._enabled: Optional[bool] = None
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is None:
+            from config import config
+            self._enabled = config.metrics.enabled
+        return self._enabled
+
+    def configure(self, enabled: bool) -> None:
+        self._enabled = enabled
+
+    def _get(self, cls, name: str, documentation: str, labels: Sequence[str], **kwargs) -> _Metric:
+        full_name = f"{self.namespace}_{name}"
+        metric = self._metrics.get(full_name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(full_name)
+                if metric is None:
+                    metric = cls(full_name, documentation, labels, **kwargs)
+                    self._metrics[full_name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, documentation, labels, buckets=buckets)
+
+    # ── 流水线常用指标 ────────────────────────────────────────
+
+    def observe_stage(self, pipeline: str, stage: str, seconds: float) -> None:
+        """记录流水线某阶段的耗时"""
+        if not self.enabled:
+            return
+        self.histogram(
+            "stage_duration_seconds", "各流水线阶段耗时（秒）", ("pipeline", "stage")
+        ).observe(seconds, pipeline=pipeline, stage=stage)
+
+    def count(self, name: str, documentation: str, amount: float = 1.0, **labels: str) -> None:
+        """计数器加一（或 amount）"""
+        if not self.enabled:
+            return
+        self.counter(name, documentation, tuple(labels)).inc(amount, **labels)
+
+    def cache_lookup(self, cache: str, hits: int = 0, misses: int = 0) -> None:
+        """记录缓存命中与未命中次数"""
+        if not self.enabled:
+            return
+        counter = self.counter("cache_lookups_total", "缓存查找次数", ("cache", "result"))
+        if hits:
+            counter.inc(hits, cache=cache, result="hit")
+        if misses:
+            counter.inc(misses, cache=cache, result="miss")
+
+    @contextmanager
+    def track(self, pipeline: str, stage: str) -> Iterator[None]:
+        """记录阶段耗时，并在执行期间计入进行中的数量"""
+        if not self.enabled:
+            yield
+            return
+        in_flight = self.gauge("in_flight", "进行中的请求或阶段数", ("pipeline", "stage"))
+        in_flight.inc(pipeline=pipeline, stage=stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            in_flight.dec(pipeline=pipeline, stage=stage)
+            self.observe_stage(pipeline, stage, time.perf_counter() - start)
+
+    def timed_iter(self, iterable: Iterable[T], pipeline: str, stage: str) -> Iterable[T]:
+        """
+        记录迭代器产出元素所花的累计时间（不含消费方处理元素的时间），耗尽或关闭时记一次
+
+        用于读取、分块等以生成器形式与后续阶段交错执行的阶段
+        """
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(iterable, pipeline, stage)
+
+    def _timed_iter(self, iterable: Iterable[T], pipeline: str, stage: str) -> Iterator[T]:
+        iterator = iter(iterable)
+        total = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    total += time.perf_counter() - start
+                yield item
+        finally:
+            self.observe_stage(pipeline, stage, total)
+
+    # ── 导出 ──────────────────────────────────────────────────
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """清空全部指标"""
+        with self._lock:
+            self._metrics = {}
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # 抓取请求不写日志
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+    """在后台线程启动 /metrics 端点（重复调用返回已启动的服务）"""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        thread = threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True)
+        thread.start()
+        logger.info(f"指标端点已启动: http://{host}:{_server.server_address[1]}/metrics")
+    return _server
+
+
+def stop_metrics_server() -> None:
+    """停止 /metrics 端点"""
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None